@@ -0,0 +1,300 @@
+# export_pipeline/async_exporter.py
+
+"""
+Module: async_exporter
+Purpose: asyncio export engine that keeps many window queries and uploads in flight on one event loop.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from azure.core.exceptions import ResourceExistsError
+from azure.identity.aio import ClientSecretCredential
+from azure.monitor.query import LogsQueryStatus
+from azure.monitor.query.aio import LogsQueryClient
+from azure.storage.blob import ContentSettings
+from azure.storage.blob.aio import BlobServiceClient
+from export_pipeline.blob_uploader import SOURCE_MD5_KEY, CountingStream, source_md5, stored_size, window_metadata
+from export_pipeline.compression import codec_for
+from export_pipeline.config import settings
+from export_pipeline.encoder import get_encode_pool
+from export_pipeline.formats import OutputFormat, get_output_format
+from export_pipeline.governor import get_governor
+from export_pipeline.journal import get_journal
+from export_pipeline.kql_exporter import window_query
+from export_pipeline.logger import logger
+from export_pipeline.metrics import get_metrics
+from export_pipeline.workspaces import get_workspaces, resolve
+
+Window = Tuple[datetime, datetime]
+
+
+class AsyncExportEngine:
+    """
+    Exports (table, window) pairs concurrently using the async Azure Monitor and Blob clients.
+
+    A fixed pool of worker coroutines pulls windows from one queue, so hundreds of
+    queries and uploads can be in flight without a thread each. Concurrency is
+    bounded separately per workspace (queries) and per storage account (uploads).
+    Tables are export keys (see `Workspace.key`), so one engine exports the
+    tables of every configured workspace into their workspaces' containers.
+    Windows that come back PARTIAL are bisected and queued again. Like the thread
+    pipeline, each window reserves its estimated size in the memory governor
+    before its query and releases it once uploaded.
+    """
+
+    def __init__(
+        self,
+        account_url: Optional[str] = None,
+        output_format: Optional[OutputFormat] = None,
+        plan: Optional[Callable[[str, datetime, datetime], List[Window]]] = None,
+    ):
+        """
+        Args:
+            account_url (Optional[str]): Blob service URL. Defaults to `settings.storage_container_base_url`.
+            output_format (Optional[OutputFormat]): Output format. Defaults to `settings.output_format`.
+            plan (Optional[Callable]): Returns the windows for (table, start, end), e.g.
+                `ExportPlanner(...).plan`. Defaults to `batch_interval_minutes` windows.
+        """
+        self.account_url = account_url or settings.storage_container_base_url
+        self.output_format = output_format or get_output_format()
+        self.plan = plan or _fixed_windows
+        self.journal = get_journal()
+        self.encode_pool = get_encode_pool()
+        self._query_limits: Dict[str, asyncio.Semaphore] = {}
+        self._upload_limits: Dict[str, asyncio.Semaphore] = {}
+        self._admission: Optional[ThreadPoolExecutor] = None
+
+    def run(
+        self,
+        tables: Optional[List[str]] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+    ) -> Dict[str, Dict]:
+        """
+        Synchronous wrapper for notebooks and scripts.
+
+        Runs on a fresh event loop, in a helper thread if the caller already has a
+        running loop (as Jupyter does).
+
+        Args:
+            tables (Optional[List[str]]): Export keys of the tables to export. Defaults to every
+                table of every configured workspace.
+            start_time (Optional[datetime]): Defaults to `export_days_lookback` days before midnight UTC.
+            end_time (Optional[datetime]): Defaults to midnight UTC today.
+
+        Returns:
+            Dict[str, Dict]: Per-table rows, bytes, blob count and failed windows.
+        """
+        end_time = end_time or datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        start_time = start_time or end_time - timedelta(days=settings.export_days_lookback)
+        tables = tables or [workspace.key(table) for workspace in get_workspaces() for table in workspace.table_list()]
+        coroutine = self.export_tables(tables, start_time, end_time)
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coroutine).result()
+
+    async def export_tables(self, tables: List[str], start_time: datetime, end_time: datetime) -> Dict[str, Dict]:
+        """
+        Export every window of every table on the current event loop.
+
+        Args:
+            tables (List[str]): Export keys of the tables to export.
+            start_time (datetime): The earliest start time.
+            end_time (datetime): The latest end time.
+
+        Returns:
+            Dict[str, Dict]: Per-table rows, bytes, blob count and failed windows.
+        """
+        results = {table: {"rows": 0, "bytes": 0, "blobs": 0, "failed": 0} for table in tables}
+        queue: "asyncio.Queue[Tuple[str, datetime, datetime]]" = asyncio.Queue()
+
+        async with ClientSecretCredential(
+            settings.tenant_id, settings.client_id, settings.client_secret
+        ) as credential, LogsQueryClient(credential) as logs_client, BlobServiceClient(
+            self.account_url, credential=settings.storage_sas_token or credential
+        ) as blob_client:
+            containers = {}
+            for table in tables:
+                containers[table] = await self._container(blob_client, table)
+                windows = self.plan(table, start_time, end_time)
+                self.journal.plan(table, windows)
+                for window_start, window_end in windows:
+                    if not self.journal.is_completed(table, window_start, window_end):
+                        queue.put_nowait((table, window_start, window_end))
+            logger.info(f"Async export: {queue.qsize()} windows queued across {len(tables)} tables")
+            get_metrics().queue_depth.set_function("query", function=queue.qsize)
+
+            async def worker():
+                while True:
+                    table, window_start, window_end = await queue.get()
+                    try:
+                        await self._export_window(
+                            logs_client, containers[table], queue, results[table], table, window_start, window_end
+                        )
+                    except Exception as ex:
+                        logger.error(f"❌ {table} {window_start}-{window_end}: {ex}")
+                        self.journal.fail(table, window_start, window_end, str(ex))
+                        results[table]["failed"] += 1
+                    finally:
+                        queue.task_done()
+
+            # One thread waits for the memory budget on behalf of all workers, so windows
+            # are admitted in order and the loop's default executor stays free for encoding
+            self._admission = ThreadPoolExecutor(max_workers=1, thread_name_prefix="admission")
+            try:
+                workers = [asyncio.create_task(worker()) for _ in range(settings.async_max_in_flight)]
+                await queue.join()
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+            finally:
+                self._admission.shutdown()
+
+        for table, result in results.items():
+            logger.info("Finished %s: %d rows in %d blobs, %d failed windows", table, result["rows"], result["blobs"], result["failed"])
+        get_metrics().log_summary()
+        return results
+
+    async def _container(self, blob_client: BlobServiceClient, table: str):
+        workspace, table_name = resolve(table)
+        container_client = blob_client.get_container_client(workspace.container(table_name))
+        try:
+            await container_client.create_container()
+        except ResourceExistsError:
+            pass
+        return container_client
+
+    async def _export_window(self, logs_client, container_client, queue, result, table, window_start, window_end):
+        """Reserve memory for one window, export it and release the reservation once uploaded."""
+        governor = get_governor()
+        reserved = await asyncio.get_running_loop().run_in_executor(
+            self._admission, governor.reserve, governor.estimate(table, window_start, window_end)
+        )
+        try:
+            await self._export_reserved(logs_client, container_client, queue, result, table, window_start, window_end)
+        finally:
+            governor.release(reserved)
+
+    async def _export_reserved(self, logs_client, container_client, queue, result, table, window_start, window_end):
+        """Query, encode and upload one window; bisect it if the result was PARTIAL."""
+        self.journal.start(table, window_start, window_end)
+        workspace, table_name = resolve(table)
+        kql = window_query(table_name).format(start=window_start.isoformat(), end=window_end.isoformat())
+
+        metrics = get_metrics()
+        async with self._limit(self._query_limits, workspace.workspace_id, settings.async_max_queries_per_workspace):
+            started = time.perf_counter()
+            try:
+                response = await _with_retries(
+                    lambda: logs_client.query_workspace(workspace.workspace_id, kql, timespan=(window_start, window_end)),
+                    "query", table,
+                )
+            except Exception:
+                metrics.query_done(table, time.perf_counter() - started, failed=True)
+                raise
+        query_seconds = time.perf_counter() - started
+
+        if response.status == LogsQueryStatus.PARTIAL:
+            if window_end - window_start > timedelta(minutes=settings.min_window_minutes):
+                metrics.query_done(table, query_seconds)
+                midpoint = window_start + (window_end - window_start) / 2
+                queue.put_nowait((table, window_start, midpoint))
+                queue.put_nowait((table, midpoint, window_end))
+                self.journal.fail(table, window_start, window_end, "Partial result; window bisected")
+                return
+            logger.warning("⚠️ Partial data for %s %s-%s: %s", table, window_start, window_end, response.partial_error)
+            tables = response.partial_data or []
+        elif response.status == LogsQueryStatus.SUCCESS:
+            tables = response.tables
+        else:
+            raise RuntimeError(f"Unexpected status {response.status}")
+        metrics.query_done(table, query_seconds, rows=sum(len(data_table.rows) for data_table in tables))
+
+        rows, size, blobs = 0, 0, []
+        for index, data_table in enumerate(tables):
+            if not data_table.rows:
+                continue
+            data = await asyncio.to_thread(
+                self.encode_pool.encode_rows,
+                self.output_format, table, data_table.columns, data_table.rows,
+                getattr(data_table, "columns_types", None),
+            )
+            suffix = f"_{index}" if index else ""
+            codec = codec_for(table_name, self.output_format.name)
+            blob_name = codec.blob_name(self.output_format.blob_name(f"{table_name}_{window_start:%Y-%m-%dT%H%M%S}{suffix}"))
+            # Compressed as it uploads; the uncompressed content's MD5 identifies it on reruns
+            digest = source_md5(data)
+            payload = CountingStream(lambda: codec.stream(data))
+            async with self._limit(self._upload_limits, self.account_url, settings.async_max_uploads_per_account):
+                started = time.perf_counter()
+                unchanged = await _unchanged_size(container_client, blob_name, digest)
+                if unchanged is not None:
+                    logger.info("⏭️ Skipped %s: already holds identical content", blob_name, extra={"table": table, "blob": blob_name})
+                    metrics.upload_done(table, time.perf_counter() - started, unchanged, skipped=True)
+                else:
+                    try:
+                        await _with_retries(lambda: container_client.upload_blob(
+                            blob_name, payload, overwrite=True,
+                            metadata={SOURCE_MD5_KEY: digest, **window_metadata(window_start, window_end, len(data_table.rows))},
+                            content_settings=ContentSettings(
+                                content_type=self.output_format.content_type, content_encoding=codec.content_encoding
+                            ),
+                        ), "upload", table)
+                    except Exception:
+                        metrics.upload_done(table, time.perf_counter() - started, failed=True)
+                        raise
+                    metrics.upload_done(table, time.perf_counter() - started, payload.bytes)
+            rows += len(data_table.rows)
+            size += len(data)
+            blobs.append(blob_name)
+
+        self.journal.complete(table, window_start, window_end, rows, size, blobs)
+        result["rows"] += rows
+        result["bytes"] += size
+        result["blobs"] += len(blobs)
+
+    def _limit(self, limits: Dict[str, asyncio.Semaphore], key: str, size: int) -> asyncio.Semaphore:
+        """Shared semaphore bounding concurrent calls against one workspace or storage account."""
+        if key not in limits:
+            limits[key] = asyncio.Semaphore(size)
+        return limits[key]
+
+
+async def _unchanged_size(container_client, blob_name: str, digest: str) -> Optional[int]:
+    """Size of the blob if `upload_skip_unchanged` is on and it already holds content with this `source_md5`."""
+    if not settings.upload_skip_unchanged:
+        return None
+    try:
+        properties = await container_client.get_blob_client(blob_name).get_blob_properties()
+    except Exception:
+        return None
+    return stored_size(properties, digest)
+
+
+async def _with_retries(call, stage: str, table: str):
+    """Await `call()` with exponential backoff, re-raising after `max_retries` attempts."""
+    for attempt in range(settings.max_retries):
+        try:
+            return await call()
+        except Exception as ex:
+            if attempt == settings.max_retries - 1:
+                raise
+            get_metrics().retry(stage, table, getattr(ex, "status_code", None))
+            await asyncio.sleep(2 ** attempt)
+
+
+def _fixed_windows(table: str, start_time: datetime, end_time: datetime) -> List[Window]:
+    windows = []
+    delta = timedelta(minutes=settings.batch_interval_minutes)
+    current = start_time
+    while current < end_time:
+        windows.append((current, min(current + delta, end_time)))
+        current = windows[-1][1]
+    return windows
@@ -0,0 +1,518 @@
+# export_pipeline/benchmarks/fake_services.py
+
+"""
+Module: fake_services
+Purpose: Local stand-ins for the Log Analytics query API and Blob Storage, so exports can be benchmarked offline.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+try:
+    import orjson
+
+    def _dumps(value) -> bytes:
+        return orjson.dumps(value)
+except ImportError:
+    def _dumps(value) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+# Same limits as the real query API (see kql_exporter)
+MAX_RESULT_ROWS = 500_000
+MAX_RESULT_BYTES = 64 * 1024 * 1024
+
+COLUMNS = [
+    {"name": "TimeGenerated", "type": "datetime"},
+    {"name": "Computer", "type": "string"},
+    {"name": "EventID", "type": "int"},
+    {"name": "Level", "type": "real"},
+    {"name": "Message", "type": "string"},
+]
+
+# Columns of a per-bin `summarize count()` result
+COUNT_COLUMNS = [
+    {"name": "TimeGenerated", "type": "datetime"},
+    {"name": "Rows", "type": "long"},
+]
+
+# Columns of a `getschema` result
+SCHEMA_COLUMNS = [
+    {"name": "ColumnName", "type": "string"},
+    {"name": "ColumnOrdinal", "type": "int"},
+    {"name": "DataType", "type": "string"},
+    {"name": "ColumnType", "type": "string"},
+]
+
+
+@dataclass
+class FakeServiceConfig:
+    """Behaviour of the stand-in services."""
+
+    rows_per_minute: int = 1000  # synthetic table density
+    row_bytes: int = 200  # approximate size of one row
+    table_density: Dict[str, int] = field(default_factory=dict)  # rows per minute by table
+    query_latency_ms: float = 50.0  # added to every query
+    partial_rate: float = 0.0  # share of queries answered PARTIAL regardless of size
+    throttle_rate: float = 0.0  # share of queries answered 429
+    retry_after_seconds: int = 1
+    blob_latency_ms: float = 5.0  # added to every storage request
+    blob_failure_rate: float = 0.0  # share of storage writes answered 503
+    seed: int = 0
+
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def add(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_FakeServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _reply(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        headers = {"Content-Length": str(len(body)), **(headers or {})}  # HEAD replies give the blob's length
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        if urlsplit(self.path).path == "/_stats":
+            self._reply(200, _dumps(self.server.stats.snapshot()), {"Content-Type": "application/json"})
+        else:
+            self.server.handle(self)
+
+    do_POST = do_PUT = do_DELETE = do_HEAD = lambda self: self.server.handle(self)
+
+
+class _FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: FakeServiceConfig):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.config = config
+        self.stats = _Stats()
+        self._random = random.Random(config.seed)
+        self._random_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._random_lock:
+            return self._random.random() < rate
+
+    def handle(self, request: _Handler):
+        raise NotImplementedError
+
+
+class FakeLogAnalytics(_FakeServer):
+    """
+    Answers `POST /v1/workspaces/{id}/query` with synthetic rows for the queried window.
+
+    Row counts follow the table's density; results over the 500,000 row or 64 MB
+    limits are cut off and answered PARTIAL, like the real service. A trailing
+    `project` or `project-away` selects columns, `getschema` returns the
+    columns and `summarize Rows = count() by bin(TimeGenerated, ...)` counts
+    rows per bin; other operators are ignored. Point a `LogsQueryClient` at `url + "/v1"`.
+    """
+
+    def handle(self, request: _Handler):
+        body = request._body()
+        if request.command != "POST" or not request.path.split("?")[0].endswith("/query"):
+            request._reply(404)
+            return
+        time.sleep(self.config.query_latency_ms / 1000)
+        if self.chance(self.config.throttle_rate):
+            self.stats.add("throttled")
+            error = {"error": {"code": "ThrottledError", "message": "Too many requests"}}
+            request._reply(429, _dumps(error), {
+                "Content-Type": "application/json", "Retry-After": str(self.config.retry_after_seconds),
+            })
+            return
+
+        payload = json.loads(body or b"{}")
+        kql = payload.get("query", "")
+        if re.search(r"\|\s*getschema\b", kql):
+            schema = [[column["name"], index, column["type"], column["type"]] for index, column in enumerate(COLUMNS)]
+            request._reply(200, _dumps({"tables": [{"name": "PrimaryResult", "columns": SCHEMA_COLUMNS, "rows": schema}]}),
+                           {"Content-Type": "application/json"})
+            return
+
+        table, start, end = _parse_query(kql, payload.get("timespan", ""))
+        counted = re.search(r"\|\s*summarize\s+Rows\s*=\s*count\(\)\s+by\s+bin\(TimeGenerated,\s*(\d+)m\)", kql)
+        if counted:
+            self.stats.add("count_queries")
+            rows = self.counts(table, start, end, timedelta(minutes=int(counted.group(1))))
+            result = {"tables": [{"name": "PrimaryResult", "columns": COUNT_COLUMNS, "rows": rows}]}
+            request._reply(200, _dumps(result), {"Content-Type": "application/json"})
+            return
+
+        rows, partial = self.rows(table, start, end)
+        columns, size = COLUMNS, len(rows) * self.config.row_bytes
+        kept = _projection(kql)
+        if kept is not None:
+            columns = [column for index, column in enumerate(COLUMNS) if index in kept]
+            rows = [[value for index, value in enumerate(row) if index in kept] for row in rows]
+            size = len(_dumps(rows))
+        result = {
+            "tables": [{"name": "PrimaryResult", "columns": columns, "rows": rows}],
+            "statistics": {"query": {"resultSize": {"tables": {"rows": len(rows), "bytes": size}}}},
+        }
+        if partial or self.chance(self.config.partial_rate):
+            self.stats.add("partial")
+            result["error"] = {"code": "PartialError", "message": "Query result exceeded the row or size limit"}
+        data = _dumps(result)
+        self.stats.add("queries")
+        # Per workspace, from /v1/workspaces/{id}/query
+        self.stats.add(f"queries:{request.path.split('?')[0].rstrip('/').split('/')[-2]}")
+        self.stats.add("rows", len(rows))
+        self.stats.add("bytes", len(data))
+        request._reply(200, data, {"Content-Type": "application/json"})
+
+    def rows(self, table: str, start: datetime, end: datetime) -> Tuple[List[list], bool]:
+        """Synthetic rows spread evenly over the window, and whether they were cut off at a limit."""
+        density = self.config.table_density.get(table, self.config.rows_per_minute)
+        total = int(density * (end - start).total_seconds() / 60)
+        limit = min(MAX_RESULT_ROWS, MAX_RESULT_BYTES // max(self.config.row_bytes, 1))
+        count = min(total, limit)
+        if not count:
+            return [], False
+
+        step = (end - start) / max(total, 1)
+        message = "x" * max(self.config.row_bytes - 80, 1)
+        rows = [
+            [
+                (start + step * index).isoformat(),
+                f"host-{index % 64:02d}",
+                index % 5000,
+                float(index % 4),
+                message,
+            ]
+            for index in range(count)
+        ]
+        return rows, total > limit
+
+    def counts(self, table: str, start: datetime, end: datetime, width: timedelta) -> List[list]:
+        """Rows per `width` bin aligned to the epoch, matching `rows` for windows on whole minutes."""
+        density = self.config.table_density.get(table, self.config.rows_per_minute)
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        bin_start = epoch + (start - epoch) // width * width
+        counts = []
+        while bin_start < end:
+            overlap = min(bin_start + width, end) - max(bin_start, start)
+            count = int(density * overlap.total_seconds() / 60)
+            if count:
+                counts.append([bin_start.isoformat(), count])
+            bin_start += width
+        return counts
+
+
+class FakeBlobStorage(_FakeServer):
+    """
+    Accepts Create Container, Put Blob, Put Block, Put Block From URL, Put Block List,
+    Get Blob Properties, List Blobs, Set Blob Metadata and Lease Blob.
+
+    Request bodies are read and discarded; only sizes, metadata and the MD5 sent
+    with a blob are kept, so reruns can skip unchanged blobs and work catalog
+    tasks can be listed and leased. URLs are
+    path-style (`url + "/{account}/{container}/{blob}"`), which both
+    `upload_blob` and the Azure SDK accept for IP endpoints.
+    """
+
+    def __init__(self, config: FakeServiceConfig):
+        super().__init__(config)
+        self._lock = threading.Lock()
+        self.containers = set()
+        self.blobs: Dict[str, int] = {}
+        self.md5: Dict[str, str] = {}
+        self.metadata: Dict[str, Dict[str, str]] = {}
+        self.leases: Dict[str, Tuple[str, float, int]] = {}  # lease ID, expiry and duration by blob
+        self._blocks: Dict[Tuple[str, str], int] = {}
+
+    def handle(self, request: _Handler):
+        body = request._body()
+        url = urlsplit(request.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/", 2)
+        container = parts[1] if len(parts) > 1 else ""
+        blob = parts[2] if len(parts) > 2 else ""
+        headers = {
+            "ETag": '"0x8D0000000000000"',
+            "Last-Modified": formatdate(usegmt=True),
+            "x-ms-request-id": "00000000-0000-0000-0000-000000000000",
+            "x-ms-version": "2021-08-06",
+            "x-ms-request-server-encrypted": "true",
+        }
+        time.sleep(self.config.blob_latency_ms / 1000)
+
+        if request.command == "PUT" and self.chance(self.config.blob_failure_rate):
+            self.stats.add("failed")
+            headers["x-ms-error-code"] = "ServerBusy"
+            request._reply(503, b"<?xml version=\"1.0\" encoding=\"utf-8\"?><Error><Code>ServerBusy</Code></Error>", headers)
+            return
+
+        if request.command == "PUT" and query.get("restype") == "container":
+            with self._lock:
+                exists = container in self.containers
+                self.containers.add(container)
+            if exists:
+                headers["x-ms-error-code"] = "ContainerAlreadyExists"
+                request._reply(409, b"<?xml version=\"1.0\" encoding=\"utf-8\"?><Error><Code>ContainerAlreadyExists</Code></Error>", headers)
+            else:
+                request._reply(201, headers=headers)
+            return
+
+        name = f"{container}/{blob}"
+        if request.command == "GET" and query.get("comp") == "list":
+            self._list(request, container, query, headers)
+            return
+        if request.command == "PUT" and query.get("comp") == "lease":
+            self._lease(request, name, headers)
+            return
+        if request.command in ("PUT", "DELETE") and not query.get("comp") or query.get("comp") == "metadata":
+            with self._lock:
+                exists = name in self.blobs
+                lease_id = self.leases[name][0] if self._lease_state(name) == "leased" else ""
+            if lease_id and request.headers.get("x-ms-lease-id") != lease_id:
+                headers["x-ms-error-code"] = "LeaseIdMissing"
+                request._reply(412, headers=headers)
+                return
+            if request.command == "PUT" and exists and request.headers.get("If-None-Match") == "*":
+                headers["x-ms-error-code"] = "BlobAlreadyExists"
+                request._reply(409, headers=headers)
+                return
+        if request.command == "PUT" and query.get("comp") == "metadata":
+            with self._lock:
+                if name not in self.blobs:
+                    request._reply(404, headers={**headers, "x-ms-error-code": "BlobNotFound"})
+                    return
+                self.metadata[name] = _metadata(request)
+            request._reply(200, headers=headers)
+            return
+
+        if request.command == "PUT" and query.get("comp") == "block":
+            with self._lock:
+                self._blocks[(f"{container}/{blob}", query.get("blockid", ""))] = len(body)
+            self.stats.add("blocks")
+            self.stats.add("bytes", len(body))
+            request._reply(201, headers=headers)
+        elif request.command == "PUT" and query.get("comp") == "blocklist":
+            ids = re.findall(rb"<(?:Latest|Committed|Uncommitted)>([^<]*)</", body)
+            name = f"{container}/{blob}"
+            with self._lock:
+                self.blobs[name] = sum(self._blocks.pop((name, block_id.decode()), 0) for block_id in ids)
+                self.metadata[name] = _metadata(request)
+                self._store_md5(name, request.headers.get("x-ms-blob-content-md5"))
+            self.stats.add("blobs")
+            request._reply(201, headers=headers)
+        elif request.command == "PUT":
+            with self._lock:
+                self.blobs[f"{container}/{blob}"] = len(body)
+                self.metadata[f"{container}/{blob}"] = _metadata(request)
+                self._store_md5(
+                    f"{container}/{blob}", request.headers.get("x-ms-blob-content-md5") or request.headers.get("Content-MD5")
+                )
+            self.stats.add("blobs")
+            self.stats.add("bytes", len(body))
+            request._reply(201, headers=headers)
+        elif request.command == "DELETE":
+            with self._lock:
+                self.blobs.pop(f"{container}/{blob}", None)
+                self.md5.pop(f"{container}/{blob}", None)
+                self.metadata.pop(f"{container}/{blob}", None)
+                self.leases.pop(f"{container}/{blob}", None)
+            request._reply(202, headers=headers)
+        elif request.command == "HEAD" and f"{container}/{blob}" in self.blobs:
+            headers["x-ms-blob-type"] = "BlockBlob"
+            headers["Content-Length"] = str(self.blobs[f"{container}/{blob}"])
+            if f"{container}/{blob}" in self.md5:
+                headers["Content-MD5"] = self.md5[f"{container}/{blob}"]
+            headers["x-ms-lease-state"] = self._lease_state(name)
+            headers.update({f"x-ms-meta-{key}": value for key, value in self.metadata.get(name, {}).items()})
+            self.stats.add("properties")
+            request._reply(200, headers=headers)
+        elif request.command == "HEAD":
+            headers["x-ms-error-code"] = "BlobNotFound"
+            request._reply(404, headers=headers)
+        else:
+            request._reply(404, headers=headers)
+
+    def _lease_state(self, name: str) -> str:
+        if name not in self.leases:
+            return "available"
+        return "leased" if self.leases[name][1] > time.monotonic() else "expired"
+
+    def _lease(self, request: _Handler, name: str, headers: Dict[str, str]):
+        """Acquire, renew or release a blob lease; expired leases can be acquired by anyone."""
+        action = request.headers.get("x-ms-lease-action")
+        lease_id = request.headers.get("x-ms-lease-id") or request.headers.get("x-ms-proposed-lease-id")
+        with self._lock:
+            if name not in self.blobs:
+                request._reply(404, headers={**headers, "x-ms-error-code": "BlobNotFound"})
+                return
+            held, _, duration = self.leases.get(name, ("", 0.0, -1))
+            if action == "acquire" and (self._lease_state(name) != "leased" or held == lease_id):
+                duration = int(request.headers.get("x-ms-lease-duration", -1))
+                self.leases[name] = (lease_id, time.monotonic() + duration if duration > 0 else float("inf"), duration)
+                status = 201
+            elif action == "renew" and held == lease_id:
+                self.leases[name] = (lease_id, time.monotonic() + duration if duration > 0 else float("inf"), duration)
+                status = 200
+            elif action == "release" and held == lease_id:
+                del self.leases[name]
+                status = 200
+            else:
+                headers["x-ms-error-code"] = "LeaseAlreadyPresent" if action == "acquire" else "LeaseIdMismatchWithLeaseOperation"
+                status = 409
+        self.stats.add(f"lease_{action}")
+        request._reply(status, headers={**headers, "x-ms-lease-id": lease_id or ""} if status < 300 else headers)
+
+    def _list(self, request: _Handler, container: str, query: Dict[str, str], headers: Dict[str, str]):
+        """List Blobs: names after `marker` under `prefix`, with lease state and metadata."""
+        prefix, marker = query.get("prefix", ""), query.get("marker", "")
+        limit = int(query.get("maxresults", 5000))
+        with self._lock:
+            names = sorted(
+                name.split("/", 1)[1] for name in self.blobs
+                if name.startswith(f"{container}/{prefix}") and name.split("/", 1)[1] > marker
+            )
+            page = names[:limit]
+            blobs = []
+            for blob in page:
+                name = f"{container}/{blob}"
+                metadata = "".join(f"<{key}>{escape(value)}</{key}>" for key, value in self.metadata.get(name, {}).items())
+                blobs.append(
+                    f"<Blob><Name>{escape(blob)}</Name><Properties><Content-Length>{self.blobs[name]}</Content-Length>"
+                    f"<LeaseState>{self._lease_state(name)}</LeaseState></Properties><Metadata>{metadata}</Metadata></Blob>"
+                )
+        next_marker = escape(page[-1]) if len(names) > limit else ""
+        body = (
+            f'<?xml version="1.0" encoding="utf-8"?><EnumerationResults ContainerName="{escape(container)}">'
+            f"<Blobs>{''.join(blobs)}</Blobs><NextMarker>{next_marker}</NextMarker></EnumerationResults>"
+        )
+        self.stats.add("lists")
+        request._reply(200, body.encode("utf-8"), {**headers, "Content-Type": "application/xml"})
+
+    def _store_md5(self, name: str, content_md5: Optional[str]):
+        """Keep the MD5 stored with a blob; call with `_lock` held."""
+        if content_md5:
+            self.md5[name] = content_md5
+        else:
+            self.md5.pop(name, None)
+
+
+def _metadata(request: _Handler) -> Dict[str, str]:
+    """`x-ms-meta-*` headers of a request, by lowercase name."""
+    return {key[len("x-ms-meta-"):].lower(): value for key, value in request.headers.items() if key.lower().startswith("x-ms-meta-")}
+
+
+def _projection(kql: str) -> Optional[Set[int]]:
+    """Indexes in COLUMNS kept by the query's last `project` or `project-away`; None if it has neither."""
+    clauses = re.findall(r"\|\s*(project(?:-away)?)\s+([^|]+)", kql)
+    if not clauses:
+        return None
+    operator, names = clauses[-1]
+    named = {name.strip().strip("[]'\"") for name in names.split(",")}
+    return {
+        index for index, column in enumerate(COLUMNS)
+        if (column["name"] in named) == (operator == "project")
+    }
+
+
+def _parse_query(kql: str, timespan: str) -> Tuple[str, datetime, datetime]:
+    """Table name from the KQL and the window from the `timespan` ("start/end") of the request."""
+    table = kql.split("|", 1)[0].strip()
+    start, _, end = timespan.partition("/")
+    start_time = _parse_time(start) if start else datetime(1970, 1, 1, tzinfo=timezone.utc)
+    if not end:
+        end_time = start_time + timedelta(hours=1)
+    elif end.startswith("P"):
+        end_time = start_time + _parse_duration(end)
+    else:
+        end_time = _parse_time(end)
+    return table, start_time, end_time
+
+
+def _parse_time(value: str) -> datetime:
+    value = value.strip().replace("Z", "+00:00")
+    value = re.sub(r"(\.\d{6})\d+", r"\1", value)
+    time_value = datetime.fromisoformat(value)
+    return time_value if time_value.tzinfo else time_value.replace(tzinfo=timezone.utc)
+
+
+def _parse_duration(value: str) -> timedelta:
+    match = re.fullmatch(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:([\d.]+)S)?)?", value)
+    if not match:
+        return timedelta(hours=1)
+    days, hours, minutes, seconds = (float(part or 0) for part in match.groups())
+    return timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def serve(config: FakeServiceConfig) -> Tuple[FakeLogAnalytics, FakeBlobStorage]:
+    """
+    Start both stand-ins on free local ports in background threads.
+
+    Returns:
+        Tuple[FakeLogAnalytics, FakeBlobStorage]: Running servers; call `shutdown()` on each when done.
+    """
+    servers = (FakeLogAnalytics(config), FakeBlobStorage(config))
+    for server in servers:
+        threading.Thread(target=server.serve_forever, name=type(server).__name__, daemon=True).start()
+    return servers
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the fake Log Analytics and Blob Storage endpoints.")
+    for name, value in asdict(FakeServiceConfig()).items():
+        if not isinstance(value, dict):
+            parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    log_analytics, blob_storage = serve(FakeServiceConfig(**vars(args)))
+    print(json.dumps({"log_analytics_url": f"{log_analytics.url}/v1", "blob_url": f"{blob_storage.url}/benchaccount"}), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,424 @@
+# export_pipeline/benchmarks/harness.py
+
+"""
+Module: harness
+Purpose: Benchmark the export paths end to end against the local fake services and report throughput, latency and memory.
+"""
+
+import argparse
+import ast
+import json
+import math
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+KQL = "{table} | where TimeGenerated >= datetime({start}) and TimeGenerated < datetime({end})"
+
+# Metrics compared against a baseline; higher is better for all of them
+THROUGHPUT_METRICS = ("rows_per_s", "mb_per_s")
+
+
+@dataclass
+class BenchmarkResult:
+    """Totals and per-window latencies of one scenario run."""
+
+    scenario: str
+    rows: int = 0
+    bytes: int = 0
+    failures: int = 0
+    seconds: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, latency: float, rows: int = 0, bytes: int = 0, failed: bool = False):
+        with self._lock:
+            self.latencies.append(latency)
+            self.rows += rows
+            self.bytes += bytes
+            self.failures += int(failed)
+
+    def summary(self) -> Dict:
+        """
+        Returns:
+            Dict: Windows, rows/s, MB/s, p50/p99 window latency (ms), failures and peak RSS (MB).
+        """
+        seconds = max(self.seconds, 1e-9)
+        latencies = sorted(self.latencies)
+        return {
+            "scenario": self.scenario,
+            "windows": len(latencies),
+            "rows_per_s": round(self.rows / seconds, 1),
+            "mb_per_s": round(self.bytes / seconds / (1024 * 1024), 2),
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+            "failures": self.failures,
+            "seconds": round(self.seconds, 2),
+            "peak_rss_mb": round(_peak_rss_bytes() / (1024 * 1024), 1),
+        }
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def _peak_rss_bytes() -> int:
+    # ru_maxrss is in KiB on Linux; encode worker processes count as children
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * 1024
+
+
+def _windows(args) -> List[Tuple[datetime, datetime]]:
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    step = timedelta(minutes=args.window_minutes)
+    return [(start + step * index, start + step * (index + 1)) for index in range(args.windows)]
+
+
+def _logs_client(endpoint: str):
+    """`LogsQueryClient` for the fake query API, which serves plain HTTP."""
+    from azure.core.credentials import AccessToken
+    from azure.core.pipeline.transport import RequestsTransport
+    from azure.monitor.query import LogsQueryClient
+
+    class StaticCredential:
+        def get_token(self, *scopes, **kwargs):
+            return AccessToken("benchmark", int(time.time()) + 3600)
+
+    class LocalTransport(RequestsTransport):
+        # Bearer tokens are only sent over https, so requests are addressed to https and sent over http
+        def send(self, request, **kwargs):
+            url = request.url
+            request.url = url.replace("https://", "http://", 1)
+            try:
+                return super().send(request, **kwargs)
+            finally:
+                # Retries pass the same request through the authentication policy again
+                request.url = url
+
+    return LogsQueryClient(
+        StaticCredential(), endpoint=endpoint.replace("http://", "https://", 1), transport=LocalTransport()
+    )
+
+
+def _configure(args, work_dir: Path):
+    """Point the settings at the fake services and a scratch directory."""
+    from export_pipeline.config import configure
+
+    settings = configure()
+    settings.workspace_id = "benchmark"
+    settings.storage_container_base_url = f"{args.blob_url}/"
+    settings.storage_sas_token = "sv=benchmark"
+    settings.retry_delay_seconds = args.retry_delay
+    settings.export_dir = str(work_dir / "export")
+    settings.journal_path = str(work_dir / "journal.db")
+    if args.encode_processes is not None:
+        settings.encode_processes = args.encode_processes
+
+
+def bench_query(args, work_dir: Path) -> BenchmarkResult:
+    """`LogAnalyticsExporter.query_rows` over `--windows` windows on `--workers` threads."""
+    from export_pipeline.kql_exporter import LogAnalyticsExporter
+
+    class OfflineExporter(LogAnalyticsExporter):
+        # Only `query_rows` is benchmarked, so the MSTICPy provider is never connected
+        def __init__(self):
+            super().__init__()
+            self._logs_client = _logs_client(args.log_analytics_url)
+
+    exporter = OfflineExporter()
+    result = BenchmarkResult("query")
+
+    def query(window: Tuple[datetime, datetime]):
+        started = time.perf_counter()
+        rows = exporter.query_rows(KQL.replace("{table}", args.table), *window)
+        result.record(
+            time.perf_counter() - started,
+            rows=len(rows.rows) if rows else 0,
+            bytes=(rows.bytes or 0) if rows else 0,
+            failed=rows is None,
+        )
+
+    _run_all(result, query, _windows(args), args.workers)
+    return result
+
+
+def bench_upload(args, work_dir: Path) -> BenchmarkResult:
+    """`upload_blob` of `--windows` files of `--file-mb` MB on `--workers` threads."""
+    from export_pipeline.blob_uploader import upload_blob
+
+    source_dir = work_dir / "upload"
+    source_dir.mkdir(parents=True, exist_ok=True)
+    payload = (b"0123456789abcdef" * 65536) * math.ceil(args.file_mb)
+    files = []
+    for index in range(args.windows):
+        path = source_dir / f"{args.table}_{index:05d}.json"
+        path.write_bytes(payload[: int(args.file_mb * 1024 * 1024)])
+        files.append(path)
+    result = BenchmarkResult("upload")
+
+    def upload(path: Path):
+        started = time.perf_counter()
+        uploaded = upload_blob(path, "benchmark", content_type="application/json", table=args.table)
+        result.record(time.perf_counter() - started, bytes=path.stat().st_size, failed=not uploaded)
+
+    _run_all(result, upload, files, args.workers)
+    return result
+
+
+def bench_notebook(args, work_dir: Path) -> BenchmarkResult:
+    """The notebooks' `export_day` over `--days` days on `--workers` threads, with the Azure SDK clients."""
+    from azure.core.exceptions import ResourceExistsError
+    from azure.monitor.query import LogsQueryStatus
+    from azure.storage.blob import BlobServiceClient, ContentSettings
+    from export_pipeline.blob_uploader import SOURCE_MD5_KEY, CountingStream, source_md5, unchanged_size
+    from export_pipeline.compression import codec_for
+    from export_pipeline.encoder import get_encode_pool
+    from export_pipeline.formats import get_output_format
+    from export_pipeline.governor import get_governor
+    from export_pipeline.journal import get_journal
+    from export_pipeline.kql_exporter import AdaptiveWindowController, result_bytes, window_query
+    from export_pipeline.metrics import get_metrics
+    from export_pipeline.profiles import validated_profile
+
+    result = BenchmarkResult("notebook")
+    output_format = get_output_format("jsonl")
+    blob_service_client = BlobServiceClient(args.blob_url)
+    try:
+        container_client = blob_service_client.create_container("benchmark")
+    except ResourceExistsError:
+        container_client = blob_service_client.get_container_client("benchmark")
+
+    namespace = {
+        "AdaptiveWindowController": AdaptiveWindowController,
+        "ContentSettings": ContentSettings,
+        "CountingStream": CountingStream,
+        "LogsQueryStatus": LogsQueryStatus,
+        "SOURCE_MD5_KEY": SOURCE_MD5_KEY,
+        "codec": codec_for(args.table, output_format.name),
+        "encode_pool": get_encode_pool(),
+        "governor": get_governor(),
+        "journal": _TimedJournal(get_journal(), result),
+        "logs_client": _logs_client(args.log_analytics_url),
+        "metrics": get_metrics(),
+        "output_format": output_format,
+        "result_bytes": result_bytes,
+        "source_md5": source_md5,
+        "time": time,
+        "timedelta": timedelta,
+        "unchanged_size": unchanged_size,
+        "validated_profile": validated_profile,
+        "window_query": window_query,
+        "workspace_id": "benchmark",
+    }
+    export_day = _load_function(Path(args.notebook), "export_day", namespace)
+    first_day = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    days = [first_day + timedelta(days=index) for index in range(args.days)]
+    time_chunk = timedelta(minutes=args.window_minutes)
+
+    _run_all(result, lambda day: export_day(args.table, day, time_chunk, container_client), days, args.workers)
+    return result
+
+
+class _TimedJournal:
+    """Journal wrapper timing each window from `start` to `complete` or `fail`."""
+
+    def __init__(self, journal, result: BenchmarkResult):
+        self._journal = journal
+        self._result = result
+        self._started: Dict[Tuple, float] = {}
+
+    def start(self, table_name, start, end):
+        self._started[(table_name, start, end)] = time.perf_counter()
+        self._journal.start(table_name, start, end)
+
+    def complete(self, table_name, start, end, rows, bytes, blobs):
+        self._finish(table_name, start, end, rows=rows, bytes=bytes)
+        self._journal.complete(table_name, start, end, rows, bytes, blobs)
+
+    def fail(self, table_name, start, end, error):
+        # Bisected windows are not failures; their halves are timed separately
+        self._finish(table_name, start, end, failed="bisected" not in error)
+        self._journal.fail(table_name, start, end, error)
+
+    def _finish(self, table_name, start, end, rows=0, bytes=0, failed=False):
+        started = self._started.pop((table_name, start, end), None)
+        if started is not None:
+            self._result.record(time.perf_counter() - started, rows=rows, bytes=bytes, failed=failed)
+
+    def __getattr__(self, name):
+        return getattr(self._journal, name)
+
+
+def _load_function(path: Path, name: str, namespace: Dict) -> Callable:
+    """Compile one top-level function of a notebook script without running the script itself."""
+    tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+    functions = [node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == name]
+    if not functions:
+        raise ValueError(f"{path} defines no function {name}")
+    exec(compile(ast.Module(body=functions, type_ignores=[]), str(path), "exec"), namespace)
+    return namespace[name]
+
+
+def _run_all(result: BenchmarkResult, func: Callable, items: List, workers: int):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(func, items))
+    result.seconds = time.perf_counter() - started
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "query": bench_query,
+    "upload": bench_upload,
+    "notebook": bench_notebook,
+}
+
+
+def run_scenario(args) -> Dict:
+    """Run one scenario in this process and return its summary."""
+    with tempfile.TemporaryDirectory(prefix="export-bench-") as work_dir:
+        _configure(args, Path(work_dir))
+        return SCENARIOS[args.scenario](args, Path(work_dir)).summary()
+
+
+def start_fake_services(args) -> Tuple[subprocess.Popen, Dict[str, str]]:
+    """Start the fake services in their own process, so they do not compete for this one's GIL."""
+    command = [
+        sys.executable, "-m", "export_pipeline.benchmarks.fake_services",
+        "--rows-per-minute", str(args.rows_per_minute),
+        "--row-bytes", str(args.row_bytes),
+        "--query-latency-ms", str(args.query_latency_ms),
+        "--partial-rate", str(args.partial_rate),
+        "--throttle-rate", str(args.throttle_rate),
+        "--blob-latency-ms", str(args.blob_latency_ms),
+        "--blob-failure-rate", str(args.blob_failure_rate),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    urls = json.loads(process.stdout.readline())
+    return process, urls
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """
+    Compare throughput with a baseline run.
+
+    Returns:
+        List[str]: One line per metric that fell more than `tolerance` below the baseline.
+    """
+    previous = {entry["scenario"]: entry for entry in baseline}
+    regressions = []
+    for entry in results:
+        before = previous.get(entry["scenario"])
+        if before is None:
+            continue
+        for metric in THROUGHPUT_METRICS:
+            if before[metric] and entry[metric] < before[metric] * (1 - tolerance):
+                regressions.append(f"{entry['scenario']} {metric}: {entry[metric]} vs. baseline {before[metric]}")
+    return regressions
+
+
+def _print_table(results: List[Dict]):
+    columns = ["scenario", "windows", "rows_per_s", "mb_per_s", "p50_ms", "p99_ms", "failures", "peak_rss_mb"]
+    widths = [max(len(column), *(len(str(entry[column])) for entry in results)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for entry in results:
+        print("  ".join(str(entry[column]).ljust(width) for column, width in zip(columns, widths)))
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the export pipeline against local fake services.")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="Scenario to run; repeat for several (default: all)")
+    parser.add_argument("--table", default="BenchmarkTable")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--windows", type=int, default=48, help="Windows queried or files uploaded")
+    parser.add_argument("--window-minutes", type=int, default=60)
+    parser.add_argument("--days", type=int, default=2, help="Days exported by the notebook scenario")
+    parser.add_argument("--file-mb", type=float, default=16.0, help="Size of each uploaded file")
+    parser.add_argument("--encode-processes", type=int, default=None)
+    parser.add_argument("--retry-delay", type=int, default=0, help="Seconds between upload retries")
+    parser.add_argument("--rows-per-minute", type=int, default=1000)
+    parser.add_argument("--row-bytes", type=int, default=200)
+    parser.add_argument("--query-latency-ms", type=float, default=50.0)
+    parser.add_argument("--partial-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--blob-latency-ms", type=float, default=5.0)
+    parser.add_argument("--blob-failure-rate", type=float, default=0.0)
+    parser.add_argument("--notebook", default="notebook/v3.py", help="Notebook script defining export_day")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare throughput with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed throughput drop vs. the baseline")
+    # Set by the parent process when it runs one scenario per child
+    parser.add_argument("--log-analytics-url", help=argparse.SUPPRESS)
+    parser.add_argument("--blob-url", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.log_analytics_url:
+        # Child: one scenario against services started by the parent
+        args.scenario = args.scenario[0]
+        print(json.dumps(run_scenario(args)), flush=True)
+        return 0
+
+    # Each scenario runs in a fresh process so peak RSS is its own
+    services, urls = start_fake_services(args)
+    results = []
+    try:
+        passthrough = _strip_options(
+            sys.argv[1:] if argv is None else argv, ("--scenario", "--output", "--baseline", "--tolerance")
+        )
+        for scenario in args.scenario or list(SCENARIOS):
+            child = subprocess.run(
+                [sys.executable, "-m", "export_pipeline.benchmarks.harness", *passthrough,
+                 "--scenario", scenario, "--log-analytics-url", urls["log_analytics_url"], "--blob-url", urls["blob_url"]],
+                stdout=subprocess.PIPE, text=True,
+            )
+            if child.returncode != 0:
+                print(f"Scenario {scenario} failed with exit code {child.returncode}", file=sys.stderr)
+                return child.returncode
+            results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+    finally:
+        services.terminate()
+        services.wait()
+
+    _print_table(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+        for line in regressions:
+            print(f"Throughput regression: {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+def _strip_options(argv: List[str], names: Tuple[str, ...]) -> List[str]:
+    """Drop options (and their values) that only the parent process handles."""
+    kept, skip = [], False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        name = arg.split("=", 1)[0]
+        if name in names:
+            skip = "=" not in arg
+            continue
+        kept.append(arg)
+    return kept
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# export_pipeline/benchmarks/startup.py
+
+"""
+Module: startup
+Purpose: Measure the import time of the pipeline's entry modules and fail when it regresses or heavy dependencies load eagerly.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Modules a short incremental run imports before doing any work
+ENTRY_MODULES = ("export_pipeline.main", "export_pipeline.compactor", "export_pipeline.config")
+
+# Dependencies that take seconds to import; only the code paths that use them may load them
+LAZY_MODULES = ("pandas", "pyarrow", "msticpy", "azure.identity", "azure.monitor.query", "azure.storage.blob")
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "eager": [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(module: str, runs: int) -> Dict:
+    """
+    Import `module` in `runs` fresh interpreters.
+
+    Returns:
+        Dict: Median and best import time (ms), the lazy dependencies it loaded and
+        the slowest imports of one run, from `python -X importtime`.
+    """
+    timings = []
+    eager: List[str] = []
+    for _ in range(runs):
+        child = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, lazy=LAZY_MODULES)],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True,
+        )
+        probe = json.loads(child.stdout.strip().splitlines()[-1])
+        timings.append(probe["seconds"])
+        eager = probe["eager"]
+
+    return {
+        "module": module,
+        "median_ms": round(statistics.median(timings) * 1000, 1),
+        "best_ms": round(min(timings) * 1000, 1),
+        "eager": eager,
+        "slowest": _slowest_imports(module),
+    }
+
+
+def _slowest_imports(module: str, count: int = 5) -> List[str]:
+    """Modules imported by `module` with the highest cumulative import time, as "name: ms"."""
+    # Modules the interpreter loads at startup are not the module's doing
+    startup = {name for _, name in _import_times("pass")}
+    entries = [(us, name) for us, name in _import_times(f"import {module}") if name not in startup and name != module]
+    return [f"{name}: {us / 1000:.1f}" for us, name in sorted(entries, reverse=True)[:count]]
+
+
+def _import_times(code: str) -> List[Tuple[int, str]]:
+    """(cumulative microseconds, module) for every import made running `code`."""
+    child = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    entries = []
+    for line in child.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            entries.append((int(cumulative), name.strip()))
+    return entries
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """
+    Compare median import times with a baseline run.
+
+    Returns:
+        List[str]: One line per module more than `tolerance` slower than the baseline.
+    """
+    previous = {entry["module"]: entry for entry in baseline}
+    regressions = []
+    for entry in results:
+        before = previous.get(entry["module"])
+        if before and entry["median_ms"] > before["median_ms"] * (1 + tolerance):
+            regressions.append(f"{entry['module']}: {entry['median_ms']} ms vs. baseline {before['median_ms']} ms")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Check the import time of the export pipeline.")
+    parser.add_argument("--module", action="append", help="Module to import; repeat for several (default: entry modules)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--budget-ms", type=float, default=0, help="Fail when a median import takes longer (0 = no limit)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare import times with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed import time increase vs. the baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = [measure(module, args.runs) for module in args.module or ENTRY_MODULES]
+
+    failures = []
+    for entry in results:
+        print(f"{entry['module']}: {entry['median_ms']} ms median, {entry['best_ms']} ms best")
+        for line in entry["slowest"]:
+            print(f"    {line} ms")
+        if entry["eager"]:
+            failures.append(f"{entry['module']} imports {', '.join(entry['eager'])} eagerly")
+        if args.budget_ms and entry["median_ms"] > args.budget_ms:
+            failures.append(f"{entry['module']}: {entry['median_ms']} ms over the {args.budget_ms} ms budget")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.baseline:
+        failures += compare(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+    for line in failures:
+        print(f"Startup regression: {line}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,45 +5,673 @@ Module: blob_uploader
 Purpose: Uploads data files to Azure Blob Storage with retry logic.
 """
 
+import base64
+import hashlib
+import queue
+import threading
 import time
+import xml.etree.ElementTree as ElementTree
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+from requests.adapters import HTTPAdapter
 from export_pipeline.config import settings
 from export_pipeline.logger import logger
+from export_pipeline.metrics import get_metrics
 
+# Content types by exported file extension
+CONTENT_TYPES = {
+    ".json": "application/json",
+    ".parquet": "application/vnd.apache.parquet",
+    ".txt": "text/plain",
+}
 
-def upload_blob(file_path: Path, container_name: str) -> bool:
+# Content encodings by compressed file extension
+CONTENT_ENCODINGS = {
+    ".gz": "gzip",
+    ".zst": "zstd",
+}
+
+# Read size when hashing a file that was not hashed while it was written
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# Blob metadata key holding the MD5 of a streamed upload's uncompressed content
+SOURCE_MD5_KEY = "source_md5"
+
+# Blobs listed per List Blobs request
+LIST_PAGE_SIZE = 5000
+
+
+class HashingWriter:
+    """
+    Binary sink wrapper computing the MD5 of everything written through it.
+
+    Wrap the file a window is encoded into (under the compression codec), so the
+    blob's content hash is known once encoding finishes, without reading the
+    file again.
+    """
+
+    def __init__(self, sink: BinaryIO):
+        self._sink = sink
+        self._md5 = hashlib.md5()
+
+    def write(self, data) -> int:
+        self._md5.update(data)
+        return self._sink.write(data)
+
+    @property
+    def content_md5(self) -> str:
+        """Base64 MD5 digest of the bytes written, as sent in a Content-MD5 header."""
+        return base64.b64encode(self._md5.digest()).decode("ascii")
+
+    def __getattr__(self, name):
+        return getattr(self._sink, name)
+
+
+def file_md5(file_path: Path) -> str:
+    """Base64 MD5 digest of a file's content."""
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            md5.update(chunk)
+    return base64.b64encode(md5.digest()).decode("ascii")
+
+
+class CountingStream:
+    """
+    Re-iterable stream of chunks that counts the bytes handed out.
+
+    Pass one to `BlobClient.upload_blob` to upload `codec.stream(data)` without
+    holding the compressed blob in memory. Each iteration starts the stream
+    afresh, so a retried upload sends the whole content again, and `bytes` is
+    the size of the last upload.
+    """
+
+    def __init__(self, chunks: Callable[[], Iterable[bytes]]):
+        """
+        Args:
+            chunks (Callable[[], Iterable[bytes]]): Returns a new chunk stream, e.g. `lambda: codec.stream(data)`.
+        """
+        self._chunks = chunks
+        self.bytes = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        self.bytes = 0
+        for chunk in self._chunks():
+            self.bytes += len(chunk)
+            yield chunk
+
+
+def window_metadata(start: datetime, end: datetime, rows: int) -> Dict[str, str]:
+    """
+    Blob metadata recording the export window a blob holds and its row count.
+
+    Every worker of a distributed export keeps its own journal, so the blobs
+    themselves tell reconciliation which windows the other workers exported.
+    """
+    return {"window_start": start.isoformat(), "window_end": end.isoformat(), "rows": str(rows)}
+
+
+def source_md5(data: bytes) -> str:
+    """Base64 MD5 digest of a window's encoded content, before compression."""
+    return base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+
+
+def stored_size(properties: Any, digest: str) -> Optional[int]:
+    """
+    Size of a blob whose `SOURCE_MD5_KEY` metadata matches `digest`, else None.
+
+    Blob names carry the codec's suffix, so the same name and source content
+    mean the same stored bytes.
+    """
+    if (properties.metadata or {}).get(SOURCE_MD5_KEY) != digest:
+        return None
+    return properties.size
+
+
+def unchanged_size(blob_client: Any, digest: str) -> Optional[int]:
+    """
+    Check whether a blob already holds the content of a streamed Azure SDK upload.
+
+    Streamed uploads are compressed as they are sent, so the MD5 of the stored
+    bytes is only known afterwards. They record the MD5 of the uncompressed
+    content (`source_md5`) in the blob's metadata instead, and a rerun compares
+    against that.
+
+    Args:
+        blob_client (Any): `azure.storage.blob.BlobClient` of the blob about to be uploaded.
+        digest (str): `source_md5` of the content to upload.
+
+    Returns:
+        Optional[int]: The stored blob's size if the upload can be skipped; None if the blob
+        is missing, differs, has no recorded digest, or `upload_skip_unchanged` is off.
+    """
+    if not settings.upload_skip_unchanged:
+        return None
+    try:
+        properties = blob_client.get_blob_properties()
+    except Exception:
+        return None
+    return stored_size(properties, digest)
+
+
+class SessionPool:
+    """
+    Thread-safe pool of `requests` sessions sharing one keep-alive connection pool.
+
+    Sessions are checked out per request, so no session is ever used by two threads
+    at once, while the shared adapter lets every thread reuse the same TCP/TLS
+    connections to the storage account.
+    """
+
+    def __init__(self, pool_size: int):
+        self.pool_size = pool_size
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self._sessions: "queue.LifoQueue[requests.Session]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._requests = 0
+
+    def new_session(self) -> requests.Session:
+        """Create a session mounted on the shared adapter (e.g. for an Azure SDK transport)."""
+        session = requests.Session()
+        session.headers["Connection"] = "keep-alive"
+        session.mount("https://", self._adapter)
+        session.mount("http://", self._adapter)
+        return session
+
+    @contextmanager
+    def session(self) -> Iterator[requests.Session]:
+        """Check out a session for the duration of one request."""
+        try:
+            session = self._sessions.get_nowait()
+        except queue.Empty:
+            session = self.new_session()
+        try:
+            yield session
+        finally:
+            self._sessions.put(session)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        """Issue a PUT through a pooled session."""
+        return self.request("PUT", url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Issue a request through a pooled session."""
+        with self._lock:
+            self._requests += 1
+        with self.session() as session:
+            return session.request(method, url, **kwargs)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Connection reuse statistics for the shared connection pool.
+
+        Returns:
+            Dict[str, int]: Requests issued, connections opened and requests served by reused connections.
+        """
+        pools = self._adapter.poolmanager.pools
+        connections = sum(pools[key].num_connections for key in pools.keys())
+        with self._lock:
+            issued = self._requests
+        return {
+            "requests": issued,
+            "connections": connections,
+            "reused": max(0, issued - connections),
+        }
+
+
+_session_pool: Optional[SessionPool] = None
+_session_pool_lock = threading.Lock()
+
+
+def get_session_pool(pool_size: Optional[int] = None) -> SessionPool:
+    """
+    Return the shared session pool used by all uploads, creating it on first use.
+
+    Args:
+        pool_size (Optional[int]): Connections kept alive per host. Defaults to the number
+            of concurrent upload workers (`upload_workers * upload_max_concurrency`).
+
+    Returns:
+        SessionPool: The shared pool.
+    """
+    global _session_pool
+    with _session_pool_lock:
+        if _session_pool is None:
+            _session_pool = SessionPool(pool_size or settings.upload_workers * settings.upload_max_concurrency)
+        return _session_pool
+
+
+def log_connection_stats():
+    """Log connection reuse for the shared upload session pool."""
+    stats = get_session_pool().stats()
+    logger.info(
+        f"Upload connections: {stats['requests']} requests over {stats['connections']} connections "
+        f"({stats['reused']} reused)"
+    )
+
+
+def upload_blob(
+    file_path: Path,
+    container_name: str,
+    content_type: Optional[str] = None,
+    content_encoding: Optional[str] = None,
+    table: Optional[str] = None,
+    content_md5: Optional[str] = None,
+    metadata: Optional[Dict[str, str]] = None,
+) -> bool:
     """
     Uploads a local file to Azure Blob Storage using a pre-generated SAS token.
+
+    Files larger than `upload_block_size_mb` are staged as blocks in parallel
+    (Put Block) and committed with Put Block List; smaller files use a single Put Blob.
+
+    The file's MD5 is sent with the upload, so the service verifies the content
+    and stores the hash on the blob. With `upload_skip_unchanged`, a blob that
+    already holds the same MD5 (e.g. uploaded by an interrupted earlier run) is
+    not uploaded again.
     
     Args:
         file_path (Path): Path to the local file to upload.
         container_name (str): Target container name in Blob Storage.
+        content_type (Optional[str]): Blob Content-Type. Derived from the file extension if omitted.
+        content_encoding (Optional[str]): Blob Content-Encoding (e.g. "gzip"). Derived from a
+            compressed file extension (.gz, .zst) if omitted.
+        table (Optional[str]): Source table, used to label upload metrics. Defaults to the container name.
+        content_md5 (Optional[str]): Base64 MD5 of the file, e.g. from a `HashingWriter` used while
+            encoding it. Computed from the file if omitted.
+        metadata (Optional[Dict[str, str]]): Blob metadata, e.g. from `window_metadata`.
         
     Returns:
-        bool: True if upload is successful, False otherwise.
+        bool: True if upload is successful or the blob already holds the file, False otherwise.
     """
-    blob_name = file_path.name
-    blob_url = f"{settings.storage_container_base_url}{container_name}/{blob_name}?{settings.storage_sas_token}"
+    blob_url = _blob_url(container_name, file_path.name)
+    content_encoding = content_encoding or CONTENT_ENCODINGS.get(file_path.suffix)
+    # The Content-Type of a compressed file is that of the file inside it
+    inner_suffix = Path(file_path.stem).suffix if file_path.suffix in CONTENT_ENCODINGS else file_path.suffix
+    content_type = content_type or CONTENT_TYPES.get(inner_suffix, "application/octet-stream")
+
+    table = table or container_name
+    size = file_path.stat().st_size
+    started = time.perf_counter()
+
+    content_md5 = content_md5 or file_md5(file_path)
+    if settings.upload_skip_unchanged and _stored_md5(blob_url) == content_md5:
+        logger.info(
+            "⏭️ Skipped %s: container %s already holds identical content", file_path.name, container_name,
+            extra={"table": table, "blob": file_path.name, "bytes": size},
+        )
+        get_metrics().upload_done(table, time.perf_counter() - started, size, skipped=True)
+        return True
+
+    if size > settings.upload_block_size_mb * 1024 * 1024:
+        uploaded = _upload_blocks(file_path, container_name, blob_url, content_type, content_encoding, table, content_md5, metadata)
+        get_metrics().upload_done(table, time.perf_counter() - started, size, failed=not uploaded)
+        return uploaded
 
     headers = {
         "x-ms-blob-type": "BlockBlob",
-        "Content-Type": "application/json"
+        "Content-Type": content_type,
+        # Verified by the service and stored as the blob's Content-MD5
+        "Content-MD5": content_md5,
     }
+    if content_encoding:
+        headers["x-ms-blob-content-encoding"] = content_encoding
+    headers.update(_metadata_headers(metadata))
 
     for attempt in range(1, settings.max_retries + 1):
+        status = None
         try:
             with open(file_path, "rb") as data:
-                response = requests.put(blob_url, headers=headers, data=data)
+                response = get_session_pool().put(blob_url, headers=headers, data=data)
                 if response.status_code in [201, 202]:
-                    logger.info(f"✅ Uploaded {file_path.name} to container {container_name}")
+                    logger.info(
+                        "✅ Uploaded %s to container %s", file_path.name, container_name,
+                        extra={"table": table, "blob": file_path.name, "bytes": size},
+                    )
+                    get_metrics().upload_done(table, time.perf_counter() - started, size)
                     return True
                 else:
+                    status = response.status_code
                     logger.warning(f"⚠️ Attempt {attempt}: Failed to upload {file_path.name} — Status {response.status_code}, Response: {response.text}")
         except Exception as e:
             logger.error(f"❌ Attempt {attempt}: Exception during upload — {str(e)}")
 
+        if attempt < settings.max_retries:
+            get_metrics().retry("upload", table, status)
         time.sleep(settings.retry_delay_seconds)
 
     logger.error(f"❌ Failed to upload {file_path.name} after {settings.max_retries} attempts.")
+    get_metrics().upload_done(table, time.perf_counter() - started, failed=True)
+    return False
+
+
+def _stored_md5(blob_url: str) -> Optional[str]:
+    """Content-MD5 of an existing blob; None if it does not exist, has none or cannot be read."""
+    try:
+        response = get_session_pool().request("HEAD", blob_url)
+    except Exception:
+        return None
+    if response.status_code != 200:
+        return None
+    return response.headers.get("Content-MD5")
+
+
+def upload_buffer_bytes(file_size: int) -> int:
+    """
+    Memory `upload_blob` holds while uploading a file of `file_size` bytes.
+
+    Single Put Blob uploads stream from disk; block uploads hold one block per
+    concurrent worker.
+
+    Args:
+        file_size (int): Size of the file to upload.
+
+    Returns:
+        int: Bytes buffered at most.
+    """
+    block_size = settings.upload_block_size_mb * 1024 * 1024
+    if file_size <= block_size:
+        return 0
+    return min(file_size, block_size * settings.upload_max_concurrency)
+
+
+def _upload_blocks(
+    file_path: Path,
+    container_name: str,
+    blob_url: str,
+    content_type: str,
+    content_encoding: Optional[str] = None,
+    table: Optional[str] = None,
+    content_md5: Optional[str] = None,
+    metadata: Optional[Dict[str, str]] = None,
+) -> bool:
+    """
+    Uploads a large file as staged blocks in parallel and commits them with Put Block List.
+
+    Each block is read from disk by its own worker and retried independently, so a
+    failure only resends that block rather than the whole file. Every block carries
+    its own MD5 for the service to verify.
+
+    Args:
+        file_path (Path): Path to the local file to upload.
+        container_name (str): Target container name in Blob Storage.
+        blob_url (str): Blob URL including the SAS token.
+        content_type (str): Blob Content-Type set on commit.
+        content_encoding (Optional[str]): Blob Content-Encoding set on commit.
+        table (Optional[str]): Source table, used to label retry metrics. Defaults to the container name.
+        content_md5 (Optional[str]): Base64 MD5 of the whole file, stored on the committed blob.
+        metadata (Optional[Dict[str, str]]): Blob metadata set on commit.
+
+    Returns:
+        bool: True if all blocks were staged and committed, False otherwise.
+    """
+    table = table or container_name
+    block_size = settings.upload_block_size_mb * 1024 * 1024
+    file_size = file_path.stat().st_size
+    offsets = range(0, file_size, block_size)
+    block_ids = [_block_id(index) for index in range(len(offsets))]
+
+    with ThreadPoolExecutor(max_workers=settings.upload_max_concurrency) as executor:
+        staged = list(executor.map(
+            lambda args: _put_block(file_path, blob_url, *args, table=table),
+            [(block_id, offset, min(block_size, file_size - offset)) for block_id, offset in zip(block_ids, offsets)],
+        ))
+
+    failed = staged.count(False)
+    if failed:
+        logger.error(f"❌ Failed to stage {failed}/{len(block_ids)} blocks of {file_path.name}; blob not committed.")
+        return False
+
+    if _put_block_list(blob_url, block_ids, content_type, content_encoding, table, content_md5, metadata):
+        logger.info(
+            "✅ Uploaded %s to container %s (%d blocks)", file_path.name, container_name, len(block_ids),
+            extra={"table": table, "blob": file_path.name},
+        )
+        return True
+
+    logger.error(f"❌ Failed to commit block list for {file_path.name} after {settings.max_retries} attempts.")
+    return False
+
+
+def _block_id(index: int) -> str:
+    """Base64 block ID; all IDs of a blob must have the same length."""
+    return base64.b64encode(f"{index:08d}".encode("utf-8")).decode("ascii")
+
+
+def _put_block(file_path: Path, blob_url: str, block_id: str, offset: int, length: int, table: str = "") -> bool:
+    """Stages one block of a file, retrying only this block on failure."""
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+
+    block_url = f"{blob_url}&comp=block&blockid={quote(block_id, safe='')}"
+    headers = {"Content-MD5": base64.b64encode(hashlib.md5(data).digest()).decode("ascii")}
+    for attempt in range(1, settings.max_retries + 1):
+        status = None
+        try:
+            response = get_session_pool().put(block_url, headers=headers, data=data)
+            if response.status_code == 201:
+                return True
+            status = response.status_code
+            logger.warning(f"⚠️ Attempt {attempt}: Failed to stage block {block_id} of {file_path.name} — Status {response.status_code}")
+        except Exception as e:
+            logger.error(f"❌ Attempt {attempt}: Exception staging block {block_id} of {file_path.name} — {str(e)}")
+
+        if attempt < settings.max_retries:
+            get_metrics().retry("upload", table, status)
+        time.sleep(settings.retry_delay_seconds)
+
+    return False
+
+
+def _put_block_list(
+    blob_url: str,
+    block_ids: List[str],
+    content_type: str,
+    content_encoding: Optional[str] = None,
+    table: str = "",
+    content_md5: Optional[str] = None,
+    metadata: Optional[Dict[str, str]] = None,
+) -> bool:
+    """Commits staged blocks, in order, as the blob content, storing `content_md5` and `metadata` on the blob if given."""
+    body = (
+        '<?xml version="1.0" encoding="utf-8"?><BlockList>'
+        + "".join(f"<Latest>{block_id}</Latest>" for block_id in block_ids)
+        + "</BlockList>"
+    )
+    headers = {
+        "Content-Type": "application/xml",
+        "x-ms-blob-content-type": content_type,
+    }
+    if content_encoding:
+        headers["x-ms-blob-content-encoding"] = content_encoding
+    if content_md5:
+        headers["x-ms-blob-content-md5"] = content_md5
+    headers.update(_metadata_headers(metadata))
+
+    for attempt in range(1, settings.max_retries + 1):
+        status = None
+        try:
+            response = get_session_pool().put(f"{blob_url}&comp=blocklist", headers=headers, data=body.encode("utf-8"))
+            if response.status_code == 201:
+                return True
+            status = response.status_code
+            logger.warning(f"⚠️ Attempt {attempt}: Failed to commit block list — Status {response.status_code}, Response: {response.text}")
+        except Exception as e:
+            logger.error(f"❌ Attempt {attempt}: Exception committing block list — {str(e)}")
+
+        if attempt < settings.max_retries:
+            get_metrics().retry("upload", table, status)
+        time.sleep(settings.retry_delay_seconds)
+
     return False
+
+
+# Service version for Put Block From URL, which the SAS version alone may not enable
+COPY_API_VERSION = "2021-08-06"
+
+
+def _blob_url(container_name: str, blob_name: str) -> str:
+    return f"{settings.storage_container_base_url}{container_name}/{quote(blob_name)}?{settings.storage_sas_token}"
+
+
+def _metadata_headers(metadata: Optional[Dict[str, str]]) -> Dict[str, str]:
+    return {f"x-ms-meta-{key}": value for key, value in (metadata or {}).items()}
+
+
+def compose_blob(
+    container_name: str,
+    blob_name: str,
+    source_names: List[str],
+    content_type: str,
+    content_encoding: Optional[str] = None,
+    metadata: Optional[Dict[str, str]] = None,
+) -> bool:
+    """
+    Creates a blob from the concatenated contents of existing blobs, server side.
+
+    Each source becomes one block staged with Put Block From URL, so no data passes
+    through this machine, and the blob appears atomically when the block list is
+    committed. Valid for formats whose files can be concatenated (JSON Lines,
+    gzip members, zstd frames).
+
+    Args:
+        container_name (str): Container holding the sources and the new blob.
+        blob_name (str): Name of the blob to create or overwrite.
+        source_names (List[str]): Source blobs, in content order.
+        content_type (str): Blob Content-Type.
+        content_encoding (Optional[str]): Blob Content-Encoding.
+        metadata (Optional[Dict[str, str]]): Blob metadata.
+
+    Returns:
+        bool: True if every block was staged and the blob committed, False otherwise.
+    """
+    blob_url = _blob_url(container_name, blob_name)
+    block_ids = [_block_id(index) for index in range(len(source_names))]
+
+    with ThreadPoolExecutor(max_workers=settings.upload_max_concurrency) as executor:
+        staged = list(executor.map(
+            lambda args: _put_block_from_url(blob_url, *args),
+            [(block_id, _blob_url(container_name, source)) for block_id, source in zip(block_ids, source_names)],
+        ))
+
+    if not all(staged):
+        logger.error(f"❌ Failed to stage {staged.count(False)}/{len(block_ids)} sources of {blob_name}; blob not committed.")
+        return False
+    if _put_block_list(blob_url, block_ids, content_type, content_encoding, container_name, metadata=metadata):
+        logger.info("✅ Composed %s from %d blobs in container %s", blob_name, len(source_names), container_name)
+        return True
+    return False
+
+
+def _put_block_from_url(blob_url: str, block_id: str, source_url: str) -> bool:
+    """Stages the whole content of another blob as one block."""
+    headers = {
+        "x-ms-version": COPY_API_VERSION,
+        "x-ms-copy-source": source_url,
+        "Content-Length": "0",
+    }
+    block_url = f"{blob_url}&comp=block&blockid={quote(block_id, safe='')}"
+    for attempt in range(1, settings.max_retries + 1):
+        try:
+            response = get_session_pool().put(block_url, headers=headers)
+            if response.status_code == 201:
+                return True
+            logger.warning(f"⚠️ Attempt {attempt}: Failed to stage block from {source_url.split('?')[0]} — Status {response.status_code}")
+        except Exception as e:
+            logger.error(f"❌ Attempt {attempt}: Exception staging block from URL — {str(e)}")
+
+        time.sleep(settings.retry_delay_seconds)
+
+    return False
+
+
+def download_blob(container_name: str, blob_name: str) -> Optional[bytes]:
+    """
+    Downloads a blob's stored bytes (still compressed if it has a Content-Encoding).
+
+    Returns:
+        Optional[bytes]: Blob content, or None if the download failed.
+    """
+    for attempt in range(1, settings.max_retries + 1):
+        try:
+            response = get_session_pool().request("GET", _blob_url(container_name, blob_name))
+            if response.status_code == 200:
+                return response.content
+            logger.warning(f"⚠️ Attempt {attempt}: Failed to download {blob_name} — Status {response.status_code}")
+        except Exception as e:
+            logger.error(f"❌ Attempt {attempt}: Exception downloading {blob_name} — {str(e)}")
+
+        time.sleep(settings.retry_delay_seconds)
+
+    return None
+
+
+def delete_blob(container_name: str, blob_name: str) -> bool:
+    """
+    Deletes a blob. A blob that no longer exists counts as deleted.
+
+    Returns:
+        bool: True if the blob is gone, False otherwise.
+    """
+    for attempt in range(1, settings.max_retries + 1):
+        try:
+            response = get_session_pool().request("DELETE", _blob_url(container_name, blob_name))
+            if response.status_code in [202, 404]:
+                return True
+            logger.warning(f"⚠️ Attempt {attempt}: Failed to delete {blob_name} — Status {response.status_code}")
+        except Exception as e:
+            logger.error(f"❌ Attempt {attempt}: Exception deleting {blob_name} — {str(e)}")
+
+        time.sleep(settings.retry_delay_seconds)
+
+    return False
+
+
+def list_blobs(container_name: str, prefix: str = "") -> List[Tuple[str, Dict[str, str]]]:
+    """
+    Lists the blobs of a container with their metadata.
+
+    Args:
+        container_name (str): Container to list.
+        prefix (str): Only list blob names starting with this prefix.
+
+    Returns:
+        List[Tuple[str, Dict[str, str]]]: (blob name, metadata by lowercase key) in name order;
+        empty if the container does not exist.
+
+    Raises:
+        RuntimeError: If a page cannot be listed after `max_retries` attempts.
+    """
+    blobs, marker = [], ""
+    while True:
+        query = f"restype=container&comp=list&include=metadata&maxresults={LIST_PAGE_SIZE}&prefix={quote(prefix)}"
+        if marker:
+            query += f"&marker={quote(marker)}"
+        url = f"{settings.storage_container_base_url}{container_name}?{'&'.join(filter(None, (query, settings.storage_sas_token)))}"
+        for attempt in range(1, settings.max_retries + 1):
+            try:
+                response = get_session_pool().request("GET", url)
+                if response.status_code in [200, 404]:
+                    break
+                logger.warning(f"⚠️ Attempt {attempt}: Failed to list container {container_name} — Status {response.status_code}")
+            except Exception as e:
+                logger.error(f"❌ Attempt {attempt}: Exception listing container {container_name} — {str(e)}")
+            time.sleep(settings.retry_delay_seconds)
+        else:
+            raise RuntimeError(f"Could not list container {container_name} after {settings.max_retries} attempts")
+        if response.status_code == 404:
+            return []
+
+        root = ElementTree.fromstring(response.content)
+        for blob in root.iter("Blob"):
+            metadata = blob.find("Metadata")
+            blobs.append((blob.findtext("Name"), {item.tag.lower(): item.text or "" for item in (metadata if metadata is not None else [])}))
+        marker = root.findtext("NextMarker") or ""
+        if not marker:
+            return blobs
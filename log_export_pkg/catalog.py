@@ -0,0 +1,512 @@
+# export_pipeline/catalog.py
+
+"""
+Module: catalog
+Purpose: Shared work catalog of (table, window) export tasks that workers on several machines claim with time-bounded leases.
+"""
+
+import random
+import sqlite3
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+from export_pipeline.blob_uploader import get_session_pool
+from export_pipeline.config import settings
+from export_pipeline.logger import logger
+
+Window = Tuple[datetime, datetime]
+
+# Task states
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    table_name    TEXT    NOT NULL,
+    window_start  TEXT    NOT NULL,
+    window_end    TEXT    NOT NULL,
+    state         TEXT    NOT NULL,
+    lease_id      TEXT,
+    worker        TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    error         TEXT,
+    updated_at    TEXT    NOT NULL,
+    PRIMARY KEY (table_name, window_start, window_end)
+);
+CREATE INDEX IF NOT EXISTS tasks_claimable ON tasks (state, window_start);
+"""
+
+
+@dataclass
+class Lease:
+    """A claimed task, held by one worker until it is completed, released or expires."""
+
+    table: str  # export key
+    start: datetime
+    end: datetime
+    lease_id: str
+    attempts: int = 0  # failed or abandoned earlier attempts
+    lost: bool = False  # set when a renewal fails; another worker may own the task now
+
+
+class WorkCatalog:
+    """
+    Base class of the stores holding the export tasks of a distributed run.
+
+    Tasks are published once, then claimed by any worker. A claim holds a
+    lease for `lease_seconds` that the worker renews while it works; if the
+    worker crashes, the lease expires and another worker claims the task,
+    counting the abandoned attempt. A task that fails `task_max_attempts` times
+    is set aside as failed instead of being claimed forever.
+    """
+
+    name = ""
+
+    def __init__(self, lease_seconds: Optional[int] = None, max_attempts: Optional[int] = None):
+        """
+        Args:
+            lease_seconds (Optional[int]): Lease duration. Defaults to `lease_seconds`.
+            max_attempts (Optional[int]): Attempts before a task fails. Defaults to `task_max_attempts`.
+        """
+        self.lease_seconds = lease_seconds or settings.lease_seconds
+        self.max_attempts = max_attempts or settings.task_max_attempts
+
+    def publish(self, table: str, windows: Iterable[Window]) -> int:
+        """
+        Add tasks for the windows of a table. Windows already in the catalog keep their state.
+
+        Args:
+            table (str): Export key of the table.
+            windows (Iterable[Window]): (start, end) windows.
+
+        Returns:
+            int: Tasks added.
+        """
+        raise NotImplementedError
+
+    def claim(self, worker_id: str) -> Optional[Lease]:
+        """
+        Lease a pending task that no other worker holds.
+
+        Returns:
+            Optional[Lease]: The claimed task, or None if every pending task is leased.
+        """
+        raise NotImplementedError
+
+    def renew(self, lease: Lease) -> bool:
+        """Extend a lease by `lease_seconds`; False if it expired and another worker claimed the task."""
+        raise NotImplementedError
+
+    def complete(self, lease: Lease):
+        """Mark a leased task as done and end the lease."""
+        raise NotImplementedError
+
+    def release(self, lease: Lease, error: Optional[str] = None):
+        """
+        End a lease without completing the task, so another worker can claim it.
+
+        Args:
+            lease (Lease): The claimed task.
+            error (Optional[str]): Why the attempt failed. Counts as an attempt; None for
+                a task given back unattempted, e.g. on shutdown.
+        """
+        raise NotImplementedError
+
+    def pending(self) -> int:
+        """Count the tasks not yet done or failed, leased or not."""
+        raise NotImplementedError
+
+    def progress(self) -> Dict[str, int]:
+        """
+        Count the tasks per state.
+
+        Returns:
+            Dict[str, int]: Tasks pending, done and failed, and how many pending tasks are leased.
+        """
+        raise NotImplementedError
+
+
+class SqliteWorkCatalog(WorkCatalog):
+    """
+    Work catalog in a SQLite database, for workers on one machine or a shared disk.
+
+    Claims run in `BEGIN IMMEDIATE` transactions, so SQLite's file lock lets
+    exactly one worker take each task. Lease expiry uses wall-clock time,
+    which must agree between the workers' machines.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Optional[str] = None, **kwargs):
+        """
+        Args:
+            path (Optional[str]): Database file. Defaults to `catalog_path`.
+        """
+        super().__init__(**kwargs)
+        self.path = Path(path or settings.catalog_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def publish(self, table: str, windows: Iterable[Window]) -> int:
+        now = _now()
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (table_name, window_start, window_end, state, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(table, start.isoformat(), end.isoformat(), PENDING, now) for start, end in windows],
+            )
+            return conn.total_changes - before
+
+    def claim(self, worker_id: str) -> Optional[Lease]:
+        with self._transaction() as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT table_name, window_start, window_end, attempts, lease_expires FROM tasks "
+                    "WHERE state = ? AND (lease_expires IS NULL OR lease_expires < ?) "
+                    "ORDER BY window_start, table_name LIMIT 1",
+                    (PENDING, time.time()),
+                ).fetchone()
+                if row is None:
+                    return None
+                table, start, end, attempts, expired = row
+                key = (table, start, end)
+                if expired is not None:
+                    # The previous holder stopped renewing, e.g. its machine crashed
+                    attempts += 1
+                    if attempts >= self.max_attempts:
+                        conn.execute(
+                            "UPDATE tasks SET state = ?, attempts = ?, lease_id = NULL, lease_expires = NULL, "
+                            "error = ?, updated_at = ? WHERE table_name = ? AND window_start = ? AND window_end = ?",
+                            (FAILED, attempts, "Lease expired", _now(), *key),
+                        )
+                        continue
+                lease = Lease(table, datetime.fromisoformat(start), datetime.fromisoformat(end), uuid.uuid4().hex, attempts)
+                conn.execute(
+                    "UPDATE tasks SET lease_id = ?, worker = ?, lease_expires = ?, attempts = ?, updated_at = ? "
+                    "WHERE table_name = ? AND window_start = ? AND window_end = ?",
+                    (lease.lease_id, worker_id, time.time() + self.lease_seconds, attempts, _now(), *key),
+                )
+                return lease
+
+    def renew(self, lease: Lease) -> bool:
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE lease_id = ? AND state = ?",
+                (time.time() + self.lease_seconds, lease.lease_id, PENDING),
+            ).rowcount
+        return updated == 1
+
+    def complete(self, lease: Lease):
+        self._finish(lease, DONE, lease.attempts, None)
+
+    def release(self, lease: Lease, error: Optional[str] = None):
+        attempts = lease.attempts + (1 if error is not None else 0)
+        self._finish(lease, FAILED if attempts >= self.max_attempts else PENDING, attempts, error)
+
+    def _finish(self, lease: Lease, state: str, attempts: int, error: Optional[str]):
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE tasks SET state = ?, attempts = ?, error = ?, lease_id = NULL, lease_expires = NULL, "
+                "updated_at = ? WHERE lease_id = ?",
+                (state, attempts, error, _now(), lease.lease_id),
+            ).rowcount
+        if not updated:
+            lease.lost = True
+            logger.warning(f"⚠️ Lease on {lease.table} {lease.start} - {lease.end} was lost; another worker owns it")
+
+    def pending(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM tasks WHERE state = ?", (PENDING,)).fetchone()[0]
+
+    def progress(self) -> Dict[str, int]:
+        conn = self._connection()
+        counts = {PENDING: 0, DONE: 0, FAILED: 0}
+        counts.update(conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+        counts["leased"] = conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE state = ? AND lease_expires >= ?", (PENDING, time.time())
+        ).fetchone()[0]
+        return counts
+
+
+class BlobWorkCatalog(WorkCatalog):
+    """
+    Work catalog in a blob container, for workers on any number of machines.
+
+    Each task is an empty blob named `<state>/<table>/<start>_<end>` whose
+    metadata holds the window and its attempts. Workers claim a `pending/` blob
+    by acquiring a blob lease (15 to 60 seconds, renewed while working), so the
+    storage service arbitrates claims and expires the leases of crashed
+    workers. Completing a task writes its `done/` blob and deletes the pending
+    one under the lease, so listing `pending/` only returns unfinished work.
+    """
+
+    name = "blob"
+
+    # Pending tasks listed per request; claims try them in random order to spread workers out
+    LIST_PAGE_SIZE = 500
+
+    def __init__(self, container: Optional[str] = None, **kwargs):
+        """
+        Args:
+            container (Optional[str]): Catalog container. Defaults to `catalog_container`.
+        """
+        super().__init__(**kwargs)
+        self.container = container or settings.catalog_container
+        # Blob leases last 15 to 60 seconds
+        self.lease_seconds = min(max(self.lease_seconds, 15), 60)
+        self._candidates: List[Dict[str, str]] = []
+        self._marker = ""
+        self._lock = threading.Lock()
+        self._create_container()
+
+    def publish(self, table: str, windows: Iterable[Window]) -> int:
+        finished = {name.split("/", 1)[1] for state in (DONE, FAILED) for name, _ in self._list(f"{state}/{table}/")}
+        tasks = [(start, end) for start, end in windows if _task_name(table, start, end) not in finished]
+
+        def put(window: Window) -> bool:
+            start, end = window
+            # If-None-Match keeps the attempts of a task published before
+            response = self._request(
+                "PUT", f"{PENDING}/{_task_name(table, start, end)}",
+                headers={
+                    "x-ms-blob-type": "BlockBlob", "Content-Length": "0", "If-None-Match": "*",
+                    **_metadata_headers(table, start, end, 0),
+                },
+            )
+            return response.status_code == 201
+
+        with ThreadPoolExecutor(max_workers=settings.upload_max_concurrency) as executor:
+            return sum(executor.map(put, tasks))
+
+    def claim(self, worker_id: str) -> Optional[Lease]:
+        while True:
+            candidate = self._next_candidate()
+            if candidate is None:
+                return None
+            lease_id = str(uuid.uuid4())
+            response = self._request("PUT", candidate["name"], "comp=lease", headers={
+                "x-ms-lease-action": "acquire",
+                "x-ms-lease-duration": str(self.lease_seconds),
+                "x-ms-proposed-lease-id": lease_id,
+            })
+            if response.status_code != 201:
+                # Leased by another worker meanwhile, or already completed
+                continue
+
+            # Attempts may have changed since the listing
+            stored = self._request("HEAD", candidate["name"]).headers
+            start, end = datetime.fromisoformat(candidate["start"]), datetime.fromisoformat(candidate["end"])
+            lease = Lease(candidate["table"], start, end, lease_id, int(stored.get("x-ms-meta-attempts", 0)))
+            if candidate["lease_state"] in ("expired", "broken"):
+                # The previous holder stopped renewing, e.g. its machine crashed
+                lease.attempts += 1
+                if lease.attempts >= self.max_attempts:
+                    self._move(lease, FAILED, "Lease expired")
+                    continue
+                self._set_metadata(lease, worker=worker_id)
+            return lease
+
+    def renew(self, lease: Lease) -> bool:
+        response = self._request("PUT", _pending_name(lease), "comp=lease", headers={
+            "x-ms-lease-action": "renew", "x-ms-lease-id": lease.lease_id,
+        })
+        return response.status_code == 200
+
+    def complete(self, lease: Lease):
+        self._move(lease, DONE)
+
+    def release(self, lease: Lease, error: Optional[str] = None):
+        if error is not None:
+            lease.attempts += 1
+            if lease.attempts >= self.max_attempts:
+                self._move(lease, FAILED, error)
+                return
+            self._set_metadata(lease, error=error)
+        response = self._request("PUT", _pending_name(lease), "comp=lease", headers={
+            "x-ms-lease-action": "release", "x-ms-lease-id": lease.lease_id,
+        })
+        if response.status_code != 200:
+            self._lost(lease)
+
+    def pending(self) -> int:
+        return len(self._list(f"{PENDING}/"))
+
+    def progress(self) -> Dict[str, int]:
+        counts = {DONE: len(self._list(f"{DONE}/")), FAILED: len(self._list(f"{FAILED}/"))}
+        pending = self._list(f"{PENDING}/")
+        counts[PENDING] = len(pending)
+        counts["leased"] = sum(1 for _, properties in pending if properties.get("lease_state") == "leased")
+        return counts
+
+    def _next_candidate(self) -> Optional[Dict[str, str]]:
+        """Next pending task that was unleased when listed, listing the next page when needed."""
+        with self._lock:
+            for _ in range(2):
+                if not self._candidates:
+                    page, self._marker = self._list_page(f"{PENDING}/", self._marker)
+                    self._candidates = [
+                        {"name": name, **properties} for name, properties in page
+                        if properties.get("lease_state") in ("available", "expired", "broken")
+                    ]
+                    random.shuffle(self._candidates)
+                    if not self._candidates and self._marker:
+                        continue
+                if self._candidates:
+                    return self._candidates.pop()
+                # Past the last page: start over, as leases may have expired meanwhile
+                self._marker = ""
+            return None
+
+    def _move(self, lease: Lease, state: str, error: Optional[str] = None):
+        """Write the task's blob under `state` and delete its pending blob, ending the lease."""
+        headers = {"x-ms-blob-type": "BlockBlob", "Content-Length": "0", **_metadata_headers(
+            lease.table, lease.start, lease.end, lease.attempts, error
+        )}
+        response = self._request("PUT", f"{state}/{_task_name(lease.table, lease.start, lease.end)}", headers=headers)
+        if response.status_code != 201:
+            raise RuntimeError(f"Could not record {lease.table} {lease.start} - {lease.end} as {state}: {response.status_code}")
+        response = self._request("DELETE", _pending_name(lease), headers={"x-ms-lease-id": lease.lease_id})
+        if response.status_code not in (202, 404):
+            self._lost(lease)
+
+    def _set_metadata(self, lease: Lease, worker: Optional[str] = None, error: Optional[str] = None):
+        headers = {"x-ms-lease-id": lease.lease_id, **_metadata_headers(lease.table, lease.start, lease.end, lease.attempts, error)}
+        if worker:
+            headers["x-ms-meta-worker"] = worker
+        if self._request("PUT", _pending_name(lease), "comp=metadata", headers=headers).status_code != 200:
+            self._lost(lease)
+
+    def _lost(self, lease: Lease):
+        lease.lost = True
+        logger.warning(f"⚠️ Lease on {lease.table} {lease.start} - {lease.end} was lost; another worker owns it")
+
+    def _list(self, prefix: str) -> List[Tuple[str, Dict[str, str]]]:
+        blobs, marker = [], ""
+        while True:
+            page, marker = self._list_page(prefix, marker)
+            blobs.extend(page)
+            if not marker:
+                return blobs
+
+    def _list_page(self, prefix: str, marker: str) -> Tuple[List[Tuple[str, Dict[str, str]]], str]:
+        """One page of List Blobs: (name, lease state and metadata) per blob, and the next page's marker."""
+        query = f"restype=container&comp=list&include=metadata&maxresults={self.LIST_PAGE_SIZE}&prefix={quote(prefix)}"
+        if marker:
+            query += f"&marker={quote(marker)}"
+        response = self._request("GET", "", query)
+        if response.status_code != 200:
+            raise RuntimeError(f"Could not list the work catalog {self.container}: {response.status_code}")
+
+        root = ElementTree.fromstring(response.content)
+        page = []
+        for blob in root.iter("Blob"):
+            properties = {"lease_state": blob.findtext("Properties/LeaseState", "available")}
+            metadata = blob.find("Metadata")
+            for item in metadata if metadata is not None else []:
+                properties[item.tag.lower()] = item.text or ""
+            page.append((blob.findtext("Name"), properties))
+        return page, root.findtext("NextMarker") or ""
+
+    def _create_container(self):
+        response = self._request("PUT", "", "restype=container")
+        if response.status_code not in (201, 409):
+            raise RuntimeError(f"Could not create the work catalog container {self.container}: {response.status_code}")
+
+    def _request(self, method: str, blob_name: str, query: str = "", headers: Optional[Dict[str, str]] = None):
+        """Issue a catalog request, retrying connection errors and 5xx responses."""
+        path = f"{self.container}/{quote(blob_name)}" if blob_name else self.container
+        url = f"{settings.storage_container_base_url}{path}?{'&'.join(filter(None, (query, settings.storage_sas_token)))}"
+        for attempt in range(1, settings.max_retries + 1):
+            try:
+                response = get_session_pool().request(method, url, headers=headers)
+                if response.status_code < 500 or attempt == settings.max_retries:
+                    return response
+                logger.warning(f"⚠️ Attempt {attempt}: Work catalog request failed — Status {response.status_code}")
+            except Exception as e:
+                if attempt == settings.max_retries:
+                    raise
+                logger.error(f"❌ Attempt {attempt}: Exception during work catalog request — {str(e)}")
+            time.sleep(settings.retry_delay_seconds)
+
+
+def _task_name(table: str, start: datetime, end: datetime) -> str:
+    return f"{table}/{start:%Y-%m-%dT%H%M%S}_{end:%Y-%m-%dT%H%M%S}"
+
+
+def _pending_name(lease: Lease) -> str:
+    return f"{PENDING}/{_task_name(lease.table, lease.start, lease.end)}"
+
+
+def _metadata_headers(table: str, start: datetime, end: datetime, attempts: int, error: Optional[str] = None) -> Dict[str, str]:
+    headers = {
+        "x-ms-meta-table": table,
+        "x-ms-meta-start": start.isoformat(),
+        "x-ms-meta-end": end.isoformat(),
+        "x-ms-meta-attempts": str(attempts),
+    }
+    if error:
+        # Metadata values are single-line ASCII headers
+        headers["x-ms-meta-error"] = " ".join(error.split()).encode("ascii", "replace").decode()[:512]
+    return headers
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+CATALOG_STORES = {
+    SqliteWorkCatalog.name: SqliteWorkCatalog,
+    BlobWorkCatalog.name: BlobWorkCatalog,
+}
+
+_catalog: Optional[WorkCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_work_catalog() -> WorkCatalog:
+    """
+    Return the shared work catalog of the configured `catalog_store`, opening it on first use.
+
+    Raises:
+        ValueError: If `catalog_store` is not a known store.
+    """
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            name = settings.catalog_store.lower()
+            if name not in CATALOG_STORES:
+                raise ValueError(f"Unknown work catalog store '{name}'. Expected one of: {', '.join(CATALOG_STORES)}")
+            _catalog = CATALOG_STORES[name]()
+            logger.info(f"Using the {name} work catalog")
+        return _catalog
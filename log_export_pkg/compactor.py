@@ -0,0 +1,212 @@
+# export_pipeline/compactor.py
+
+"""
+Module: compactor
+Purpose: Merge the small per-window blobs of a table into target-size objects after export.
+"""
+
+import io
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+from export_pipeline.blob_uploader import (
+    CONTENT_ENCODINGS,
+    CONTENT_TYPES,
+    compose_blob,
+    delete_blob,
+    download_blob,
+    upload_blob,
+    window_metadata,
+)
+from export_pipeline.config import settings
+from export_pipeline.formats import get_output_format
+from export_pipeline.journal import COMPLETED, ExportJournal, WindowRecord, get_journal
+from export_pipeline.logger import logger
+from export_pipeline.workspaces import get_workspaces, resolve
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class BlobGroup:
+    """Adjacent completed windows stored in the same blobs."""
+
+    windows: List[WindowRecord] = field(default_factory=list)
+
+    @property
+    def start(self) -> datetime:
+        return self.windows[0].start
+
+    @property
+    def end(self) -> datetime:
+        return self.windows[-1].end
+
+    @property
+    def blobs(self) -> List[str]:
+        return self.windows[0].blobs
+
+    @property
+    def bytes(self) -> int:
+        return sum(window.bytes for window in self.windows)
+
+    @property
+    def suffix(self) -> str:
+        return "".join(Path(self.blobs[0]).suffixes) if self.blobs else ""
+
+
+class Compactor:
+    """
+    Post-pass that merges adjacent window blobs of a table into objects of about `compaction_target_mb`.
+
+    Windows are merged only within one `compaction_period_days` period and only
+    while they are contiguous and share a format and codec. JSON Lines blobs
+    (compressed or not) are concatenated server side with Put Block From URL;
+    Parquet blobs are downloaded and rewritten as one file. The merged blob is
+    committed first, then the journal (the export manifest) is switched to it in
+    one transaction, and only then are the source blobs deleted, so readers
+    following the journal never see missing data.
+    """
+
+    def __init__(
+        self,
+        journal: Optional[ExportJournal] = None,
+        target_bytes: Optional[int] = None,
+        period: Optional[timedelta] = None,
+    ):
+        """
+        Args:
+            journal (Optional[ExportJournal]): Journal listing the exported blobs. Defaults to the shared journal.
+            target_bytes (Optional[int]): Target merged object size. Defaults to `compaction_target_mb`.
+            period (Optional[timedelta]): Merged objects never span a period boundary. Defaults to `compaction_period_days`.
+        """
+        self.journal = journal or get_journal()
+        self.target_bytes = target_bytes or settings.compaction_target_mb * 1024 * 1024
+        self.period = period or timedelta(days=settings.compaction_period_days)
+
+    def run(self, tables: List[str]) -> Dict[str, int]:
+        """
+        Compact every table.
+
+        Returns:
+            Dict[str, int]: Merged objects written per table.
+        """
+        return {table: self.compact_table(table) for table in tables}
+
+    def compact_table(self, table: str) -> int:
+        """
+        Merge the table's small adjacent blobs.
+
+        Args:
+            table (str): Export key of the table, as in the journal.
+
+        Returns:
+            int: Merged objects written.
+        """
+        merged = 0
+        for batch in self.plan(table):
+            if self._merge(table, batch):
+                merged += 1
+        if merged:
+            logger.info("Compacted %s into %d merged objects", table, merged)
+        return merged
+
+    def plan(self, table: str) -> List[List[BlobGroup]]:
+        """
+        Choose the runs of blob groups to merge.
+
+        Returns:
+            List[List[BlobGroup]]: Runs of two or more adjacent groups, each at most `target_bytes`.
+        """
+        runs: List[List[BlobGroup]] = []
+        current: List[BlobGroup] = []
+        for group in self._groups(table):
+            fits = (
+                current
+                and group.start == current[-1].end
+                and group.suffix == current[-1].suffix
+                and self._period(group.start) == self._period(current[0].start)
+                and sum(g.bytes for g in current) + group.bytes <= self.target_bytes
+            )
+            if not fits:
+                if len(current) > 1:
+                    runs.append(current)
+                current = []
+            if group.bytes < self.target_bytes:
+                current.append(group)
+        if len(current) > 1:
+            runs.append(current)
+        return runs
+
+    def _groups(self, table: str) -> List[BlobGroup]:
+        """Completed windows with blobs, with windows already merged into one blob kept together."""
+        groups: List[BlobGroup] = []
+        for window in self.journal.windows(table, COMPLETED):
+            if not window.blobs:
+                continue
+            if groups and groups[-1].blobs == window.blobs and groups[-1].end == window.start:
+                groups[-1].windows.append(window)
+            else:
+                groups.append(BlobGroup([window]))
+        return groups
+
+    def _period(self, time: datetime) -> int:
+        if time.tzinfo is None:
+            time = time.replace(tzinfo=timezone.utc)
+        return (time - _EPOCH) // self.period
+
+    def _merge(self, table: str, run: List[BlobGroup]) -> bool:
+        workspace, table_name = resolve(table)
+        container_name = workspace.container(table_name)
+        suffix = run[0].suffix
+        blob_name = f"{table_name}_{run[0].start:%Y-%m-%dT%H%M%S}_{run[-1].end:%Y-%m-%dT%H%M%S}{suffix}"
+        sources = [blob for group in run for blob in group.blobs]
+        metadata = window_metadata(run[0].start, run[-1].end, sum(window.rows for group in run for window in group.windows))
+
+        extensions = suffix.split(".")[1:]
+        content_encoding = CONTENT_ENCODINGS.get(f".{extensions[-1]}") if extensions else None
+        content_type = CONTENT_TYPES.get(f".{extensions[0]}", "application/octet-stream") if extensions else "application/octet-stream"
+
+        if ".parquet" in suffix:
+            if content_encoding:
+                logger.warning(f"⚠️ Not compacting {blob_name}: compressed Parquet blobs cannot be merged")
+                return False
+            committed = self._rewrite_parquet(table, container_name, blob_name, sources, content_type, metadata)
+        else:
+            committed = compose_blob(container_name, blob_name, sources, content_type, content_encoding, metadata)
+        if not committed:
+            return False
+
+        windows = [(window.start, window.end) for group in run for window in group.windows]
+        self.journal.replace_blobs(table, windows, [blob_name])
+        for source in sources:
+            if source != blob_name:
+                delete_blob(container_name, source)
+        return True
+
+    def _rewrite_parquet(self, table, container_name, blob_name, sources, content_type, metadata) -> bool:
+        """Parquet files cannot be concatenated; read the sources and write one file."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        tables = []
+        for source in sources:
+            data = download_blob(container_name, source)
+            if data is None:
+                return False
+            tables.append(pq.read_table(io.BytesIO(data)))
+
+        file_path = Path(settings.export_dir) / container_name / blob_name
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(get_output_format("parquet").encode_table(table, pa.concat_tables(tables, promote_options="default")))
+        try:
+            return upload_blob(file_path, container_name, content_type=content_type, metadata=metadata)
+        finally:
+            file_path.unlink()
+
+
+if __name__ == "__main__":
+    from export_pipeline.config import configure
+
+    configure()
+    Compactor().run([workspace.key(table) for workspace in get_workspaces() for table in workspace.table_list()])
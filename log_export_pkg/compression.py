@@ -0,0 +1,171 @@
+# export_pipeline/compression.py
+
+"""
+Module: compression
+Purpose: Streaming gzip/zstd compression of exported windows, selectable per table.
+"""
+
+import gzip
+import zlib
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, Optional
+from export_pipeline.config import settings
+
+# Compressed input is consumed in slices of this size, so only one slice of output is held at a time
+CHUNK_BYTES = 4 * 1024 * 1024
+
+
+class Codec:
+    """
+    Compression applied to an encoded window on its way to Blob Storage.
+
+    Blobs keep the Content-Type of their output format and are uploaded with the
+    codec's Content-Encoding, so HTTP clients decompress them transparently.
+    """
+
+    name = "none"
+    extension = ""
+    content_encoding: Optional[str] = None
+
+    def __init__(self, level: Optional[int] = None):
+        self.level = level
+
+    @contextmanager
+    def open(self, sink: BinaryIO) -> Iterator[BinaryIO]:
+        """
+        Wrap a writable binary stream so that writes are compressed into it.
+
+        Args:
+            sink (BinaryIO): Destination stream, e.g. an open file. It is left open.
+
+        Yields:
+            BinaryIO: Stream accepting uncompressed bytes.
+        """
+        yield sink
+
+    def stream(self, data: bytes) -> Iterator[bytes]:
+        """
+        Compress an encoded window incrementally, e.g. for `BlobClient.upload_blob`.
+
+        Args:
+            data (bytes): Encoded window.
+
+        Yields:
+            bytes: Compressed chunks.
+        """
+        view = memoryview(data)
+        for offset in range(0, len(view), CHUNK_BYTES):
+            yield bytes(view[offset:offset + CHUNK_BYTES])
+
+    def blob_name(self, name: str) -> str:
+        """Append this codec's extension to a blob name."""
+        return f"{name}{self.extension}"
+
+
+class GzipCodec(Codec):
+    """gzip, readable by every HTTP client and by `zcat`."""
+
+    name = "gzip"
+    extension = ".gz"
+    content_encoding = "gzip"
+
+    def __init__(self, level: Optional[int] = None):
+        super().__init__(settings.gzip_level if level is None else level)
+
+    @contextmanager
+    def open(self, sink):
+        # mtime=0 keeps the output identical for identical input
+        with gzip.GzipFile(fileobj=sink, mode="wb", compresslevel=self.level, mtime=0) as stream:
+            yield stream
+
+    def stream(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        view = memoryview(data)
+        for offset in range(0, len(view), CHUNK_BYTES):
+            chunk = compressor.compress(view[offset:offset + CHUNK_BYTES])
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+
+
+class ZstdCodec(Codec):
+    """Zstandard: gzip-like ratios at several times the speed. Requires the `zstandard` package."""
+
+    name = "zstd"
+    extension = ".zst"
+    content_encoding = "zstd"
+
+    def __init__(self, level: Optional[int] = None):
+        super().__init__(settings.zstd_level if level is None else level)
+
+    @contextmanager
+    def open(self, sink):
+        import zstandard
+
+        with zstandard.ZstdCompressor(level=self.level).stream_writer(sink, closefd=False) as stream:
+            yield stream
+
+    def stream(self, data):
+        import zstandard
+
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        view = memoryview(data)
+        for offset in range(0, len(view), CHUNK_BYTES):
+            chunk = compressor.compress(view[offset:offset + CHUNK_BYTES])
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+
+
+CODECS = {
+    Codec.name: Codec,
+    GzipCodec.name: GzipCodec,
+    ZstdCodec.name: ZstdCodec,
+}
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """
+    Return a codec by name.
+
+    Args:
+        name (Optional[str]): "none", "gzip" or "zstd". Defaults to `settings.compression`.
+
+    Returns:
+        Codec: The codec, at its configured level.
+    """
+    name = (name or settings.compression).lower()
+    if name not in CODECS:
+        raise ValueError(f"Unknown compression '{name}'. Expected one of: {', '.join(CODECS)}")
+    return CODECS[name]()
+
+
+def table_codecs() -> Dict[str, str]:
+    """Per-table codec overrides from `TABLE_COMPRESSION` (e.g. "Syslog=zstd,AzureMetrics=none")."""
+    overrides = {}
+    for entry in settings.table_compression.split(","):
+        if "=" in entry:
+            table, name = entry.split("=", 1)
+            overrides[table.strip()] = name.strip()
+    return overrides
+
+
+def codec_for(table_name: str, format_name: Optional[str] = None) -> Codec:
+    """
+    Return the codec for a table's exported blobs.
+
+    A `TABLE_COMPRESSION` entry for the table wins. Otherwise Parquet output is
+    left alone, since it is already compressed internally, and other formats use
+    `settings.compression`.
+
+    Args:
+        table_name (str): Log Analytics table name.
+        format_name (Optional[str]): Output format name. Defaults to `settings.output_format`.
+
+    Returns:
+        Codec: The codec to apply.
+    """
+    name = table_codecs().get(table_name)
+    if name is None and (format_name or settings.output_format).lower() == "parquet":
+        name = Codec.name
+    return get_codec(name)
@@ -1,28 +1,159 @@
 import os
-from dotenv import load_dotenv
+from typing import Any, Mapping, Optional
 
-# Load .env file if present
-load_dotenv()
 
 class Settings:
-    # Azure
-    tenant_id = os.getenv("AZURE_TENANT_ID")
-    client_id = os.getenv("AZURE_CLIENT_ID")
-    client_secret = os.getenv("AZURE_CLIENT_SECRET")
-    workspace_id = os.getenv("LOG_ANALYTICS_WORKSPACE_ID")
-    storage_account_name = os.getenv("STORAGE_ACCOUNT_NAME")
-    storage_container_base_url = os.getenv("STORAGE_CONTAINER_BASE_URL")
-    storage_sas_token = os.getenv("STORAGE_SAS_TOKEN")
-
-    # Export control
-    batch_interval_minutes = int(os.getenv("BATCH_INTERVAL_MINUTES", 60))
-    max_parallel_tables = int(os.getenv("MAX_PARALLEL_TABLES", 4))
-    export_days_lookback = int(os.getenv("EXPORT_DAYS_LOOKBACK", 365))
-    export_dir = os.getenv("EXPORT_OUTPUT_DIR", "export_output")
-    metadata_log_path = os.getenv("METADATA_LOG_PATH", "metadata_logs/export_metadata.csv")
-
-    # Retry policy
-    max_retries = int(os.getenv("MAX_RETRIES", 5))
-    retry_delay_seconds = int(os.getenv("RETRY_DELAY_SECONDS", 10))
+    """Pipeline settings: defaults when created, read from the environment on `load`."""
+
+    def __init__(self):
+        self.load({})
+
+    def load(self, environ: Optional[Mapping[str, str]] = None):
+        """
+        Re-read every setting.
+
+        Args:
+            environ (Optional[Mapping[str, str]]): Variables to read. Defaults to the process environment.
+        """
+        if environ is None:
+            environ = os.environ
+        # Azure
+        self.tenant_id = environ.get("AZURE_TENANT_ID")
+        self.client_id = environ.get("AZURE_CLIENT_ID")
+        self.client_secret = environ.get("AZURE_CLIENT_SECRET")
+        self.workspace_id = environ.get("LOG_ANALYTICS_WORKSPACE_ID")
+        self.storage_account_name = environ.get("STORAGE_ACCOUNT_NAME")
+        self.storage_container_base_url = environ.get("STORAGE_CONTAINER_BASE_URL")
+        self.storage_sas_token = environ.get("STORAGE_SAS_TOKEN")
+
+        # Export control
+        self.batch_interval_minutes = int(environ.get("BATCH_INTERVAL_MINUTES", 60))
+        self.max_parallel_tables = int(environ.get("MAX_PARALLEL_TABLES", 4))
+        self.max_workers = int(environ.get("MAX_WORKERS", 8))  # windows queried concurrently across all tables
+        self.encode_workers = int(environ.get("ENCODE_WORKERS", 4))  # windows encoded concurrently
+        self.upload_workers = int(environ.get("UPLOAD_WORKERS", 4))  # windows uploaded concurrently
+        self.pipeline_queue_size = int(environ.get("PIPELINE_QUEUE_SIZE", 8))  # windows waiting between stages
+        self.export_days_lookback = int(environ.get("EXPORT_DAYS_LOOKBACK", 365))
+        self.export_dir = environ.get("EXPORT_OUTPUT_DIR", "export_output")
+        self.journal_path = environ.get("JOURNAL_PATH", "metadata_logs/export_journal.db")
+
+        # Several workspaces in one run (JSON list of workspaces), each with its own query budget
+        self.workspaces_path = environ.get("WORKSPACES_PATH", "workspaces.json")
+        self.workspace_max_queries = int(environ.get("WORKSPACE_MAX_QUERIES", 0))  # per workspace; 0 for max_workers
+        self.workspace_queries_per_minute = int(environ.get("WORKSPACE_QUERIES_PER_MINUTE", 0))  # per workspace; 0 for no limit
+
+        # Distributed export: workers on several machines claim windows from a shared work catalog
+        self.catalog_store = environ.get("CATALOG_STORE", "sqlite")  # sqlite (one machine or shared disk) or blob
+        self.catalog_path = environ.get("CATALOG_PATH", "metadata_logs/work_catalog.db")
+        self.catalog_container = environ.get("CATALOG_CONTAINER", "export-catalog")
+        self.lease_seconds = int(environ.get("LEASE_SECONDS", 60))  # renewed while working; blob leases last 15-60 s
+        self.task_max_attempts = int(environ.get("TASK_MAX_ATTEMPTS", 5))
+        self.worker_id = environ.get("WORKER_ID")  # defaults to <hostname>-<pid>
+
+        # Per-table export profiles (projected/excluded columns, extra predicates)
+        self.table_profiles_path = environ.get("TABLE_PROFILES_PATH", "table_profiles.json")
+        self.schema_cache_hours = int(environ.get("SCHEMA_CACHE_HOURS", 24))  # hours getschema results are cached
+
+        # Raw query result cache (0 MB disables it)
+        self.result_cache_dir = environ.get("RESULT_CACHE_DIR")  # defaults to export_dir/results
+        self.result_cache_mb = int(environ.get("RESULT_CACHE_MB", 2048))
+        self.result_cache_ttl_hours = int(environ.get("RESULT_CACHE_TTL_HOURS", 72))
+
+        # Window sizing
+        self.window_strategy = environ.get("WINDOW_STRATEGY", "planned")  # fixed | adaptive | planned
+        self.adaptive_target_fraction = float(environ.get("ADAPTIVE_TARGET_FRACTION", 0.5))
+        self.plan_period_days = int(environ.get("PLAN_PERIOD_DAYS", 1))
+        self.plan_bin_minutes = int(environ.get("PLAN_BIN_MINUTES", 1))
+        self.min_window_minutes = int(environ.get("MIN_WINDOW_MINUTES", 1))
+        self.max_window_minutes = int(environ.get("MAX_WINDOW_MINUTES", 1440))
+
+        # Output format
+        self.output_format = environ.get("OUTPUT_FORMAT", "jsonl")  # jsonl | parquet
+        self.parquet_compression = environ.get("PARQUET_COMPRESSION", "zstd")  # zstd | snappy
+        self.parquet_row_group_mb = int(environ.get("PARQUET_ROW_GROUP_MB", 128))
+        self.encode_processes = int(environ.get("ENCODE_PROCESSES", os.cpu_count() or 1))  # 0 encodes in the calling thread
+
+        # Compression
+        self.compression = environ.get("COMPRESSION", "none")  # none | gzip | zstd; opt in to compress blobs
+        self.table_compression = environ.get("TABLE_COMPRESSION", "")  # per-table overrides, e.g. "Syslog=zstd,AzureMetrics=none"
+        self.gzip_level = int(environ.get("GZIP_LEVEL", 6))
+        self.zstd_level = int(environ.get("ZSTD_LEVEL", 3))
+
+        # Tail mode
+        self.tail_interval_minutes = int(environ.get("TAIL_INTERVAL_MINUTES", 5))  # time between incremental cycles
+        self.tail_lateness_hours = int(environ.get("TAIL_LATENESS_HOURS", 24))  # max. gap between TimeGenerated and ingestion
+        self.tail_settle_seconds = int(environ.get("TAIL_SETTLE_SECONDS", 120))  # ingestion this recent waits for the next cycle
+
+        # Compaction
+        self.compact_after_export = environ.get("COMPACT_AFTER_EXPORT", "false").lower() == "true"
+        self.compaction_target_mb = int(environ.get("COMPACTION_TARGET_MB", 256))
+        self.compaction_period_days = int(environ.get("COMPACTION_PERIOD_DAYS", 1))
+
+        # Reconciliation of exported row counts against the workspace
+        self.reconcile_bin_minutes = int(environ.get("RECONCILE_BIN_MINUTES", 60))
+        self.reconcile_period_days = int(environ.get("RECONCILE_PERIOD_DAYS", 30))  # time range per count query
+
+        # Upload
+        self.upload_block_size_mb = int(environ.get("UPLOAD_BLOCK_SIZE_MB", 8))
+        self.upload_max_concurrency = int(environ.get("UPLOAD_MAX_CONCURRENCY", 4))
+        self.upload_skip_unchanged = environ.get("UPLOAD_SKIP_UNCHANGED", "true").lower() == "true"
+
+        # Async engine
+        self.async_max_in_flight = int(environ.get("ASYNC_MAX_IN_FLIGHT", 256))
+        self.async_max_queries_per_workspace = int(environ.get("ASYNC_MAX_QUERIES_PER_WORKSPACE", 32))
+        self.async_max_uploads_per_account = int(environ.get("ASYNC_MAX_UPLOADS_PER_ACCOUNT", 64))
+
+        # Memory budget
+        self.memory_budget_mb = int(environ.get("MEMORY_BUDGET_MB", 0))  # 0 = half of physical memory
+        self.memory_expansion_factor = float(environ.get("MEMORY_EXPANSION_FACTOR", 4.0))  # in-memory rows vs. result bytes
+
+        # Metrics
+        self.metrics_port = int(environ.get("METRICS_PORT", 0))  # Prometheus endpoint on localhost; 0 disables it
+        self.metrics_textfile = environ.get("METRICS_TEXTFILE", "")  # e.g. for the node_exporter textfile collector
+        self.metrics_interval_seconds = int(environ.get("METRICS_INTERVAL_SECONDS", 15))
+
+        # Logging
+        self.log_level = environ.get("LOG_LEVEL", "INFO")
+        self.log_file_format = environ.get("LOG_FILE_FORMAT", "json")  # json | text
+        self.log_rate_limit = int(environ.get("LOG_RATE_LIMIT", 20))  # info lines per message and interval; 0 disables the limit
+        self.log_rate_interval_seconds = float(environ.get("LOG_RATE_INTERVAL_SECONDS", 10))
+        self.log_progress_seconds = float(environ.get("LOG_PROGRESS_SECONDS", 30))  # interval of the per-table window summary
+
+        # Retry policy
+        self.max_retries = int(environ.get("MAX_RETRIES", 5))
+        self.retry_delay_seconds = int(environ.get("RETRY_DELAY_SECONDS", 10))
+
 
 settings = Settings()
+
+
+def configure(env_file: Optional[str] = None, **overrides: Any) -> Settings:
+    """
+    Initialize the pipeline: load the environment, settings and logging.
+
+    Importing the package has no side effects: until this is called, `settings`
+    holds the defaults and ignores the environment. Entry points call it once
+    before exporting. Calling it again re-reads the settings, while logging is
+    only set up on the first call.
+
+    Args:
+        env_file (Optional[str]): .env file to load. Defaults to the nearest `.env`, if any.
+        **overrides: Settings to set after reading the environment, e.g. `max_workers=16`.
+
+    Returns:
+        Settings: The shared settings.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv(env_file)
+    settings.load()
+    for name, value in overrides.items():
+        if not hasattr(settings, name):
+            raise AttributeError(f"Unknown setting: {name}")
+        setattr(settings, name, value)
+
+    # Imported here because the logger itself reads these settings
+    from export_pipeline.logger import configure_logging
+
+    configure_logging()
+    return settings
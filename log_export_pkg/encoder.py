@@ -0,0 +1,205 @@
+# export_pipeline/encoder.py
+
+"""
+Module: encoder
+Purpose: Offload DataFrame construction and serialization of exported windows to a pool of worker processes.
+"""
+
+import logging
+import logging.handlers
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Optional, Sequence, Tuple
+from export_pipeline.config import settings
+from export_pipeline.formats import OutputFormat, get_output_format
+from export_pipeline.logger import logger
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class EncodePool:
+    """
+    Encodes query results in worker processes so serialization runs on every core.
+
+    Threads waiting on the network only pickle the results (rows are sent as
+    per-column buffers) and receive the encoded bytes back, instead of holding
+    the GIL while building DataFrames and JSON or Parquet output. Schemas pinned
+    by the workers are merged back into the caller's format instance, so every
+    window of a table keeps one schema. With a size of 0, results are encoded in
+    the calling thread.
+
+    Workers are started by a fork server where the platform has one (spawned
+    elsewhere), never forked from the caller: its logging listener, export
+    threads or notebook kernel threads may hold locks at any time. Each worker
+    gets a copy of the caller's settings, and its log records are sent back
+    and written by the caller's logger. Like any spawned process, a worker
+    imports the script that started it, so scripts create the pool under
+    `if __name__ == "__main__":`; notebooks need no guard.
+    """
+
+    def __init__(self, processes: Optional[int] = None):
+        """
+        Args:
+            processes (Optional[int]): Worker processes. Defaults to `settings.encode_processes`.
+        """
+        self.processes = settings.encode_processes if processes is None else processes
+        self._executor = None
+        self._log_listener = None
+        if self.processes > 0:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                # The server imports the encoder once instead of each worker, and never the caller's script
+                context.set_forkserver_preload(["export_pipeline.encoder"])
+            else:
+                context = multiprocessing.get_context("spawn")
+            log_queue = context.Queue()
+            self._log_listener = logging.handlers.QueueListener(log_queue, _ForwardHandler())
+            self._log_listener.start()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=context,
+                initializer=_init_worker, initargs=(dict(vars(settings)), log_queue),
+            )
+            self._executor.submit(int).result()
+
+    def encode_rows(
+        self,
+        output_format: OutputFormat,
+        table_name: str,
+        columns: Sequence[str],
+        rows: Sequence[Sequence[Any]],
+        column_types: Optional[Sequence[str]] = None,
+    ) -> bytes:
+        """
+        Serialize raw query result rows (e.g. from a `LogsTable`) in a worker process.
+
+        Args:
+            output_format (OutputFormat): Format to encode with.
+            table_name (str): Source table.
+            columns (Sequence[str]): Column names.
+            rows (Sequence[Sequence[Any]]): Row values in column order.
+            column_types (Optional[Sequence[str]]): KQL column types, if known.
+
+        Returns:
+            bytes: Encoded window.
+        """
+        if self._executor is None:
+            return output_format.encode_rows(table_name, columns, rows, column_types)
+
+        values = list(zip(*rows)) if rows else [()] * len(columns)
+        future = self._executor.submit(
+            _encode_columns, output_format.name, output_format.schema(table_name),
+            table_name, list(columns), values, column_types and list(column_types),
+        )
+        return self._result(output_format, table_name, future.result())
+
+    def write_rows(
+        self,
+        output_format: OutputFormat,
+        table_name: str,
+        columns: Sequence[str],
+        rows: Sequence[Sequence[Any]],
+        sink: BinaryIO,
+        column_types: Optional[Sequence[str]] = None,
+    ) -> int:
+        """
+        Serialize raw query result rows into a writable binary stream.
+
+        Without worker processes the rows are streamed into the sink as they are
+        encoded, so the encoded window is never held in memory as a whole.
+
+        Returns:
+            int: Bytes written.
+        """
+        if self._executor is None:
+            return output_format.write_rows(table_name, columns, rows, sink, column_types)
+        return sink.write(self.encode_rows(output_format, table_name, columns, rows, column_types))
+
+    def encode_frame(self, output_format: OutputFormat, table_name: str, df: "pd.DataFrame") -> bytes:
+        """
+        Serialize a DataFrame returned by `LogAnalyticsExporter.query` in a worker process.
+
+        Args:
+            output_format (OutputFormat): Format to encode with.
+            table_name (str): Source table.
+            df (pd.DataFrame): Window results.
+
+        Returns:
+            bytes: Encoded window.
+        """
+        if self._executor is None:
+            return output_format.encode_frame(table_name, df)
+
+        future = self._executor.submit(
+            _encode_frame, output_format.name, output_format.schema(table_name), table_name, df
+        )
+        return self._result(output_format, table_name, future.result())
+
+    def _result(self, output_format: OutputFormat, table_name: str, result: Tuple[bytes, Any]) -> bytes:
+        data, schema = result
+        output_format.pin_schema(table_name, schema)
+        return data
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+        if self._log_listener is not None:
+            self._log_listener.stop()
+
+
+class _ForwardHandler(logging.Handler):
+    """Passes records of the worker processes to the caller's logger and its handlers."""
+
+    def emit(self, record: logging.LogRecord):
+        logger.handle(record)
+
+
+def _init_worker(state: Dict[str, Any], log_queue: "multiprocessing.Queue"):
+    """Apply the caller's settings in a worker and send its log records back to the caller."""
+    settings.__dict__.update(state)
+    logger.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    logger.setLevel(settings.log_level.upper())
+    logger.propagate = False
+
+
+def _worker_format(format_name: str, table_name: str, schema: Any) -> OutputFormat:
+    output_format = get_output_format(format_name)
+    output_format.pin_schema(table_name, schema)
+    return output_format
+
+
+def _encode_columns(format_name, schema, table_name, columns, values, column_types) -> Tuple[bytes, Any]:
+    output_format = _worker_format(format_name, table_name, schema)
+    data = output_format.encode_columns(table_name, columns, values, column_types)
+    return data, output_format.schema(table_name)
+
+
+def _encode_frame(format_name, schema, table_name, df) -> Tuple[bytes, Any]:
+    output_format = _worker_format(format_name, table_name, schema)
+    data = output_format.encode_frame(table_name, df)
+    return data, output_format.schema(table_name)
+
+
+_encode_pool: Optional[EncodePool] = None
+_encode_pool_lock = threading.Lock()
+
+
+def get_encode_pool(processes: Optional[int] = None) -> EncodePool:
+    """
+    Return the shared encode pool, starting it on first use.
+
+    Args:
+        processes (Optional[int]): Worker processes, only used when the pool is
+            first created. Defaults to `settings.encode_processes`.
+
+    Returns:
+        EncodePool: The shared encode pool.
+    """
+    global _encode_pool
+    with _encode_pool_lock:
+        if _encode_pool is None:
+            _encode_pool = EncodePool(processes)
+            logger.info(f"Encoding in {_encode_pool.processes or 'no'} worker processes")
+        return _encode_pool
@@ -0,0 +1,368 @@
+# export_pipeline/formats.py
+
+"""
+Module: formats
+Purpose: Pluggable output formats (JSON Lines, Parquet) for exported time windows.
+"""
+
+import functools
+import io
+import json
+import threading
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Optional, Sequence
+import orjson
+from export_pipeline.config import settings
+from export_pipeline.logger import logger
+
+# pandas and pyarrow are slow to import and only needed for DataFrames and Parquet, so they load on first use
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+
+@functools.lru_cache(maxsize=None)
+def kql_arrow_types() -> Dict[str, "pa.DataType"]:
+    """Log Analytics column types mapped to Arrow types."""
+    import pyarrow as pa
+
+    return {
+        "bool": pa.bool_(),
+        "boolean": pa.bool_(),
+        "datetime": pa.timestamp("us", tz="UTC"),
+        "date": pa.timestamp("us", tz="UTC"),
+        "int": pa.int32(),
+        "long": pa.int64(),
+        "real": pa.float64(),
+        "double": pa.float64(),
+        "decimal": pa.string(),
+        "string": pa.string(),
+        "guid": pa.string(),
+        "uniqueid": pa.string(),
+        "timespan": pa.string(),
+        "dynamic": pa.string(),
+    }
+
+
+class OutputFormat:
+    """
+    Base class for the serialization of one exported time window.
+    """
+
+    name = ""
+    extension = ""
+    content_type = "application/octet-stream"
+
+    def encode_rows(
+        self,
+        table_name: str,
+        columns: Sequence[str],
+        rows: Sequence[Sequence[Any]],
+        column_types: Optional[Sequence[str]] = None,
+    ) -> bytes:
+        """
+        Serialize raw query result rows (e.g. from a `LogsTable`).
+
+        Args:
+            table_name (str): Source table, used to keep schemas consistent across windows.
+            columns (Sequence[str]): Column names.
+            rows (Sequence[Sequence[Any]]): Row values in column order.
+            column_types (Optional[Sequence[str]]): KQL column types, if known.
+
+        Returns:
+            bytes: Encoded window.
+        """
+        raise NotImplementedError
+
+    def write_rows(
+        self,
+        table_name: str,
+        columns: Sequence[str],
+        rows: Sequence[Sequence[Any]],
+        sink: BinaryIO,
+        column_types: Optional[Sequence[str]] = None,
+    ) -> int:
+        """
+        Serialize raw query result rows into a writable binary stream.
+
+        Args:
+            table_name (str): Source table, used to keep schemas consistent across windows.
+            columns (Sequence[str]): Column names.
+            rows (Sequence[Sequence[Any]]): Row values in column order.
+            sink (BinaryIO): Destination stream, e.g. an open file.
+            column_types (Optional[Sequence[str]]): KQL column types, if known.
+
+        Returns:
+            int: Bytes written.
+        """
+        return sink.write(self.encode_rows(table_name, columns, rows, column_types))
+
+    def encode_columns(
+        self,
+        table_name: str,
+        columns: Sequence[str],
+        values: Sequence[Sequence[Any]],
+        column_types: Optional[Sequence[str]] = None,
+    ) -> bytes:
+        """
+        Serialize query results already split into per-column value sequences.
+
+        This is the form results take when they are shipped to an encode worker
+        process, since column buffers pickle far more compactly than rows.
+
+        Args:
+            table_name (str): Source table, used to keep schemas consistent across windows.
+            columns (Sequence[str]): Column names.
+            values (Sequence[Sequence[Any]]): One value sequence per column.
+            column_types (Optional[Sequence[str]]): KQL column types, if known.
+
+        Returns:
+            bytes: Encoded window.
+        """
+        raise NotImplementedError
+
+    def schema(self, table_name: str) -> Any:
+        """Schema pinned for a table, if the format keeps one."""
+        return None
+
+    def pin_schema(self, table_name: str, schema: Any):
+        """Adopt a schema pinned by another process encoding the same table."""
+
+    def encode_frame(self, table_name: str, df: "pd.DataFrame") -> bytes:
+        """
+        Serialize a DataFrame returned by `LogAnalyticsExporter.query`.
+
+        Args:
+            table_name (str): Source table, used to keep schemas consistent across windows.
+            df (pd.DataFrame): Window results.
+
+        Returns:
+            bytes: Encoded window.
+        """
+        raise NotImplementedError
+
+    def blob_name(self, stem: str) -> str:
+        """Append this format's file extension to a blob name stem."""
+        return f"{stem}{self.extension}"
+
+
+class JsonLinesFormat(OutputFormat):
+    """
+    Newline-delimited JSON records, the original export format.
+
+    Raw rows are written straight to JSON with orjson, without building a
+    DataFrame, and match what `DataFrame.to_json(orient="records", lines=True)`
+    produces: datetimes become epoch milliseconds and `dynamic` values are
+    written as nested JSON.
+    """
+
+    name = "jsonl"
+    extension = ".json"
+    content_type = "application/json"
+
+    # Encoded lines are collected in a buffer of this size before each write to the sink
+    buffer_bytes = 1024 * 1024
+
+    def encode_rows(self, table_name, columns, rows, column_types=None) -> bytes:
+        sink = io.BytesIO()
+        self.write_rows(table_name, columns, rows, sink, column_types)
+        return sink.getvalue()
+
+    def write_rows(self, table_name, columns, rows, sink, column_types=None) -> int:
+        columns = list(columns)
+        buffer = bytearray()
+        written = 0
+        for row in rows:
+            buffer += orjson.dumps(dict(zip(columns, row)), default=_json_default, option=_JSON_OPTIONS)
+            if len(buffer) >= self.buffer_bytes:
+                written += sink.write(buffer)
+                buffer.clear()
+        if buffer:
+            written += sink.write(buffer)
+        return written
+
+    def encode_columns(self, table_name, columns, values, column_types=None) -> bytes:
+        return self.encode_rows(table_name, columns, zip(*values), column_types)
+
+    def encode_frame(self, table_name, df) -> bytes:
+        return df.to_json(orient="records", lines=True).encode("utf-8")
+
+
+class ParquetFormat(OutputFormat):
+    """
+    Compressed Parquet built directly from Arrow arrays.
+
+    The schema of the first window exported for a table is pinned and every later
+    window of that table is conformed to it, so all files of a table can be read
+    as one dataset.
+    """
+
+    name = "parquet"
+    extension = ".parquet"
+    content_type = "application/vnd.apache.parquet"
+
+    def __init__(
+        self,
+        compression: Optional[str] = None,
+        row_group_bytes: Optional[int] = None,
+    ):
+        self.compression = compression or settings.parquet_compression
+        self.row_group_bytes = row_group_bytes or settings.parquet_row_group_mb * 1024 * 1024
+        self._schemas: Dict[str, "pa.Schema"] = {}
+        self._lock = threading.Lock()
+
+    def encode_rows(self, table_name, columns, rows, column_types=None) -> bytes:
+        values = list(zip(*rows)) if rows else [()] * len(columns)
+        return self.encode_columns(table_name, columns, values, column_types)
+
+    def encode_columns(self, table_name, columns, values, column_types=None) -> bytes:
+        import pyarrow as pa
+
+        columns = list(columns)
+        pinned = self._schemas.get(table_name)
+
+        arrays = []
+        fields = []
+        for index, column in enumerate(columns):
+            if pinned is not None and column in pinned.names:
+                arrow_type = pinned.field(column).type
+            elif column_types is not None:
+                arrow_type = kql_arrow_types().get(str(column_types[index]).lower(), pa.string())
+            else:
+                arrow_type = None
+            column_values = values[index]
+            if arrow_type is None or pa.types.is_string(arrow_type):
+                column_values = [_stringify_dynamic(v, arrow_type is not None) for v in column_values]
+            arrays.append(pa.array(column_values, type=arrow_type))
+            fields.append(pa.field(column, arrays[-1].type))
+
+        return self._write(self._conform(table_name, pa.Table.from_arrays(arrays, schema=pa.schema(fields))))
+
+    def encode_frame(self, table_name, df) -> bytes:
+        import pyarrow as pa
+
+        return self.encode_table(table_name, pa.Table.from_pandas(df, preserve_index=False))
+
+    def encode_table(self, table_name: str, table: "pa.Table") -> bytes:
+        """Serialize an Arrow table, conformed to the table's pinned schema."""
+        return self._write(self._conform(table_name, table))
+
+    def schema(self, table_name):
+        return self._schemas.get(table_name)
+
+    def pin_schema(self, table_name, schema):
+        # Keep the widest schema seen; columns are only ever appended
+        with self._lock:
+            current = self._schemas.get(table_name)
+            if schema is not None and (current is None or len(schema) > len(current)):
+                self._schemas[table_name] = schema
+
+    def _conform(self, table_name: str, table: "pa.Table") -> "pa.Table":
+        """Cast a window to the table's pinned schema, pinning it on first use."""
+        import pyarrow as pa
+
+        with self._lock:
+            schema = self._schemas.get(table_name)
+            if schema is None:
+                # All-null columns infer as the null type; store them as strings instead
+                schema = pa.schema([
+                    pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                    for f in table.schema
+                ])
+            extra = [name for name in table.column_names if name not in schema.names]
+            if extra:
+                if table_name in self._schemas:
+                    logger.warning(f"New columns for {table_name} appended to schema: {extra}")
+                for name in extra:
+                    field_type = table.schema.field(name).type
+                    schema = schema.append(
+                        pa.field(name, pa.string() if pa.types.is_null(field_type) else field_type)
+                    )
+            self._schemas[table_name] = schema
+
+        arrays = []
+        for field in schema:
+            if field.name in table.column_names:
+                column = table.column(field.name)
+                arrays.append(column if column.type == field.type else column.cast(field.type))
+            else:
+                arrays.append(pa.nulls(table.num_rows, field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def _write(self, table: "pa.Table") -> bytes:
+        """Write a table to Parquet with row groups sized to the configured byte target."""
+        import pyarrow.parquet as pq
+
+        bytes_per_row = max(1, table.nbytes // max(1, table.num_rows))
+        row_group_size = max(1, self.row_group_bytes // bytes_per_row)
+
+        sink = io.BytesIO()
+        pq.write_table(
+            table,
+            sink,
+            compression=self.compression,
+            row_group_size=row_group_size,
+        )
+        return sink.getvalue()
+
+
+_JSON_OPTIONS = orjson.OPT_APPEND_NEWLINE | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize values orjson leaves to the caller the way pandas `to_json` does."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return (value - _EPOCH) // _MILLISECOND
+    if isinstance(value, date):
+        return (datetime(value.year, value.month, value.day, tzinfo=timezone.utc) - _EPOCH) // _MILLISECOND
+    if isinstance(value, timedelta):
+        return value // _MILLISECOND
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _stringify_dynamic(value: Any, force: bool = False) -> Any:
+    """Serialize `dynamic` values (dicts/lists) to JSON text; with `force`, stringify any scalar too."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value) if force else value
+
+
+OUTPUT_FORMATS = {
+    JsonLinesFormat.name: JsonLinesFormat,
+    ParquetFormat.name: ParquetFormat,
+}
+
+_instances: Dict[str, OutputFormat] = {}
+_instances_lock = threading.Lock()
+
+
+def get_output_format(name: Optional[str] = None) -> OutputFormat:
+    """
+    Return the shared output format instance for a format name.
+
+    Instances are shared so that per-table schemas stay consistent across all
+    windows of a run.
+
+    Args:
+        name (Optional[str]): Format name ("jsonl" or "parquet"). Defaults to `settings.output_format`.
+
+    Returns:
+        OutputFormat: The output format.
+    """
+    name = (name or settings.output_format).lower()
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{name}'. Expected one of: {', '.join(OUTPUT_FORMATS)}")
+
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = OUTPUT_FORMATS[name]()
+        return _instances[name]
@@ -0,0 +1,150 @@
+# export_pipeline/governor.py
+
+"""
+Module: governor
+Purpose: Bound the query results and upload buffers held in memory at once with a shared byte budget.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+from export_pipeline.config import settings
+from export_pipeline.logger import logger
+
+
+class MemoryGovernor:
+    """
+    Byte-accounting budget shared by query workers and uploaders.
+
+    A worker reserves the estimated in-memory size of a window before its query
+    starts and blocks while the budget is used up; the reservation is trued up
+    once the result size is known, shrunk to the uploader's block buffers once
+    the window is encoded, and released after the upload. Only new queries wait
+    for the budget, so windows already in flight always finish. With the budget
+    as the limit, worker counts can be raised freely without risking the host's
+    memory.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None, expansion: Optional[float] = None):
+        """
+        Args:
+            budget_bytes (Optional[int]): Total bytes that may be reserved at once.
+                Defaults to `memory_budget_mb`, or half of physical memory if that is 0.
+            expansion (Optional[float]): In-memory size of result rows relative to their
+                wire size. Defaults to `memory_expansion_factor`.
+        """
+        self.budget = budget_bytes or settings.memory_budget_mb * 1024 * 1024 or _half_of_physical_memory()
+        self.expansion = expansion or settings.memory_expansion_factor
+        self._reserved = 0
+        self._peak = 0
+        self._cond = threading.Condition()
+        self._rates: Dict[str, float] = {}
+
+    def reserve(self, nbytes: int) -> int:
+        """
+        Block until `nbytes` fit in the budget, then reserve them.
+
+        A request larger than the whole budget waits until nothing else is
+        reserved and is then granted, so oversized windows still make progress.
+
+        Returns:
+            int: The bytes reserved, to pass to `release`.
+        """
+        nbytes = max(0, int(nbytes))
+        with self._cond:
+            while self._reserved and self._reserved + nbytes > self.budget:
+                self._cond.wait()
+            self._reserved += nbytes
+            self._peak = max(self._peak, self._reserved)
+        return nbytes
+
+    def resize(self, reserved: int, nbytes: int) -> int:
+        """
+        Adjust a reservation to a measured size without blocking.
+
+        Returns:
+            int: The new reservation.
+        """
+        nbytes = max(0, int(nbytes))
+        with self._cond:
+            self._reserved += nbytes - reserved
+            self._peak = max(self._peak, self._reserved)
+            if nbytes < reserved:
+                self._cond.notify_all()
+        return nbytes
+
+    def release(self, reserved: int):
+        """Return reserved bytes to the budget."""
+        if reserved:
+            with self._cond:
+                self._reserved -= reserved
+                self._cond.notify_all()
+
+    @contextmanager
+    def reservation(self, nbytes: int) -> Iterator[int]:
+        """Reserve `nbytes` for the duration of a block."""
+        reserved = self.reserve(nbytes)
+        try:
+            yield reserved
+        finally:
+            self.release(reserved)
+
+    def estimate(self, table: str, start: datetime, end: datetime) -> int:
+        """
+        Estimate the in-memory size of a window's result.
+
+        Uses the table's byte rate from earlier windows (see `observe`); before
+        any observation, assumes the window holds what the planner aims for,
+        `adaptive_target_fraction` of the query size limit.
+
+        Returns:
+            int: Estimated bytes.
+        """
+        # Imported here so the uploader can use the governor without the query client dependencies
+        from export_pipeline.kql_exporter import MAX_RESULT_BYTES
+
+        rate = self._rates.get(table)
+        if rate is None:
+            result_bytes = MAX_RESULT_BYTES * settings.adaptive_target_fraction
+        else:
+            result_bytes = min(rate * (end - start).total_seconds(), MAX_RESULT_BYTES)
+        return int(result_bytes * self.expansion)
+
+    def observe(self, table: str, start: datetime, end: datetime, result_bytes: int):
+        """Record a window's result size to refine later estimates for the table."""
+        rate = result_bytes / max((end - start).total_seconds(), 1.0)
+        with self._cond:
+            previous = self._rates.get(table)
+            # Lean towards the higher rate so estimates err on the safe side
+            self._rates[table] = rate if previous is None else max(rate, 0.5 * previous + 0.5 * rate)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: Budget, bytes currently reserved and peak reservation.
+        """
+        with self._cond:
+            return {"budget": self.budget, "reserved": self._reserved, "peak": self._peak}
+
+
+def _half_of_physical_memory() -> int:
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 2
+    except (AttributeError, ValueError, OSError):
+        return 8 * 1024 * 1024 * 1024
+
+
+_governor: Optional[MemoryGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> MemoryGovernor:
+    """Return the shared memory governor, creating it on first use."""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = MemoryGovernor()
+            logger.info(f"Memory budget for in-flight data: {_governor.budget // (1024 * 1024)} MB")
+        return _governor
@@ -0,0 +1,276 @@
+# export_pipeline/journal.py
+
+"""
+Module: journal
+Purpose: Durable SQLite checkpoint journal of exported (table, window) pairs so reruns resume where they stopped.
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from export_pipeline.config import settings
+from export_pipeline.logger import logger
+
+# Window states
+PLANNED = "planned"
+IN_FLIGHT = "in_flight"
+COMPLETED = "completed"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS windows (
+    table_name   TEXT    NOT NULL,
+    window_start TEXT    NOT NULL,
+    window_end   TEXT    NOT NULL,
+    state        TEXT    NOT NULL,
+    rows         INTEGER NOT NULL DEFAULT 0,
+    bytes        INTEGER NOT NULL DEFAULT 0,
+    blobs        TEXT    NOT NULL DEFAULT '',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    error        TEXT,
+    updated_at   TEXT    NOT NULL,
+    PRIMARY KEY (table_name, window_start, window_end)
+);
+CREATE INDEX IF NOT EXISTS windows_state ON windows (table_name, state);
+CREATE TABLE IF NOT EXISTS watermarks (
+    table_name   TEXT    NOT NULL PRIMARY KEY,
+    watermark    TEXT    NOT NULL,
+    updated_at   TEXT    NOT NULL
+);
+"""
+
+
+@dataclass
+class WindowRecord:
+    """A journaled export window."""
+
+    table_name: str
+    start: datetime
+    end: datetime
+    state: str
+    rows: int = 0
+    bytes: int = 0
+    blobs: List[str] = field(default_factory=list)
+    attempts: int = 0
+    error: Optional[str] = None
+
+
+class ExportJournal:
+    """
+    Transactional journal of planned, in-flight, completed and failed export windows.
+
+    Backed by SQLite in WAL mode with one connection per thread, so many worker
+    threads can record progress concurrently while readers never block writers.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or settings.journal_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def plan(self, table_name: str, windows: Iterable[Tuple[datetime, datetime]]):
+        """
+        Record windows as planned. Windows already in the journal keep their state.
+
+        Args:
+            table_name (str): Log Analytics table name.
+            windows (Iterable[Tuple[datetime, datetime]]): (start, end) windows.
+        """
+        now = _now()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO windows (table_name, window_start, window_end, state, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(table_name, start.isoformat(), end.isoformat(), PLANNED, now) for start, end in windows],
+            )
+
+    def start(self, table_name: str, start: datetime, end: datetime):
+        """Mark a window as in flight and count the attempt."""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO windows (table_name, window_start, window_end, state, attempts, updated_at) "
+                "VALUES (?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (table_name, window_start, window_end) DO UPDATE SET "
+                "state = excluded.state, attempts = attempts + 1, error = NULL, updated_at = excluded.updated_at",
+                (table_name, start.isoformat(), end.isoformat(), IN_FLIGHT, _now()),
+            )
+
+    def complete(
+        self,
+        table_name: str,
+        start: datetime,
+        end: datetime,
+        rows: int,
+        bytes: int,
+        blobs: List[str],
+    ):
+        """
+        Mark a window as completed.
+
+        Args:
+            table_name (str): Log Analytics table name.
+            start (datetime): Window start.
+            end (datetime): Window end.
+            rows (int): Rows exported.
+            bytes (int): Encoded bytes uploaded.
+            blobs (List[str]): Names of the uploaded blobs.
+        """
+        self._finish(table_name, start, end, COMPLETED, rows, bytes, blobs, None)
+
+    def fail(self, table_name: str, start: datetime, end: datetime, error: str):
+        """Mark a window as failed so the next run retries it."""
+        self._finish(table_name, start, end, FAILED, 0, 0, [], error)
+
+    def _finish(self, table_name, start, end, state, rows, bytes, blobs, error):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO windows "
+                "(table_name, window_start, window_end, state, rows, bytes, blobs, error, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (table_name, window_start, window_end) DO UPDATE SET "
+                "state = excluded.state, rows = excluded.rows, bytes = excluded.bytes, "
+                "blobs = excluded.blobs, error = excluded.error, updated_at = excluded.updated_at",
+                (table_name, start.isoformat(), end.isoformat(), state, rows, bytes, ",".join(blobs), error, _now()),
+            )
+
+    def replace_blobs(self, table_name: str, windows: Iterable[Tuple[datetime, datetime]], blobs: List[str]):
+        """
+        Point completed windows at new blobs, e.g. after compaction merged them.
+
+        All windows are updated in one transaction, so readers see either the old
+        blobs or the new ones.
+
+        Args:
+            table_name (str): Log Analytics table name.
+            windows (Iterable[Tuple[datetime, datetime]]): Completed (start, end) windows.
+            blobs (List[str]): Blob names now holding the windows' data.
+        """
+        now = _now()
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE windows SET blobs = ?, updated_at = ? "
+                "WHERE table_name = ? AND window_start = ? AND window_end = ? AND state = ?",
+                [(",".join(blobs), now, table_name, start.isoformat(), end.isoformat(), COMPLETED) for start, end in windows],
+            )
+
+    def is_completed(self, table_name: str, start: datetime, end: datetime) -> bool:
+        """Return True if the exact window was completed by this or an earlier run."""
+        row = self._connection().execute(
+            "SELECT 1 FROM windows WHERE table_name = ? AND window_start = ? AND window_end = ? AND state = ?",
+            (table_name, start.isoformat(), end.isoformat(), COMPLETED),
+        ).fetchone()
+        return row is not None
+
+    def watermark(self, table_name: str) -> Optional[datetime]:
+        """Return the table's tail export watermark: records ingested up to it are exported."""
+        row = self._connection().execute(
+            "SELECT watermark FROM watermarks WHERE table_name = ?", (table_name,)
+        ).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def set_watermark(self, table_name: str, watermark: datetime):
+        """Advance the table's tail export watermark once the records ingested up to it are uploaded."""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO watermarks (table_name, watermark, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (table_name) DO UPDATE SET "
+                "watermark = excluded.watermark, updated_at = excluded.updated_at",
+                (table_name, watermark.isoformat(), _now()),
+            )
+
+    def windows(self, table_name: Optional[str] = None, state: Optional[str] = None) -> List[WindowRecord]:
+        """
+        List journaled windows, optionally filtered by table and state.
+
+        Returns:
+            List[WindowRecord]: Matching windows ordered by table and start time.
+        """
+        query = "SELECT * FROM windows WHERE 1 = 1"
+        params = []
+        if table_name is not None:
+            query += " AND table_name = ?"
+            params.append(table_name)
+        if state is not None:
+            query += " AND state = ?"
+            params.append(state)
+        query += " ORDER BY table_name, window_start"
+        return [_record(row) for row in self._connection().execute(query, params)]
+
+    def summary(self, table_name: str) -> Dict:
+        """
+        Summarize a table's progress.
+
+        Returns:
+            Dict: Window counts per state plus completed rows, bytes and blob names.
+        """
+        conn = self._connection()
+        counts = dict(conn.execute(
+            "SELECT state, COUNT(*) FROM windows WHERE table_name = ? GROUP BY state", (table_name,)
+        ).fetchall())
+        completed = self.windows(table_name, COMPLETED)
+        return {
+            "table": table_name,
+            "windows": counts,
+            "rows": sum(record.rows for record in completed),
+            "bytes": sum(record.bytes for record in completed),
+            # Compacted windows share blobs
+            "blobs": list(dict.fromkeys(blob for record in completed for blob in record.blobs)),
+        }
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _record(row: Tuple) -> WindowRecord:
+    table_name, start, end, state, rows, bytes, blobs, attempts, error, _ = row
+    return WindowRecord(
+        table_name=table_name,
+        start=datetime.fromisoformat(start),
+        end=datetime.fromisoformat(end),
+        state=state,
+        rows=rows,
+        bytes=bytes,
+        blobs=blobs.split(",") if blobs else [],
+        attempts=attempts,
+        error=error,
+    )
+
+
+_journal: Optional[ExportJournal] = None
+_journal_lock = threading.Lock()
+
+
+def get_journal() -> ExportJournal:
+    """Return the shared export journal at `settings.journal_path`, opening it on first use."""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = ExportJournal()
+            logger.info(f"Using export journal {_journal.path}")
+        return _journal
@@ -2,32 +2,170 @@
 
 """
 Module: kql_exporter
-Purpose: Query Log Analytics using MSTICPy and process results into DataFrames.
+Purpose: Query Log Analytics in time windows, returning raw result rows for export (DataFrames through MSTICPy on request).
 """
 
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import Optional
-import pandas as pd
-from msticpy.data import QueryProvider
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 from export_pipeline.config import settings
 from export_pipeline.logger import logger
+from export_pipeline.metrics import get_metrics
+from export_pipeline.profiles import TableProfile, table_profile, validated_profile
+from export_pipeline.workspaces import Workspace, default_workspace
+
+# pandas, MSTICPy and the Azure SDK take seconds to import, so they are loaded on first use
+if TYPE_CHECKING:
+    import pandas as pd
+    from azure.monitor.query import LogsQueryClient
+    from msticpy.data import QueryProvider
+
+# Log Analytics query API result limits
+MAX_RESULT_ROWS = 500_000
+MAX_RESULT_BYTES = 64 * 1024 * 1024
+
+# Pause after a 429 without a Retry-After header
+DEFAULT_RETRY_AFTER_SECONDS = 30
+
+# Histogram bins: (bin start, rows, estimated bytes)
+HistogramBin = Tuple[datetime, int, int]
+
+# Rows of one export window, before the table's export profile is applied
+WINDOW_QUERY = "{table} | where TimeGenerated >= datetime({{start}}) and TimeGenerated < datetime({{end}})"
+
+HISTOGRAM_SUMMARY = (
+    " | summarize Rows = count(), Bytes = sum(estimate_data_size(*)) by bin(TimeGenerated, {bin_minutes}m) "
+    "| order by TimeGenerated asc"
+)
+
+COUNT_SUMMARY = " | summarize Rows = count() by bin(TimeGenerated, {bin_minutes}m) | order by TimeGenerated asc"
+
+
+class QueryRows(NamedTuple):
+    """Raw rows of a window query, as returned by the Log Analytics query API."""
+
+    columns: List[str]
+    column_types: List[str]
+    rows: Sequence[Sequence[Any]]
+    partial: bool = False
+    bytes: Optional[int] = None
+
+
+def window_query(table: str) -> str:
+    """
+    Build the KQL of one export window of a table, keeping `{start}` and `{end}` placeholders.
+
+    The table's export profile is compiled in, so only its rows and columns are
+    returned. Use `LogAnalyticsExporter.window_query` to check the profile
+    against the table's schema first.
+
+    Args:
+        table (str): Log Analytics table name.
+
+    Returns:
+        str: KQL query returning the exported rows of the window.
+    """
+    return table_profile(table).apply(WINDOW_QUERY.format(table=table))
+
+
+def histogram_query(table: str, bin_minutes: int) -> str:
+    """
+    Build the per-bin row/byte histogram KQL for a table, keeping `{start}` and `{end}` placeholders.
+
+    Bins are measured on the rows and columns the export profile keeps, so windows
+    are planned for the size of the exported data.
+
+    Args:
+        table (str): Log Analytics table name.
+        bin_minutes (int): Histogram bin width in minutes.
+
+    Returns:
+        str: KQL query returning TimeGenerated, Rows and Bytes per bin.
+    """
+    return window_query(table) + HISTOGRAM_SUMMARY.format(bin_minutes=bin_minutes)
+
+
+def count_query(table: str, bin_minutes: int) -> str:
+    """
+    Build the per-bin row count KQL for a table, keeping `{start}` and `{end}` placeholders.
+
+    Counts cover the rows the export profile keeps, so they can be compared with
+    the rows exported.
+
+    Args:
+        table (str): Log Analytics table name.
+        bin_minutes (int): Bin width in minutes.
+
+    Returns:
+        str: KQL query returning TimeGenerated and Rows per bin.
+    """
+    return window_query(table) + COUNT_SUMMARY.format(bin_minutes=bin_minutes)
 
 
 class LogAnalyticsExporter:
     """
     Handles querying Azure Log Analytics workspace with MSTICPy and batching time windows.
+
+    Each exporter queries one workspace, within the workspace's `QueryBudget`,
+    and labels its metrics with the workspace's export keys.
     """
 
-    def __init__(self):
-        self.provider = QueryProvider("AzureLogAnalytics")
-        self.provider.connect(
-            tenant_id=settings.tenant_id,
-            client_id=settings.client_id,
-            client_secret=settings.client_secret,
-            workspace_id=settings.workspace_id,
-        )
-        logger.info("Connected to Azure Log Analytics workspace.")
+    def __init__(self, workspace: Optional[Workspace] = None):
+        """
+        Args:
+            workspace (Optional[Workspace]): Workspace to query. Defaults to the workspace of `settings.workspace_id`.
+        """
+        self.workspace = workspace or default_workspace()
+        self._provider: Optional["QueryProvider"] = None
+        self._logs_client: Optional["LogsQueryClient"] = None
+
+    @property
+    def provider(self) -> "QueryProvider":
+        """MSTICPy query provider for DataFrame results, connected on first use."""
+        if self._provider is None:
+            from msticpy.data import QueryProvider
+
+            provider = QueryProvider("AzureLogAnalytics")
+            provider.connect(
+                tenant_id=settings.tenant_id,
+                client_id=settings.client_id,
+                client_secret=settings.client_secret,
+                workspace_id=self.workspace.workspace_id,
+            )
+            logger.info(f"Connected to Azure Log Analytics workspace {self.workspace.name or self.workspace.workspace_id}.")
+            self._provider = provider
+        return self._provider
+
+    @property
+    def logs_client(self) -> "LogsQueryClient":
+        """Azure Monitor query client for raw row results, created on first use."""
+        if self._logs_client is None:
+            from azure.identity import ClientSecretCredential
+            from azure.monitor.query import LogsQueryClient
+
+            credential = ClientSecretCredential(settings.tenant_id, settings.client_id, settings.client_secret)
+            self._logs_client = LogsQueryClient(credential)
+        return self._logs_client
+
+    def profile(self, table: str) -> TableProfile:
+        """
+        Export profile of a table, checked against the table's `getschema` columns on first use.
+
+        Raises:
+            ValueError: If the profile names columns the table does not have.
+        """
+        return validated_profile(self.logs_client, self.workspace.workspace_id, table)
+
+    def window_query(self, table: str) -> str:
+        """
+        KQL of one export window of a table with its validated export profile, keeping `{start}` and `{end}` placeholders.
+
+        Raises:
+            ValueError: If the profile names columns the table does not have.
+        """
+        self.profile(table)
+        return window_query(table)
 
     def query(
         self,
@@ -35,7 +173,8 @@ class LogAnalyticsExporter:
         start_time: datetime,
         end_time: datetime,
         timeout_seconds: int = 300,
-    ) -> Optional[pd.DataFrame]:
+        raise_errors: bool = False,
+    ) -> Optional["pd.DataFrame"]:
         """
         Execute a KQL query over a time window and return the results as a DataFrame.
 
@@ -44,6 +183,7 @@ class LogAnalyticsExporter:
             start_time (datetime): Start time for the query.
             end_time (datetime): End time for the query.
             timeout_seconds (int): Timeout for the query.
+            raise_errors (bool): Re-raise query errors instead of returning None.
 
         Returns:
             Optional[pd.DataFrame]: Resulting DataFrame or None if failed.
@@ -51,21 +191,208 @@ class LogAnalyticsExporter:
         formatted_query = kql_query.format(
             start=start_time.isoformat(), end=end_time.isoformat()
         )
+        table_name = self.workspace.key(query_table(kql_query))
+        from export_pipeline.result_cache import get_result_cache
+
+        cache = get_result_cache()
+        df = cache.get_frame(formatted_query, start_time, end_time, self.workspace.workspace_id)
+        if df is not None:
+            _log_cache_hit(table_name, start_time, end_time, len(df))
+            return df
 
+        started = time.perf_counter()
         try:
-            df = self.provider.query(formatted_query, timeout=timeout_seconds)
+            with self.workspace.budget.acquire():
+                df = self.provider.query(formatted_query, timeout=timeout_seconds)
             if df is not None and not df.empty:
                 logger.info(
-                    f"Queried data from {start_time} to {end_time}, rows returned: {len(df)}"
+                    "Queried data from %s to %s, rows returned: %d", start_time, end_time, len(df),
+                    extra={"table": table_name, "window_start": start_time, "window_end": end_time, "rows": len(df)},
                 )
+                get_metrics().query_done(table_name, time.perf_counter() - started, rows=len(df))
+                cache.put_frame(formatted_query, start_time, end_time, df, self.workspace.workspace_id)
                 return df
             else:
-                logger.info(f"No data returned for time range {start_time} to {end_time}")
+                logger.info(
+                    "No data returned for time range %s to %s", start_time, end_time,
+                    extra={"table": table_name, "window_start": start_time, "window_end": end_time, "rows": 0},
+                )
+                get_metrics().query_done(table_name, time.perf_counter() - started)
+                return None
+        except Exception as ex:
+            logger.error(f"Error querying data: {ex}")
+            get_metrics().query_done(table_name, time.perf_counter() - started, failed=True)
+            if raise_errors:
+                raise
+            return None
+
+    def query_rows(
+        self,
+        kql_query: str,
+        start_time: datetime,
+        end_time: datetime,
+        timeout_seconds: int = 300,
+        raise_errors: bool = False,
+        use_cache: bool = True,
+    ) -> Optional[QueryRows]:
+        """
+        Execute a KQL query over a time window and return the raw result rows.
+
+        This is the export fast path: rows go straight to `OutputFormat.encode_rows`
+        without building a DataFrame, which would otherwise be the largest copy of
+        the window held in memory.
+
+        Results are read through the `ResultCache`, so re-encoding or re-uploading a
+        window does not query it again.
+
+        Args:
+            kql_query (str): KQL query with placeholders for start and end timestamps.
+            start_time (datetime): Start time for the query.
+            end_time (datetime): End time for the query.
+            timeout_seconds (int): Timeout for the query.
+            raise_errors (bool): Re-raise query errors instead of returning None.
+            use_cache (bool): Read and write the result cache; off for results that must be current.
+
+        Returns:
+            Optional[QueryRows]: Columns, column types and rows, flagged `partial` when
+            the result hit the row or size limit; None if empty or failed.
+        """
+        formatted_query = kql_query.format(
+            start=start_time.isoformat(), end=end_time.isoformat()
+        )
+        table_name = self.workspace.key(query_table(kql_query))
+        from export_pipeline.result_cache import get_result_cache
+
+        cache = get_result_cache()
+        cached = cache.get_rows(formatted_query, start_time, end_time, self.workspace.workspace_id) if use_cache else None
+        # Partial results cached by earlier versions are queried again
+        if cached is not None and not cached.partial:
+            _log_cache_hit(table_name, start_time, end_time, len(cached.rows))
+            return cached
+
+        from azure.monitor.query import LogsQueryStatus
+
+        metrics = get_metrics()
+        attempts = []
+
+        def count_retries(pipeline_response):
+            # Called for every attempt the SDK's retry policy makes
+            if attempts:
+                metrics.retry("query", table_name, attempts[-1])
+            http_response = pipeline_response.http_response
+            attempts.append(http_response.status_code)
+            if http_response.status_code == 429:
+                # Hold back the other threads querying this workspace, not only this retry
+                self.workspace.budget.throttled(retry_after(http_response.headers))
+
+        started = time.perf_counter()
+        try:
+            with self.workspace.budget.acquire():
+                response = self.logs_client.query_workspace(
+                    self.workspace.workspace_id,
+                    formatted_query,
+                    timespan=(start_time, end_time),
+                    server_timeout=timeout_seconds,
+                    include_statistics=True,
+                    raw_response_hook=count_retries,
+                )
+            if response.status == LogsQueryStatus.PARTIAL:
+                logger.warning(f"Partial result for {start_time} to {end_time}: {response.partial_error}")
+                tables, partial = response.partial_data, True
+            else:
+                tables, partial = response.tables, False
+            size = result_bytes(response.statistics)
+            rows = len(tables[0].rows) if tables else 0
+            metrics.query_done(table_name, time.perf_counter() - started, rows=rows, bytes=size)
+            if not rows:
+                logger.info(
+                    "No data returned for time range %s to %s", start_time, end_time,
+                    extra={"table": table_name, "window_start": start_time, "window_end": end_time, "rows": 0},
+                )
                 return None
+            table = tables[0]
+            logger.info(
+                "Queried data from %s to %s, rows returned: %d", start_time, end_time, rows,
+                extra={"table": table_name, "window_start": start_time, "window_end": end_time, "rows": rows, "bytes": size},
+            )
+            result = QueryRows(
+                columns=list(table.columns),
+                column_types=list(table.columns_types),
+                rows=table.rows,
+                partial=partial,
+                bytes=size,
+            )
+            # A partial result is bisected and queried again, so it must not be served from the cache
+            if use_cache and not partial:
+                cache.put_rows(formatted_query, start_time, end_time, result, self.workspace.workspace_id)
+            return result
         except Exception as ex:
             logger.error(f"Error querying data: {ex}")
+            metrics.query_done(table_name, time.perf_counter() - started, failed=True)
+            if raise_errors:
+                raise
             return None
 
+    def histogram(
+        self,
+        table: str,
+        start_time: datetime,
+        end_time: datetime,
+        bin_minutes: int = 1,
+    ) -> List[HistogramBin]:
+        """
+        Run the cheap row/byte histogram query used by `ExportPlanner`.
+
+        Args:
+            table (str): Log Analytics table name.
+            start_time (datetime): Start time for the query.
+            end_time (datetime): End time for the query.
+            bin_minutes (int): Histogram bin width in minutes.
+
+        Returns:
+            List[HistogramBin]: (bin start, rows, estimated bytes) in time order.
+        """
+        import pandas as pd
+
+        self.profile(table)
+        df = self.query(histogram_query(table, bin_minutes), start_time, end_time, raise_errors=True)
+        if df is None:
+            return []
+        return [
+            (pd.Timestamp(row.TimeGenerated).to_pydatetime(), int(row.Rows), int(row.Bytes))
+            for row in df.itertuples(index=False)
+        ]
+
+    def row_counts(
+        self,
+        table: str,
+        start_time: datetime,
+        end_time: datetime,
+        bin_minutes: int = 60,
+    ) -> List[Tuple[datetime, int]]:
+        """
+        Count the rows the export keeps per bin, bypassing the result cache so the counts are current.
+
+        Args:
+            table (str): Log Analytics table name.
+            start_time (datetime): Start time for the query.
+            end_time (datetime): End time for the query.
+            bin_minutes (int): Bin width in minutes.
+
+        Returns:
+            List[Tuple[datetime, int]]: (bin start, rows) in time order, without empty bins.
+        """
+        self.profile(table)
+        result = self.query_rows(
+            count_query(table, bin_minutes), start_time, end_time, raise_errors=True, use_cache=False
+        )
+        if result is None:
+            return []
+        if result.partial:
+            raise RuntimeError(f"Row counts of {table} from {start_time} to {end_time} are incomplete")
+        time_column, rows_column = result.columns.index("TimeGenerated"), result.columns.index("Rows")
+        return [(_timestamp(row[time_column]), int(row[rows_column])) for row in result.rows]
+
     def generate_time_windows(
         self,
         start_time: datetime,
@@ -90,3 +417,204 @@ class LogAnalyticsExporter:
             current_end = min(current_start + delta, end_time)
             yield current_start, current_end
             current_start = current_end
+
+
+class AdaptiveWindowController:
+    """
+    Sizes query windows from the rows and bytes observed in earlier windows.
+
+    Windows grow while data is sparse and shrink as density rises, aiming for
+    `adaptive_target_fraction` of the Log Analytics row and size limits. A window
+    that still hits a limit is bisected: the lower half is queried (and bisected
+    again if needed) and sizing resumes from the midpoint at the new, higher rate.
+
+    Windows never overlap the completed windows of earlier runs: those ranges are
+    jumped over and windows are cut short at their start, so a resumed run does
+    not export their rows again even though its window sizes differ.
+    """
+
+    def __init__(
+        self,
+        initial_window: Optional[timedelta] = None,
+        min_window: Optional[timedelta] = None,
+        max_window: Optional[timedelta] = None,
+        target_fraction: Optional[float] = None,
+        max_growth: float = 2.0,
+    ):
+        self.window = initial_window or timedelta(minutes=settings.batch_interval_minutes)
+        self.min_window = min_window or timedelta(minutes=settings.min_window_minutes)
+        self.max_window = max_window or timedelta(minutes=settings.max_window_minutes)
+        target_fraction = target_fraction or settings.adaptive_target_fraction
+        self.target_rows = MAX_RESULT_ROWS * target_fraction
+        self.target_bytes = MAX_RESULT_BYTES * target_fraction
+        self.max_growth = max_growth
+        self._row_rate: Optional[float] = None
+        self._byte_rate: Optional[float] = None
+        self._pending: List[Tuple[datetime, datetime]] = []
+        self._cursor: Optional[datetime] = None
+        self._completed: List[Tuple[datetime, datetime]] = []
+        self.skipped = 0  # completed ranges jumped over
+
+    def windows(
+        self,
+        start_time: datetime,
+        end_time: datetime,
+        completed: Sequence[Tuple[datetime, datetime]] = (),
+    ) -> Iterator[Tuple[datetime, datetime]]:
+        """
+        Yields (start, end) windows covering the range, sized by the latest observations.
+
+        Call `observe` after each window and `split` when a window hits a limit.
+
+        Args:
+            start_time (datetime): The earliest start time.
+            end_time (datetime): The latest end time.
+            completed (Sequence[Tuple[datetime, datetime]]): Windows already exported, e.g.
+                the journal's completed windows of the table; they may overlap.
+
+        Yields:
+            Tuple[datetime, datetime]: Start and end of each window still to export.
+        """
+        self._completed = sorted(completed)
+        self._cursor = start_time
+        while self._pending or self._cursor < end_time:
+            if self._pending:
+                yield self._pending.pop()
+                continue
+            window_start, next_completed = self._skip_completed(self._cursor)
+            window_end = min(window_start + self.window, end_time, next_completed or end_time)
+            self._cursor = max(window_start, window_end)
+            if window_start < window_end:
+                yield window_start, window_end
+
+    def _skip_completed(self, cursor: datetime) -> Tuple[datetime, Optional[datetime]]:
+        """The first time from `cursor` on that no completed window covers, and the start of the next completed window."""
+        for start, end in self._completed:
+            if start > cursor:
+                return cursor, start
+            if end > cursor:
+                cursor = end
+                self.skipped += 1
+        return cursor, None
+
+    def observe(self, start: datetime, end: datetime, rows: int, bytes: Optional[int] = None):
+        """
+        Learn from a completed window and size the next one.
+
+        Rates rising between windows are extrapolated one step ahead, so windows
+        shrink before a burst peaks; falling rates are smoothed so that a single
+        quiet window does not overshoot into the next busy period.
+
+        Args:
+            start (datetime): Window start.
+            end (datetime): Window end.
+            rows (int): Rows returned.
+            bytes (Optional[int]): Result size in bytes (e.g. from `include_statistics`).
+        """
+        seconds = max((end - start).total_seconds(), 1.0)
+        self._row_rate = self._update_rate(self._row_rate, rows / seconds)
+        if bytes is not None:
+            self._byte_rate = self._update_rate(self._byte_rate, bytes / seconds)
+        self.window = self._next_window()
+
+    def split(self, start: datetime, end: datetime) -> bool:
+        """
+        Bisect a window that hit the row or size limit.
+
+        Args:
+            start (datetime): Window start.
+            end (datetime): Window end.
+
+        Returns:
+            bool: True if the halves were queued, False if the window is already at `min_window`.
+        """
+        if end - start <= self.min_window:
+            return False
+        seconds = (end - start).total_seconds()
+        # The window held at least a full result set
+        self._row_rate = max(self._row_rate or 0.0, MAX_RESULT_ROWS / seconds)
+        midpoint = start + (end - start) / 2
+        if end == self._cursor:
+            # Hand the upper half back to adaptive sizing rather than bisecting it blindly
+            self._cursor = midpoint
+        else:
+            self._pending.append((midpoint, end))
+        self._pending.append((start, midpoint))
+        self.window = min(self.window, midpoint - start)
+        return True
+
+    def _update_rate(self, previous: Optional[float], observed: float) -> float:
+        if previous is None:
+            return observed
+        if observed > previous:
+            return observed * min(self.max_growth, observed / max(previous, 1e-9))
+        return 0.5 * previous + 0.5 * observed
+
+    def _next_window(self) -> timedelta:
+        limits = [self.window.total_seconds() * self.max_growth, self.max_window.total_seconds()]
+        if self._row_rate:
+            limits.append(self.target_rows / self._row_rate)
+        if self._byte_rate:
+            limits.append(self.target_bytes / self._byte_rate)
+        seconds = max(min(limits), self.min_window.total_seconds())
+        return timedelta(seconds=int(seconds))
+
+
+def query_table(kql_query: str) -> str:
+    """
+    Name of the table a KQL query starts from, used to label its metrics.
+
+    Args:
+        kql_query (str): KQL query, e.g. "Syslog | where ...".
+
+    Returns:
+        str: The first pipeline element, e.g. "Syslog".
+    """
+    return kql_query.split("|", 1)[0].strip() or "unknown"
+
+
+def _log_cache_hit(table_name: str, start_time: datetime, end_time: datetime, rows: int):
+    logger.info(
+        "Read data from %s to %s from the result cache, rows: %d", start_time, end_time, rows,
+        extra={"table": table_name, "window_start": start_time, "window_end": end_time, "rows": rows},
+    )
+    get_metrics().cache_hits.inc(table_name)
+
+
+def retry_after(headers: Any) -> float:
+    """
+    Seconds to wait after a throttled response, from its Retry-After header.
+
+    Args:
+        headers (Any): Response headers.
+
+    Returns:
+        float: The header's delay in seconds, or `DEFAULT_RETRY_AFTER_SECONDS` if it is missing or an HTTP date.
+    """
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return float(DEFAULT_RETRY_AFTER_SECONDS)
+
+
+def _timestamp(value: Any) -> datetime:
+    """A datetime column value, parsed if the query API returned it as text."""
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def result_bytes(statistics: Optional[Dict]) -> Optional[int]:
+    """
+    Extract the result size from `include_statistics` query statistics.
+
+    Args:
+        statistics (Optional[Dict]): `LogsQueryResult.statistics`.
+
+    Returns:
+        Optional[int]: Result size in bytes, or None if unavailable.
+    """
+    try:
+        return int(statistics["query"]["resultSize"]["tables"]["bytes"])
+    except (KeyError, TypeError, ValueError):
+        return None
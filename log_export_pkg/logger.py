@@ -1,31 +1,193 @@
+import atexit
+import json
 import logging
-import os
+import logging.handlers
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Dict, Tuple
+from export_pipeline.config import settings
 
-# Ensure logs directory exists
+# Log file written once logging is configured
 log_dir = Path("logs")
-log_dir.mkdir(exist_ok=True)
-
-# Define log file path
 log_file_path = log_dir / "pipeline.log"
 
-# Create logger
+# Record attributes written as top-level fields of JSON log lines
+STRUCTURED_FIELDS = ("table", "window_start", "window_end", "rows", "bytes", "blob", "attempt", "status")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any structured fields passed in `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name in STRUCTURED_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value.isoformat() if isinstance(value, datetime) else value
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text lines, noting how many similar messages the rate limit dropped before this one."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} (+{suppressed} similar suppressed)" if suppressed else text
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Passes at most `limit` records per message template and `interval` seconds.
+
+    Records are keyed by their unformatted template (`record.msg`), so per-window
+    messages logged with %-style arguments share one budget. The next record let
+    through carries the number dropped in between. Warnings and errors always pass.
+    Templates not logged for a whole interval are forgotten, so messages built
+    with f-strings, one template each, do not accumulate.
+    """
+
+    def __init__(self, limit: int, interval: float):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._windows: Dict[Tuple[str, object], Tuple[float, int, int]] = {}
+        self._next_prune = time.monotonic() + interval
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_prune:
+                self._prune(now)
+            started, passed, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - started >= self.interval:
+                started, passed = now, 0
+            if passed >= self.limit:
+                self._windows[key] = (started, passed, suppressed + 1)
+                return False
+            self._windows[key] = (started, passed + 1, 0)
+        record.suppressed = suppressed
+        return True
+
+    def _prune(self, now: float):
+        """Drop the templates whose interval expired; called with the lock held."""
+        self._windows = {key: window for key, window in self._windows.items() if now - window[0] < self.interval}
+        self._next_prune = now + self.interval
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread without formatting them.
+
+    The stock `QueueHandler` formats each message in the logging thread so the
+    record can be pickled; records here stay in-process, so formatting (and
+    the disk and console I/O) happens on the listener thread instead.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class WindowProgress:
+    """
+    Aggregates per-window completions into one periodic line per table.
+
+    Call `record` for every finished window; at most every `interval` seconds
+    the counts since the last report are logged, instead of one line per window.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last = time.monotonic()
+        self._counts: Dict[str, list] = defaultdict(lambda: [0, 0, 0, 0])
+
+    def record(self, table: str, rows: int = 0, bytes: int = 0, failed: bool = False):
+        with self._lock:
+            counts = self._counts[table]
+            counts[0] += 1
+            counts[1] += rows
+            counts[2] += bytes
+            counts[3] += int(failed)
+            due = time.monotonic() - self._last >= self.interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Log and reset the counts since the last report."""
+        with self._lock:
+            counts, self._counts = dict(self._counts), defaultdict(lambda: [0, 0, 0, 0])
+            elapsed = time.monotonic() - self._last
+            self._last = time.monotonic()
+        for table, (windows, rows, size, failed) in sorted(counts.items()):
+            logger.info(
+                "📈 %s: %d windows (%d failed), %d rows, %.1f MB in the last %.0fs",
+                table, windows, failed, rows, size / (1024 * 1024), elapsed, extra={"table": table, "rows": rows, "bytes": size},
+            )
+
+
+# Create logger; it has no handlers (so only warnings reach stderr) until `configure_logging`
 logger = logging.getLogger("export_pipeline")
-logger.setLevel(logging.INFO)
-
-# Console handler
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-console_handler.setFormatter(console_formatter)
-
-# File handler
-file_handler = logging.FileHandler(log_file_path)
-file_handler.setLevel(logging.INFO)
-file_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
-file_handler.setFormatter(file_formatter)
-
-# Add handlers if not already added
-if not logger.hasHandlers():
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+
+window_progress = WindowProgress(settings.log_progress_seconds)
+
+
+def configure_logging():
+    """
+    Attach the console and file handlers behind the log queue.
+
+    Called by `config.configure`. Only the first call adds handlers; later
+    calls just apply the current level and progress interval.
+    """
+    logger.setLevel(settings.log_level.upper())
+    window_progress.interval = settings.log_progress_seconds
+
+    # Add handlers if not already added
+    if logger.hasHandlers():
+        return
+
+    log_dir.mkdir(exist_ok=True)
+
+    # Console handler
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    console_formatter = TextFormatter("%(asctime)s - %(levelname)s - %(message)s")
+    console_handler.setFormatter(console_formatter)
+
+    # File handler, JSON lines by default
+    file_handler = logging.FileHandler(log_file_path)
+    file_handler.setLevel(logging.INFO)
+    if settings.log_file_format == "json":
+        file_formatter = JsonFormatter()
+    else:
+        file_formatter = TextFormatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    file_handler.setFormatter(file_formatter)
+
+    # Workers only enqueue records; one listener thread formats and writes them
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(settings.log_rate_limit, settings.log_rate_interval_seconds))
+    listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+
+    logger.addHandler(queue_handler)
+    listener.start()
+    # Write out queued records and the last progress report before the interpreter exits
+    atexit.register(listener.stop)
+    atexit.register(window_progress.flush)
@@ -1,36 +1,476 @@
 import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 # Add project root to path
 sys.path.append(str(Path(".").resolve()))
 
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from export_pipeline.config import settings
-from export_pipeline.logger import logger
-from export_pipeline.main import process_table
-from export_pipeline.utils import load_table_list
-
-logger.info("📘 Starting export from notebook...")
-
-# Load list of tables
-try:
-    tables = load_table_list()
-except FileNotFoundError as e:
-    logger.error(str(e))
-    raise
-
-# Process tables in parallel
-results = []
-with ThreadPoolExecutor(max_workers=settings.max_parallel_tables) as executor:
-    futures = {executor.submit(process_table, t): t for t in tables}
-    for future in as_completed(futures):
-        table = futures[future]
-        try:
-            future.result()
+from export_pipeline.blob_uploader import HashingWriter, log_connection_stats, upload_blob, upload_buffer_bytes, window_metadata
+from export_pipeline.compactor import Compactor
+from export_pipeline.compression import codec_for
+from export_pipeline.config import configure, settings
+from export_pipeline.encoder import get_encode_pool
+from export_pipeline.formats import get_output_format
+from export_pipeline.governor import get_governor
+from export_pipeline.journal import COMPLETED, get_journal
+from export_pipeline.kql_exporter import AdaptiveWindowController, LogAnalyticsExporter, QueryRows
+from export_pipeline.logger import logger, window_progress
+from export_pipeline.metrics import get_metrics, start_metrics_exporter
+from export_pipeline.pipeline import Stage, StagePipeline
+from export_pipeline.planner import ExportPlanner
+from export_pipeline.scheduler import WorkScheduler
+from export_pipeline.workspaces import Workspace, get_workspaces, resolve
+
+Window = Tuple[datetime, datetime]
+
+_local = threading.local()
+
+
+@dataclass
+class WindowJob:
+    """One window moving through the query, encode and upload stages."""
+
+    table: str  # export key, e.g. "weu/Syslog"; the table name in single workspace runs
+    start: datetime
+    end: datetime
+    result: Optional[QueryRows] = None
+    rows: int = 0
+    result_bytes: Optional[int] = None
+    truncated: bool = False
+    failed: bool = False
+    file_path: Optional[Path] = None
+    encoded_bytes: int = 0
+    content_md5: Optional[str] = None  # of the encoded file, computed while writing it
+    reserved: int = 0  # bytes held in the memory budget
+    in_flight: bool = False
+
+
+def get_exporter(workspace: Optional[Workspace] = None) -> LogAnalyticsExporter:
+    """Return this thread's connected exporter of a workspace, creating it on first use."""
+    if not hasattr(_local, "exporters"):
+        _local.exporters = {}
+    exporter = _local.exporters.get(workspace.name if workspace else "")
+    if exporter is None:
+        exporter = LogAnalyticsExporter(workspace)
+        _local.exporters[exporter.workspace.name] = exporter
+    return exporter
+
+
+def export_range() -> Window:
+    """Lookback range, aligned to midnight UTC so reruns on the same day plan identical windows."""
+    end_time = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return end_time - timedelta(days=settings.export_days_lookback), end_time
+
+
+def plan_table(table: str) -> List[Window]:
+    """
+    Plan the windows of a table for the `planned` or `fixed` window strategy.
+
+    Args:
+        table (str): Export key of the table.
+
+    Returns:
+        List[Window]: (start, end) windows, also recorded as planned in the journal.
+    """
+    workspace, table_name = resolve(table)
+    exporter = get_exporter(workspace)
+    start_time, end_time = export_range()
+    if settings.window_strategy == "planned":
+        # Plans of equally named tables of other workspaces are cached apart
+        cache_dir = Path(settings.export_dir) / "plans" / workspace.name if workspace.name else None
+        planner = ExportPlanner(exporter.histogram, cache_dir=cache_dir)
+        windows = planner.plan(table_name, start_time, end_time, get_journal().windows(table))
+    else:
+        windows = list(exporter.generate_time_windows(start_time, end_time, settings.batch_interval_minutes))
+    get_journal().plan(table, windows)
+    return windows
+
+
+def query_window(table: str, window_start: datetime, window_end: datetime) -> WindowJob:
+    """
+    Query stage: fetch the raw rows of one window and mark it in flight in the journal.
+
+    A result truncated at the row or size limit is dropped unless the window is
+    already down to `min_window_minutes`; the caller bisects it instead.
+
+    The window's estimated size is reserved in the memory budget before the
+    query starts, waiting while the budget is used up, and trued up to the
+    result size once it is known.
+
+    Args:
+        table (str): Export key of the table.
+        window_start (datetime): Window start.
+        window_end (datetime): Window end.
+
+    Returns:
+        WindowJob: The window with its result rows, or flagged truncated or failed.
+    """
+    journal = get_journal()
+    governor = get_governor()
+    job = WindowJob(table, window_start, window_end)
+
+    job.reserved = governor.reserve(governor.estimate(table, window_start, window_end))
+    job.in_flight = True
+    get_metrics().windows_in_flight.inc(table)
+    journal.start(table, window_start, window_end)
+    try:
+        workspace, table_name = resolve(table)
+        exporter = get_exporter(workspace)
+        result = exporter.query_rows(exporter.window_query(table_name), window_start, window_end, raise_errors=True)
+    except Exception as ex:
+        journal.fail(table, window_start, window_end, str(ex))
+        job.failed = True
+        window_progress.record(table, failed=True)
+        return _release(job)
+    if result is None:
+        journal.complete(table, window_start, window_end, rows=0, bytes=0, blobs=[])
+        governor.observe(table, window_start, window_end, 0)
+        return _release(job)
+
+    job.rows, job.result_bytes = len(result.rows), result.bytes
+    if result.bytes is not None:
+        governor.observe(table, window_start, window_end, result.bytes)
+        job.reserved = governor.resize(job.reserved, result.bytes * governor.expansion)
+    if result.partial and window_end - window_start > timedelta(minutes=settings.min_window_minutes):
+        journal.fail(table, window_start, window_end, "Row or size limit reached; window bisected")
+        job.truncated = True
+        return _release(job)
+
+    job.result = result
+    return job
+
+
+def encode_window(job: WindowJob) -> WindowJob:
+    """
+    Encode stage: write a queried window to `export_dir` in the configured output
+    format, compressed with the table's codec as it is written.
+    """
+    output_format = get_output_format()
+    _, table_name = resolve(job.table)
+    codec = codec_for(table_name, output_format.name)
+    output_dir = Path(settings.export_dir) / _container_name(job.table)
+    job.file_path = output_dir / codec.blob_name(output_format.blob_name(f"{table_name}_{job.start:%Y-%m-%dT%H%M%S}"))
+
+    result, job.result = job.result, None  # drop the raw rows once encoded
+    started = time.perf_counter()
+    try:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        with open(job.file_path, "wb") as raw:
+            hashed = HashingWriter(raw)
+            with codec.open(hashed) as sink:
+                job.encoded_bytes = get_encode_pool().write_rows(
+                    output_format, job.table, result.columns, result.rows, sink, result.column_types
+                )
+        job.content_md5 = hashed.content_md5
+        get_metrics().encode_seconds.observe(time.perf_counter() - started, job.table)
+    except Exception as ex:
+        get_journal().fail(job.table, job.start, job.end, f"Encoding failed: {ex}")
+        job.failed = True
+        window_progress.record(job.table, failed=True)
+        return _release(job)
+
+    # Only the uploader's block buffers are held from here on
+    job.reserved = get_governor().resize(job.reserved, upload_buffer_bytes(job.file_path.stat().st_size))
+    return job
+
+
+def upload_window(job: WindowJob) -> WindowJob:
+    """
+    Upload stage: upload an encoded window to the table's container, record it in
+    the journal and remove the local file once uploaded.
+    """
+    try:
+        if not job.failed:
+            _upload(job)
+    finally:
+        _release(job)
+    return job
+
+
+def _upload(job: WindowJob):
+    output_format = get_output_format()
+    journal = get_journal()
+    codec = codec_for(resolve(job.table)[1], output_format.name)
+
+    size = job.file_path.stat().st_size
+    uploaded = upload_blob(
+        job.file_path, _container_name(job.table),
+        content_type=output_format.content_type, content_encoding=codec.content_encoding, table=job.table,
+        content_md5=job.content_md5, metadata=window_metadata(job.start, job.end, job.rows),
+    )
+    if not uploaded:
+        journal.fail(job.table, job.start, job.end, f"Upload failed for {job.file_path.name}")
+        job.failed = True
+        window_progress.record(job.table, failed=True)
+        return
+
+    journal.complete(job.table, job.start, job.end, rows=job.rows, bytes=size, blobs=[job.file_path.name])
+    window_progress.record(job.table, rows=job.rows, bytes=size)
+    job.file_path.unlink()
+
+
+def _release(job: WindowJob) -> WindowJob:
+    """Return the window's memory reservation to the budget and count it out of flight."""
+    get_governor().release(job.reserved)
+    job.reserved = 0
+    if job.in_flight:
+        get_metrics().windows_in_flight.dec(job.table)
+        job.in_flight = False
+    return job
+
+
+def export_window(table: str, window_start: datetime, window_end: datetime) -> WindowJob:
+    """
+    Query, encode and upload one window in the calling thread.
+
+    Args:
+        table (str): Export key of the table.
+        window_start (datetime): Window start.
+        window_end (datetime): Window end.
+
+    Returns:
+        WindowJob: Rows, result bytes and whether the window was truncated or failed.
+    """
+    job = query_window(table, window_start, window_end)
+    if job.result is not None:
+        job = upload_window(encode_window(job))
+    return job
+
+
+def export_pipeline(on_done=None) -> StagePipeline:
+    """
+    Encode and upload stages fed by the query workers.
+
+    While one window uploads, the next ones are already being queried and
+    encoded; bounded queues make the query workers wait when uploads fall behind.
+
+    Args:
+        on_done (Optional[Callable[[WindowJob], None]]): Called with each window leaving the upload stage.
+
+    Returns:
+        StagePipeline: Running pipeline; submit queried `WindowJob`s, then close it.
+    """
+    def upload(job: WindowJob):
+        job = upload_window(job)
+        if on_done is not None:
+            on_done(job)
+
+    pipeline = StagePipeline(
+        [
+            Stage("encode", encode_window, settings.encode_workers),
+            Stage("upload", upload, settings.upload_workers),
+        ],
+        queue_size=settings.pipeline_queue_size,
+    )
+    for index, stage in enumerate(pipeline.stages):
+        get_metrics().queue_depth.set_function(stage.name, function=lambda index=index: pipeline.depth(index))
+    return pipeline
+
+
+def process_table(table: str, pipeline: Optional[StagePipeline] = None) -> Dict:
+    """
+    Export one table over the lookback period in time windows, querying one window at a time.
+
+    `window_strategy` selects the windows: `planned` executes equal-size windows
+    planned from a per-minute histogram, `adaptive` resizes windows from the row
+    and byte density of earlier windows, and `fixed` uses `batch_interval_minutes`.
+    Windows truncated at the row limit are bisected and queried again. Windows
+    completed by an earlier run are skipped, so a restarted run resumes where it
+    stopped.
+
+    Args:
+        table (str): Export key of the table.
+        pipeline (Optional[StagePipeline]): Encode/upload stages to hand queried windows
+            to, so the next query overlaps the previous upload. Without one, each
+            window is encoded and uploaded before the next query.
+
+    Returns:
+        Dict: Journal summary for the table (window states, rows, bytes and blob names);
+        windows still in the pipeline are not yet counted as completed.
+
+    Raises:
+        RuntimeError: If windows failed; with a pipeline, only failed queries are
+            counted here, as the pipeline reports the windows it fails itself.
+    """
+    journal = get_journal()
+
+    if settings.window_strategy == "adaptive":
+        controller = AdaptiveWindowController()
+        completed = [(record.start, record.end) for record in journal.windows(table, COMPLETED)]
+        windows = controller.windows(*export_range(), completed=completed)
+    else:
+        controller = None
+        pending = deque(plan_table(table))
+        windows = _drain(pending)
+
+    skipped = failed = 0
+    for window_start, window_end in windows:
+        if controller is None and journal.is_completed(table, window_start, window_end):
+            skipped += 1
+            continue
+
+        if pipeline is not None:
+            job = query_window(table, window_start, window_end)
+            if job.result is not None:
+                pipeline.submit(job)
+            elif job.failed:
+                failed += 1
+        else:
+            job = export_window(table, window_start, window_end)
+            if job.failed:
+                failed += 1
+        if job.truncated:
+            if controller is not None:
+                controller.split(window_start, window_end)
+            else:
+                pending.extendleft(reversed(_bisect(window_start, window_end)))
+        elif controller is not None and not job.failed:
+            controller.observe(window_start, window_end, rows=job.rows, bytes=job.result_bytes)
+
+    if controller is not None:
+        skipped = controller.skipped
+    if skipped:
+        logger.info("Skipped %d windows of %s completed by an earlier run", skipped, table)
+    summary = journal.summary(table)
+    if pipeline is None:
+        _log_summary(summary)
+    if failed:
+        raise RuntimeError(f"{failed} failed windows")
+    return summary
+
+
+def _drain(pending: deque):
+    """Yield windows from a deque that may grow while it is consumed (bisected windows)."""
+    while pending:
+        yield pending.popleft()
+
+
+def _bisect(window_start: datetime, window_end: datetime) -> List[Window]:
+    midpoint = window_start + (window_end - window_start) / 2
+    return [(window_start, midpoint), (midpoint, window_end)]
+
+
+def _container_name(table: str) -> str:
+    workspace, table_name = resolve(table)
+    return workspace.container(table_name)
+
+
+def _log_summary(summary: Dict):
+    logger.info(
+        "Finished %s: %d rows in %d blobs, windows %s",
+        summary["table"], summary["rows"], len(summary["blobs"]), summary["windows"],
+    )
+
+
+def _log_workspace_summaries(workspaces: List[Workspace], results: List[Tuple[str, str]]):
+    """Log each workspace's totals over its tables, and the time its queries waited for its budget."""
+    journal = get_journal()
+    for workspace in workspaces:
+        keys = [table for table, _ in results if resolve(table)[0] is workspace]
+        summaries = [journal.summary(table) for table in keys]
+        failed = sum(1 for table, status in results if table in keys and status.startswith("❌"))
+        logger.info(
+            "📊 Workspace %s: %d rows in %d blobs from %d tables, %d tables with errors, %.1fs waiting for the query budget",
+            workspace.name, sum(s["rows"] for s in summaries), sum(len(s["blobs"]) for s in summaries),
+            len(keys), failed, workspace.budget.waited,
+        )
+
+
+def run():
+    logger.info("📘 Starting export from notebook...")
+
+    # Load the tables of every workspace, keyed so equally named tables are exported apart
+    try:
+        workspaces = get_workspaces()
+        tables = [workspace.key(table) for workspace in workspaces for table in workspace.table_list()]
+    except FileNotFoundError as e:
+        logger.error(str(e))
+        raise
+
+    # Start the encode workers before any export threads exist
+    get_encode_pool()
+    stop_metrics = start_metrics_exporter()
+
+    errors: Dict[str, str] = {}
+    failures = Counter()
+    failures_lock = threading.Lock()
+
+    def count_failure(job: WindowJob):
+        if job.failed:
+            with failures_lock:
+                failures[job.table] += 1
+
+    # Queries run on the table workers or the scheduler; encoding and uploading overlap them
+    with export_pipeline(on_done=count_failure) as pipeline:
+        if settings.window_strategy == "adaptive":
+            # Adaptive windows are sized from the previous one, so each table queries sequentially
+            with ThreadPoolExecutor(max_workers=settings.max_parallel_tables) as executor:
+                futures = {executor.submit(process_table, t, pipeline): t for t in tables}
+                for future in as_completed(futures):
+                    table = futures[future]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error("❌ Error processing %s: %s", table, e)
+                        errors[table] = str(e)
+        else:
+            # Windows of all tables share one pool of query workers
+            def schedule_window(table: str, window_start: datetime, window_end: datetime) -> Optional[List[Window]]:
+                if get_journal().is_completed(table, window_start, window_end):
+                    return None
+                job = query_window(table, window_start, window_end)
+                if job.failed:
+                    raise RuntimeError(f"Query failed for {table} {window_start}-{window_end}")
+                if job.truncated:
+                    return _bisect(window_start, window_end)
+                if job.result is not None:
+                    pipeline.submit(job)
+                return None
+
+            scheduler = WorkScheduler(schedule_window, workers=settings.max_workers)
+            for table in tables:
+                try:
+                    scheduler.submit(table, plan_table(table))
+                except Exception as e:
+                    logger.error("❌ Error planning %s: %s", table, e)
+                    errors[table] = str(e)
+            for table, counts in scheduler.run().items():
+                failures[table] += counts["failed"]
+
+    results = []
+    for table in tables:
+        if table in errors:
+            results.append((table, f"❌ Error: {errors[table]}"))
+            continue
+        _log_summary(get_journal().summary(table))
+        if failures[table]:
+            results.append((table, f"❌ Error: {failures[table]} failed windows"))
+        else:
             results.append((table, "✅ Success"))
-        except Exception as e:
-            logger.error(f"❌ Error processing {table}: {str(e)}")
-            results.append((table, f"❌ Error: {str(e)}"))
 
-logger.info("✅ All exports complete.")
-results
+    if len(workspaces) > 1:
+        _log_workspace_summaries(workspaces, results)
+
+    if settings.compact_after_export:
+        Compactor().run(tables)
+
+    window_progress.flush()
+    logger.info("✅ All exports complete.")
+    log_connection_stats()
+    memory = get_governor().stats()
+    logger.info("Peak in-flight data: %d of %d MB budget", memory["peak"] // (1024 * 1024), memory["budget"] // (1024 * 1024))
+    get_metrics().log_summary()
+    if stop_metrics is not None:
+        stop_metrics()
+    return results
+
+
+if __name__ == "__main__":
+    configure()
+    run()
@@ -0,0 +1,377 @@
+# export_pipeline/metrics.py
+
+"""
+Module: metrics
+Purpose: Per-stage latency, throughput, retry and queue metrics, exposed in Prometheus text format and summarized at the end of a run.
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from export_pipeline.config import settings
+from export_pipeline.logger import logger
+
+# Latency buckets in seconds, from a fast upload to a query close to the server timeout
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+Labels = Tuple[str, ...]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _labels(self, values: Labels) -> str:
+        if not values:
+            return ""
+        pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, values))
+        return "{" + pairs + "}"
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic total per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def values(self) -> Dict[Labels, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self):
+        return [f"{self.name}{self._labels(labels)} {value:g}" for labels, value in sorted(self.values().items())]
+
+
+class Gauge(_Metric):
+    """Current value per label set, either set directly or read from a callback when rendered."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Labels, float] = {}
+        self._functions: Dict[Labels, Callable[[], float]] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set_function(self, *labels: str, function: Callable[[], float]):
+        """Read the value from `function` whenever the gauge is rendered."""
+        with self._lock:
+            self._functions[labels] = function
+
+    def values(self) -> Dict[Labels, float]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for labels, function in functions.items():
+            values[labels] = function()
+        return values
+
+    def _samples(self):
+        return [f"{self.name}{self._labels(labels)} {value:g}" for labels, value in sorted(self.values().items())]
+
+
+class Histogram(_Metric):
+    """Observation counts in cumulative buckets per label set, with their sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            counts = self._counts.setdefault(labels, [0] * (len(self.buckets) + 1))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sums[labels] = self._sums.get(labels, 0.0) + value
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            return sum(self._counts.get(labels, ()))
+
+    def sum(self, *labels: str) -> float:
+        with self._lock:
+            return self._sums.get(labels, 0.0)
+
+    def quantile(self, fraction: float, *labels: str) -> float:
+        """Estimate a quantile by interpolating within its bucket, as Prometheus' `histogram_quantile` does."""
+        with self._lock:
+            counts = list(self._counts.get(labels, ()))
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank, seen = fraction * total, 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def label_sets(self) -> List[Labels]:
+        with self._lock:
+            return sorted(self._counts)
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            items = sorted((labels, list(counts), self._sums[labels]) for labels, counts in self._counts.items())
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket_labels = self._labels(labels)[:-1] + f',le="{le}"}}' if labels else f'{{le="{le}"}}'
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {total:g}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class ExportMetrics:
+    """
+    Registry of the pipeline's metrics, labeled by table (and stage where it applies).
+
+    Query and upload latencies are histograms; rows and bytes are counters, so
+    Prometheus derives rows/s and MB/s with `rate()`. The end-of-run summary
+    computes the same rates over the run and compares the time spent in each
+    stage, which shows whether the query or the upload side is the bottleneck.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.query_seconds = Histogram("export_query_seconds", "Query latency per window", ["table"])
+        self.query_rows = Counter("export_query_rows_total", "Rows returned by queries", ["table"])
+        self.query_bytes = Counter("export_query_bytes_total", "Result bytes returned by queries", ["table"])
+        self.cache_hits = Counter("export_result_cache_hits_total", "Window queries answered by the result cache", ["table"])
+        self.encode_seconds = Histogram("export_encode_seconds", "Encoding time per window", ["table"])
+        self.upload_seconds = Histogram("export_upload_seconds", "Upload latency per blob", ["table"])
+        self.upload_bytes = Counter("export_upload_bytes_total", "Bytes uploaded", ["table"])
+        self.upload_skipped_bytes = Counter(
+            "export_upload_skipped_bytes_total", "Bytes not uploaded because the blob already held them", ["table"]
+        )
+        self.retries = Counter("export_retries_total", "Retried requests", ["stage", "table"])
+        self.throttled = Counter("export_throttled_total", "Requests throttled by the service (429/503)", ["stage", "table"])
+        self.failures = Counter("export_failures_total", "Requests failed after all retries", ["stage", "table"])
+        self.windows_in_flight = Gauge("export_windows_in_flight", "Windows queried but not yet uploaded", ["table"])
+        self.queue_depth = Gauge("export_queue_depth", "Windows waiting in front of a pipeline stage", ["stage"])
+        self.metrics: List[_Metric] = [
+            self.query_seconds, self.query_rows, self.query_bytes, self.cache_hits, self.encode_seconds,
+            self.upload_seconds, self.upload_bytes, self.upload_skipped_bytes, self.retries, self.throttled, self.failures,
+            self.windows_in_flight, self.queue_depth,
+        ]
+
+    def query_done(self, table: str, seconds: float, rows: int = 0, bytes: Optional[int] = None, failed: bool = False):
+        """Record one window query."""
+        self.query_seconds.observe(seconds, table)
+        self.query_rows.inc(table, amount=rows)
+        if bytes:
+            self.query_bytes.inc(table, amount=bytes)
+        if failed:
+            self.failures.inc("query", table)
+
+    def upload_done(self, table: str, seconds: float, bytes: int = 0, failed: bool = False, skipped: bool = False):
+        """Record one blob upload; `skipped` when the blob already held the content."""
+        self.upload_seconds.observe(seconds, table)
+        if failed:
+            self.failures.inc("upload", table)
+        elif skipped:
+            self.upload_skipped_bytes.inc(table, amount=bytes)
+        else:
+            self.upload_bytes.inc(table, amount=bytes)
+
+    @contextmanager
+    def in_flight(self, table: str) -> Iterator[None]:
+        """Count a window as in flight for the duration of a block."""
+        self.windows_in_flight.inc(table)
+        try:
+            yield
+        finally:
+            self.windows_in_flight.dec(table)
+
+    def retry(self, stage: str, table: str, status: Optional[int] = None):
+        """Record a retried request; 429 and 503 responses also count as throttling."""
+        self.retries.inc(stage, table)
+        if status in (429, 503):
+            self.throttled.inc(stage, table)
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per-table totals and rates over the run so far.
+
+        Returns:
+            Dict[str, Dict[str, float]]: By table: windows, rows/s, query MB/s and upload MB/s
+            over the run, p50/p99 query latency, time spent querying and uploading, MB not uploaded
+            because the blobs were unchanged, retries and throttles.
+        """
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        rows, query_bytes, upload_bytes = self.query_rows.values(), self.query_bytes.values(), self.upload_bytes.values()
+        retries, throttled = self.retries.values(), self.throttled.values()
+        skipped = self.upload_skipped_bytes.values()
+        tables = {labels[0] for labels in (*self.query_seconds.label_sets(), *self.upload_seconds.label_sets())}
+        return {
+            table: {
+                "windows": self.query_seconds.count(table),
+                "rows_per_s": rows.get((table,), 0.0) / elapsed,
+                "query_mb_per_s": query_bytes.get((table,), 0.0) / elapsed / (1024 * 1024),
+                "upload_mb_per_s": upload_bytes.get((table,), 0.0) / elapsed / (1024 * 1024),
+                "query_p50_s": self.query_seconds.quantile(0.50, table),
+                "query_p99_s": self.query_seconds.quantile(0.99, table),
+                "query_busy_s": self.query_seconds.sum(table),
+                "encode_busy_s": self.encode_seconds.sum(table),
+                "upload_busy_s": self.upload_seconds.sum(table),
+                "upload_skipped_mb": skipped.get((table,), 0.0) / (1024 * 1024),
+                "retries": sum(value for labels, value in retries.items() if labels[1] == table),
+                "throttled": sum(value for labels, value in throttled.items() if labels[1] == table),
+            }
+            for table in sorted(tables)
+        }
+
+    def log_summary(self):
+        """Log the end-of-run summary, one line per table plus the stage that took longest."""
+        busy = {"query": 0.0, "encode": 0.0, "upload": 0.0}
+        for table, stats in self.summary().items():
+            logger.info(
+                f"📊 {table}: {stats['windows']} windows, {stats['rows_per_s']:.0f} rows/s, "
+                f"query {stats['query_mb_per_s']:.2f} MB/s (p50 {stats['query_p50_s']:.2f}s, p99 {stats['query_p99_s']:.2f}s), "
+                f"upload {stats['upload_mb_per_s']:.2f} MB/s ({stats['upload_skipped_mb']:.1f} MB unchanged), {stats['retries']:.0f} retries, {stats['throttled']:.0f} throttled"
+            )
+            for stage in busy:
+                busy[stage] += stats[f"{stage}_busy_s"]
+        if any(busy.values()):
+            bottleneck = max(busy, key=busy.get)
+            logger.info(
+                "📊 Time spent: " + ", ".join(f"{stage} {seconds:.0f}s" for stage, seconds in busy.items())
+                + f"; {bottleneck} is the bottleneck"
+            )
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = get_metrics().render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_exporter(port: Optional[int] = None, textfile: Optional[str] = None) -> Optional[Callable[[], None]]:
+    """
+    Expose the metrics while the export runs.
+
+    Serves them on `http://localhost:<port>/metrics` for Prometheus, and/or
+    rewrites `textfile` every `metrics_interval_seconds` for the node_exporter
+    textfile collector. The file is replaced atomically, so it is never read half-written.
+
+    Args:
+        port (Optional[int]): HTTP port; 0 disables the endpoint. Defaults to `metrics_port`.
+        textfile (Optional[str]): Path of the textfile dump; empty disables it. Defaults to `metrics_textfile`.
+
+    Returns:
+        Optional[Callable[[], None]]: Stops the exporter (writing the textfile one last time), or None if both are disabled.
+    """
+    port = settings.metrics_port if port is None else port
+    textfile = settings.metrics_textfile if textfile is None else textfile
+    stoppers = []
+
+    if port:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        stoppers.append(server.shutdown)
+        logger.info(f"Serving metrics on http://127.0.0.1:{server.server_address[1]}/metrics")
+
+    if textfile:
+        stopped = threading.Event()
+
+        def dump():
+            while not stopped.wait(settings.metrics_interval_seconds):
+                _write_textfile(Path(textfile))
+
+        threading.Thread(target=dump, name="metrics-textfile", daemon=True).start()
+
+        def stop_dump():
+            stopped.set()
+            _write_textfile(Path(textfile))
+
+        stoppers.append(stop_dump)
+
+    if not stoppers:
+        return None
+
+    def stop():
+        for stopper in stoppers:
+            stopper()
+
+    return stop
+
+
+def _write_textfile(path: Path):
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f".{path.name}.{os.getpid()}")
+        temporary.write_text(get_metrics().render(), encoding="utf-8")
+        os.replace(temporary, path)
+    except OSError as ex:
+        logger.warning(f"⚠️ Could not write metrics to {path}: {ex}")
+
+
+_metrics: Optional[ExportMetrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> ExportMetrics:
+    """Return the shared metrics registry, creating it on first use."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = ExportMetrics()
+        return _metrics
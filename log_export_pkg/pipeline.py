@@ -0,0 +1,99 @@
+# export_pipeline/pipeline.py
+
+"""
+Module: pipeline
+Purpose: Run export stages (e.g. encode and upload) concurrently, connected by bounded queues with backpressure.
+"""
+
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+from export_pipeline.logger import logger
+
+# Marks the end of input for a stage's workers
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """One pipeline stage: `func` maps an item to the next stage's item, or None to drop it."""
+
+    name: str
+    func: Callable[[Any], Any]
+    workers: int
+
+
+class StagePipeline:
+    """
+    Chains stages with bounded queues, each stage running on its own worker threads.
+
+    Items flow from `submit` through every stage in order. When a stage falls
+    behind, its input queue fills up and the stage before it blocks, back to the
+    submitting thread, so at most `queue_size` items wait between any two stages.
+    A stage that raises drops the item; the stage is expected to record the
+    failure itself.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int):
+        """
+        Args:
+            stages (List[Stage]): Stages in processing order.
+            queue_size (int): Capacity of the queue in front of each stage.
+        """
+        self.stages = stages
+        self._queues: List["queue.Queue[Any]"] = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self._remaining = [stage.workers for stage in stages]
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, args=(index,), name=f"{stage.name}-{worker}", daemon=True)
+            for index, stage in enumerate(stages)
+            for worker in range(stage.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, item: Any):
+        """Queue an item for the first stage, blocking while that stage's queue is full."""
+        self._queues[0].put(item)
+
+    def depth(self, index: int) -> int:
+        """Items waiting in front of the stage at `index`."""
+        return self._queues[index].qsize()
+
+    def close(self):
+        """Let every queued item run through all stages, then stop the workers."""
+        for _ in range(self.stages[0].workers):
+            self._queues[0].put(_DONE)
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self) -> "StagePipeline":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        inbox = self._queues[index]
+        outbox: Optional["queue.Queue[Any]"] = self._queues[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            try:
+                result = stage.func(item)
+            except Exception as ex:
+                logger.error(f"❌ {stage.name} stage failed: {ex}")
+                continue
+            if result is not None and outbox is not None:
+                outbox.put(result)
+
+        # The last worker of a stage to finish passes end of input downstream
+        with self._lock:
+            self._remaining[index] -= 1
+            last = self._remaining[index] == 0
+        if last and outbox is not None:
+            for _ in range(self.stages[index + 1].workers):
+                outbox.put(_DONE)
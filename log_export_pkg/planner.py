@@ -0,0 +1,229 @@
+# export_pipeline/planner.py
+
+"""
+Module: planner
+Purpose: Plan equal-size export windows up front from a cheap per-minute histogram of each table.
+"""
+
+import json
+import math
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+from export_pipeline.config import settings
+from export_pipeline.journal import COMPLETED, WindowRecord
+from export_pipeline.kql_exporter import MAX_RESULT_BYTES, MAX_RESULT_ROWS, HistogramBin
+from export_pipeline.logger import logger
+
+Window = Tuple[datetime, datetime]
+
+
+class ExportPlanner:
+    """
+    Splits each planning period of a table into windows of roughly equal size.
+
+    One `summarize ... by bin(TimeGenerated, 1m)` query per table and period gives
+    the rows and estimated bytes per minute. Windows are then cut so each holds
+    about the same share of the period's data while staying under
+    `adaptive_target_fraction` of the row and size limits. Plans are cached on disk
+    so reruns (and other workers) execute the same windows.
+
+    Ranges that already have windows in the export journal are never planned
+    again: a newer histogram that counts a few late rows would cut different
+    windows, and as blobs are named by window start, the range would be
+    exported a second time under new names.
+    """
+
+    def __init__(
+        self,
+        run_histogram: Callable[[str, datetime, datetime, int], Sequence[HistogramBin]],
+        cache_dir: Optional[str] = None,
+        period: Optional[timedelta] = None,
+        bin_minutes: Optional[int] = None,
+        target_fraction: Optional[float] = None,
+    ):
+        """
+        Args:
+            run_histogram (Callable): Runs the histogram query for (table, start, end, bin_minutes)
+                and returns (bin start, rows, bytes) tuples.
+            cache_dir (Optional[str]): Plan cache directory. Defaults to `export_dir/plans`.
+            period (Optional[timedelta]): Planning period per histogram query. Defaults to `plan_period_days`.
+            bin_minutes (Optional[int]): Histogram bin width. Defaults to `plan_bin_minutes`.
+            target_fraction (Optional[float]): Target fraction of the service limits per window.
+        """
+        self.run_histogram = run_histogram
+        self.cache_dir = Path(cache_dir or Path(settings.export_dir) / "plans")
+        self.period = period or timedelta(days=settings.plan_period_days)
+        self.bin_minutes = bin_minutes or settings.plan_bin_minutes
+        target_fraction = target_fraction or settings.adaptive_target_fraction
+        self.target_rows = MAX_RESULT_ROWS * target_fraction
+        self.target_bytes = MAX_RESULT_BYTES * target_fraction
+
+    def plan(
+        self,
+        table: str,
+        start_time: datetime,
+        end_time: datetime,
+        journaled: Sequence[WindowRecord] = (),
+    ) -> List[Window]:
+        """
+        Plan the export windows of the range that are not exported yet.
+
+        Ranges covered by completed windows are left out. Journaled windows that
+        are not completed are planned again as they were, less any part completed
+        meanwhile, e.g. the exported half of a bisected window. Only the rest of
+        the range is planned from histograms.
+
+        Args:
+            table (str): Log Analytics table name.
+            start_time (datetime): The earliest start time.
+            end_time (datetime): The latest end time.
+            journaled (Sequence[WindowRecord]): The table's windows in the export journal.
+
+        Returns:
+            List[Window]: (start, end) windows in time order.
+        """
+        windows, gaps = _frozen(journaled, start_time, end_time)
+        for gap_start, gap_end in gaps:
+            period_start = gap_start
+            while period_start < gap_end:
+                period_end = min(period_start + self.period, gap_end)
+                windows.extend(self._plan_period(table, period_start, period_end))
+                period_start = period_end
+        windows.sort()
+        logger.info("Planned %d windows for %s from %s to %s", len(windows), table, start_time, end_time)
+        return windows
+
+    def _plan_period(self, table: str, start: datetime, end: datetime) -> List[Window]:
+        cache_path = self.cache_dir / f"{table}_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}_{self.bin_minutes}m.json"
+        if cache_path.exists():
+            cached = json.loads(cache_path.read_text())
+            return [(datetime.fromisoformat(s), datetime.fromisoformat(e)) for s, e in cached["windows"]]
+
+        try:
+            bins = self.run_histogram(table, start, end, self.bin_minutes)
+        except Exception as ex:
+            logger.warning(f"Histogram query failed for {table} {start}-{end}, using one window per hour: {ex}")
+            return _uniform(start, end, timedelta(hours=1))
+
+        windows = self.partition(bins, start, end)
+        # Only cache closed periods; recent data may still be ingesting
+        if _is_closed(end):
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_text(json.dumps({
+                "table": table,
+                "bin_minutes": self.bin_minutes,
+                "target_rows": self.target_rows,
+                "target_bytes": self.target_bytes,
+                "windows": [(s.isoformat(), e.isoformat()) for s, e in windows],
+            }))
+        return windows
+
+    def partition(self, bins: Sequence[HistogramBin], start: datetime, end: datetime) -> List[Window]:
+        """
+        Cut a period into equi-depth windows from its histogram.
+
+        Each bin is weighted by its share of the row or byte target, whichever is
+        larger. The period is split into ceil(total weight) windows of equal weight,
+        and a single bin heavier than the target is divided evenly in time.
+
+        Args:
+            bins (Sequence[HistogramBin]): (bin start, rows, bytes) in time order.
+            start (datetime): Period start.
+            end (datetime): Period end.
+
+        Returns:
+            List[Window]: Contiguous windows covering [start, end).
+        """
+        bin_width = timedelta(minutes=self.bin_minutes)
+        weighted = []
+        for bin_start, rows, bytes in bins:
+            weight = max(rows / self.target_rows, (bytes or 0) / self.target_bytes)
+            if weight > 0:
+                weighted.append((max(bin_start, start), min(bin_start + bin_width, end), weight))
+        if not weighted:
+            return [(start, end)]
+
+        total = sum(weight for _, _, weight in weighted)
+        quota = total / math.ceil(total)
+
+        windows = []
+        window_start = start
+        accumulated = 0.0
+        for bin_start, bin_end, weight in weighted:
+            if accumulated > 0 and accumulated + weight > quota:
+                windows.append((window_start, bin_start))
+                window_start, accumulated = bin_start, 0.0
+            if weight > 1:
+                # Dense bin: split evenly, assuming uniform density within the bin
+                if window_start < bin_start:
+                    windows.append((window_start, bin_start))
+                windows.extend(_uniform(bin_start, bin_end, (bin_end - bin_start) / math.ceil(weight)))
+                window_start, accumulated = bin_end, 0.0
+                continue
+            accumulated += weight
+        if window_start < end:
+            windows.append((window_start, end))
+        return windows
+
+
+def _frozen(journaled: Sequence[WindowRecord], start: datetime, end: datetime) -> Tuple[List[Window], List[Window]]:
+    """
+    Split a range by its journaled windows.
+
+    Returns:
+        Tuple[List[Window], List[Window]]: Journaled windows still to export, less
+        the ranges completed windows cover, and the gaps no journaled window covers.
+    """
+    records = [record for record in journaled if record.start < end and record.end > start]
+    taken = _merge([(record.start, record.end) for record in records if record.state == COMPLETED])
+    pending = []
+    # Smaller windows first, so the halves of a bisected window win over their parent
+    for record in sorted((r for r in records if r.state != COMPLETED), key=lambda r: (r.end - r.start, r.start)):
+        for piece in _subtract((max(record.start, start), min(record.end, end)), taken):
+            pending.append(piece)
+            taken = _merge(taken + [piece])
+    return sorted(pending), _subtract((start, end), taken)
+
+
+def _merge(intervals: List[Window]) -> List[Window]:
+    """Union of intervals, as disjoint intervals in time order."""
+    merged: List[Window] = []
+    for interval_start, interval_end in sorted(intervals):
+        if merged and interval_start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], interval_end))
+        else:
+            merged.append((interval_start, interval_end))
+    return merged
+
+
+def _subtract(window: Window, taken: List[Window]) -> List[Window]:
+    """Parts of a window outside the disjoint, ordered `taken` intervals."""
+    pieces = []
+    position, window_end = window
+    for taken_start, taken_end in taken:
+        if taken_end <= position or taken_start >= window_end:
+            continue
+        if taken_start > position:
+            pieces.append((position, taken_start))
+        position = max(position, taken_end)
+    if position < window_end:
+        pieces.append((position, window_end))
+    return pieces
+
+
+def _is_closed(end: datetime) -> bool:
+    """True if a period ended over a day ago, so late-arriving records are unlikely."""
+    now = datetime.now(timezone.utc)
+    if end.tzinfo is None:
+        now = now.replace(tzinfo=None)
+    return end <= now - timedelta(days=1)
+
+
+def _uniform(start: datetime, end: datetime, step: timedelta) -> List[Window]:
+    windows = []
+    current = start
+    while current < end:
+        windows.append((current, min(current + step, end)))
+        current = windows[-1][1]
+    return windows
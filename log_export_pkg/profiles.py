@@ -0,0 +1,200 @@
+# export_pipeline/profiles.py
+
+"""
+Module: profiles
+Purpose: Per-table export profiles that project columns and filter rows inside the KQL, validated against each table's schema.
+"""
+
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+from export_pipeline.config import settings
+from export_pipeline.logger import logger
+
+# Profile keys in the profiles file
+PROFILE_KEYS = ("project", "exclude", "where")
+
+# Columns every export keeps: windows are cut on TimeGenerated
+REQUIRED_COLUMNS = ("TimeGenerated",)
+
+
+@dataclass
+class TableProfile:
+    """
+    Columns and rows of a table to export.
+
+    Predicates run on the service right after the window's TimeGenerated filter,
+    and the projection drops unread columns (e.g. raw `dynamic` payloads) before
+    the result is returned, so they count neither against the 64 MB result limit
+    nor towards the bytes transferred and stored.
+    """
+
+    project: List[str] = field(default_factory=list)  # only these columns, plus REQUIRED_COLUMNS
+    exclude: List[str] = field(default_factory=list)  # every column but these
+    where: List[str] = field(default_factory=list)  # extra KQL predicates, all of which must hold
+
+    def __bool__(self) -> bool:
+        return bool(self.project or self.exclude or self.where)
+
+    def apply(self, kql: str) -> str:
+        """
+        Compile the profile into a query template.
+
+        Args:
+            kql (str): Query template, e.g. with `{start}` and `{end}` placeholders.
+
+        Returns:
+            str: The template with the predicates and projection appended.
+        """
+        clauses = [f"where {predicate}" for predicate in self.where]
+        if self.project:
+            columns = list(dict.fromkeys([*REQUIRED_COLUMNS, *self.project]))
+            clauses.append("project " + ", ".join(_quote(column) for column in columns))
+        elif self.exclude:
+            clauses.append("project-away " + ", ".join(_quote(column) for column in self.exclude))
+        # Braces in predicates are KQL, not template placeholders
+        return kql + "".join(" | " + clause.replace("{", "{{").replace("}", "}}") for clause in clauses)
+
+    def validate(self, table: str, schema: Dict[str, str]):
+        """
+        Check that the profile only names columns of the table.
+
+        Args:
+            table (str): Log Analytics table name.
+            schema (Dict[str, str]): Column names and types, from `getschema`.
+
+        Raises:
+            ValueError: If a projected or excluded column is not in the schema.
+        """
+        unknown = [column for column in (*self.project, *self.exclude) if column not in schema]
+        if unknown:
+            raise ValueError(f"Export profile of {table} names columns the table does not have: {', '.join(unknown)}")
+
+
+def load_profiles(path: Optional[str] = None) -> Dict[str, TableProfile]:
+    """
+    Load the export profiles, a JSON object of table name to profile, e.g.
+    `{"SecurityEvent": {"exclude": ["EventData"], "where": ["EventID != 4688"]}}`.
+
+    Args:
+        path (Optional[str]): Profiles file. Defaults to `table_profiles_path`.
+
+    Returns:
+        Dict[str, TableProfile]: Profiles by table; empty if the file does not exist.
+
+    Raises:
+        ValueError: If a profile has unknown keys, both `project` and `exclude`, or excludes a required column.
+    """
+    path = Path(path or settings.table_profiles_path)
+    if not path.exists():
+        return {}
+
+    profiles = {}
+    for table, spec in json.loads(path.read_text(encoding="utf-8")).items():
+        unknown = set(spec) - set(PROFILE_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown keys in the export profile of {table}: {', '.join(sorted(unknown))}")
+        where = spec.get("where", [])
+        profile = TableProfile(
+            project=list(spec.get("project", [])),
+            exclude=list(spec.get("exclude", [])),
+            where=[where] if isinstance(where, str) else list(where),
+        )
+        if profile.project and profile.exclude:
+            raise ValueError(f"The export profile of {table} sets both project and exclude")
+        if any(column in REQUIRED_COLUMNS for column in profile.exclude):
+            raise ValueError(f"The export profile of {table} excludes {', '.join(REQUIRED_COLUMNS)}")
+        profiles[table] = profile
+    return profiles
+
+
+def table_profile(table: str) -> TableProfile:
+    """Return the export profile of a table; an empty profile exports every row and column."""
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None:
+            _profiles = load_profiles()
+            if _profiles:
+                logger.info(f"Loaded export profiles for {', '.join(sorted(_profiles))}")
+        return _profiles.get(table, TableProfile())
+
+
+def table_schema(logs_client: Any, workspace_id: str, table: str, refresh: bool = False) -> Dict[str, str]:
+    """
+    Column names and types of a table, discovered with `getschema`.
+
+    Schemas are cached in memory and under `export_dir/schemas/<workspace_id>`
+    for `schema_cache_hours`, so a table's schema is queried about once a day
+    rather than once per window or run.
+
+    Args:
+        logs_client (Any): `azure.monitor.query.LogsQueryClient` of the workspace.
+        workspace_id (str): Log Analytics workspace ID.
+        table (str): Log Analytics table name.
+        refresh (bool): Query the schema even if it is cached.
+
+    Returns:
+        Dict[str, str]: Column type by column name.
+    """
+    key = (workspace_id, table)
+    cache_path = Path(settings.export_dir) / "schemas" / str(workspace_id) / f"{table}.json"
+    max_age = settings.schema_cache_hours * 3600
+    if not refresh:
+        with _schemas_lock:
+            if key in _schemas:
+                return _schemas[key]
+        if cache_path.exists() and time.time() - cache_path.stat().st_mtime < max_age:
+            schema = json.loads(cache_path.read_text(encoding="utf-8"))
+            with _schemas_lock:
+                _schemas[key] = schema
+            return schema
+
+    response = logs_client.query_workspace(workspace_id, f"{table} | getschema", timespan=timedelta(days=1))
+    result = response.tables[0]
+    name, column_type = result.columns.index("ColumnName"), result.columns.index("ColumnType")
+    schema = {row[name]: row[column_type] for row in result.rows}
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cache_path.write_text(json.dumps(schema), encoding="utf-8")
+    with _schemas_lock:
+        _schemas[key] = schema
+    logger.info("Discovered %d columns of %s", len(schema), table)
+    return schema
+
+
+def validated_profile(logs_client: Any, workspace_id: str, table: str) -> TableProfile:
+    """
+    Return the export profile of a table once it has been checked against the table's schema.
+
+    A profile naming a column missing from the cached schema is checked again
+    against a fresh schema, in case the column was added since. Each workspace's
+    table is checked against its own schema.
+
+    Raises:
+        ValueError: If the profile names columns the table does not have.
+    """
+    profile = table_profile(table)
+    if not profile or (workspace_id, table) in _validated:
+        return profile
+    try:
+        profile.validate(table, table_schema(logs_client, workspace_id, table))
+    except ValueError:
+        profile.validate(table, table_schema(logs_client, workspace_id, table, refresh=True))
+    _validated.add((workspace_id, table))
+    return profile
+
+
+def _quote(column: str) -> str:
+    """Column name as a KQL identifier, bracketed unless it is a plain name."""
+    return column if column.replace("_", "a").isalnum() and not column[0].isdigit() else f"['{column}']"
+
+
+_profiles: Optional[Dict[str, TableProfile]] = None
+_profiles_lock = threading.Lock()
+_schemas: Dict[Tuple[str, str], Dict[str, str]] = {}
+_schemas_lock = threading.Lock()
+_validated: Set[Tuple[str, str]] = set()
@@ -0,0 +1,370 @@
+# export_pipeline/reconcile.py
+
+"""
+Module: reconcile
+Purpose: Verify exported tables against cheap per-bin row counts of the workspace and re-export only mismatched windows.
+"""
+
+import json
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from export_pipeline.blob_uploader import delete_blob, list_blobs
+from export_pipeline.config import settings
+from export_pipeline.encoder import get_encode_pool
+from export_pipeline.journal import COMPLETED, ExportJournal, WindowRecord, get_journal
+from export_pipeline.kql_exporter import window_query
+from export_pipeline.logger import logger, window_progress
+from export_pipeline.main import export_range, export_window, get_exporter
+from export_pipeline.result_cache import get_result_cache
+from export_pipeline.scheduler import WorkScheduler
+from export_pipeline.workspaces import get_workspaces, resolve
+
+Window = Tuple[datetime, datetime]
+
+# Kinds of mismatch
+MISSING = "missing"  # the workspace holds rows, none were exported
+SHORT = "short"  # fewer rows exported than the workspace holds
+DUPLICATED = "duplicated"  # more rows exported than the workspace holds
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class Mismatch:
+    """A span of a table whose exported rows differ from the workspace's count."""
+
+    table: str  # export key
+    start: datetime
+    end: datetime
+    kind: str
+    expected: int  # rows in the workspace
+    exported: int  # rows the journal or the blobs' metadata record
+    windows: List[Window] = field(default_factory=list)  # windows to export again
+    blobs: List[str] = field(default_factory=list)  # blobs of those windows, deleted when rescheduled
+    note: str = ""  # why the span is only reported, if it is not rescheduled
+    rescheduled: bool = False
+
+    def to_dict(self) -> Dict:
+        return {
+            "table": self.table,
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "kind": self.kind,
+            "expected": self.expected,
+            "exported": self.exported,
+            "windows": [[start.isoformat(), end.isoformat()] for start, end in self.windows],
+            "blobs": self.blobs,
+            "note": self.note,
+            "rescheduled": self.rescheduled,
+        }
+
+
+class Reconciler:
+    """
+    Checks exported tables with a few aggregate queries instead of reading their rows again.
+
+    Per table, `summarize count() by bin(TimeGenerated, 1h)` runs over
+    `reconcile_period_days` at a time, and the counts are compared with the rows
+    the journal records for the completed windows. Workers of a distributed
+    export each keep their own journal, so windows exported elsewhere are read
+    from the metadata of the table's blobs (see `window_metadata`). Windows
+    rarely line up with bins, so counts are compared per span: the range is cut
+    at the bin edges no exported window straddles. Spans with windows still to
+    export are skipped, as the next export covers them anyway.
+
+    A mismatched span is rescheduled: its windows are marked failed, their cached
+    results dropped and their blobs deleted, so the next export queries them
+    again. Windows compacted into the same blobs are rescheduled with them. Two
+    kinds of span are only reported: spans whose windows overlap, where a
+    re-export would duplicate the rows again, and spans the workspace no longer
+    holds rows for, e.g. past its retention, where a re-export would empty the
+    archive.
+    """
+
+    def __init__(
+        self,
+        journal: Optional[ExportJournal] = None,
+        bin_minutes: Optional[int] = None,
+        period: Optional[timedelta] = None,
+    ):
+        """
+        Args:
+            journal (Optional[ExportJournal]): Journal recording the exported rows. Defaults to the shared journal.
+            bin_minutes (Optional[int]): Width of the counted bins. Defaults to `reconcile_bin_minutes`.
+            period (Optional[timedelta]): Time range per count query. Defaults to `reconcile_period_days`.
+        """
+        self.journal = journal or get_journal()
+        self.bin = timedelta(minutes=bin_minutes or settings.reconcile_bin_minutes)
+        self.period = period or timedelta(days=settings.reconcile_period_days)
+
+    def run(self, tables: Optional[List[str]] = None, export: bool = False) -> List[Mismatch]:
+        """
+        Reconcile tables over the export range and reschedule their mismatched windows.
+
+        Args:
+            tables (Optional[List[str]]): Export keys to check. Defaults to every table of every workspace.
+            export (bool): Export the rescheduled windows now instead of on the next run.
+
+        Returns:
+            List[Mismatch]: The mismatched spans, also written to a JSON report under `export_dir/reconcile`.
+        """
+        if tables is None:
+            tables = [workspace.key(table) for workspace in get_workspaces() for table in workspace.table_list()]
+        start_time, end_time = export_range()
+
+        mismatches = []
+        for table in tables:
+            try:
+                found = self.diff(table, start_time, end_time)
+            except Exception as ex:
+                logger.error(f"❌ Could not reconcile {table}: {ex}")
+                continue
+            for mismatch in found:
+                if not mismatch.note:
+                    self.reschedule(mismatch)
+            mismatches.extend(found)
+
+        self._log_report(tables, mismatches)
+        if export:
+            self.export([mismatch for mismatch in mismatches if mismatch.rescheduled])
+        return mismatches
+
+    def diff(self, table: str, start_time: datetime, end_time: datetime) -> List[Mismatch]:
+        """
+        Compare a table's exported rows with the workspace's counts.
+
+        Args:
+            table (str): Export key of the table.
+            start_time (datetime): Start of the range to check.
+            end_time (datetime): End of the range to check.
+
+        Returns:
+            List[Mismatch]: Mismatched spans in time order, adjacent spans of one kind merged.
+        """
+        records = [record for record in self.records(table) if record.start < end_time and record.end > start_time]
+        cuts = self._cuts(records, start_time, end_time)
+        if len(cuts) < 2:
+            return []
+
+        expected = [0] * (len(cuts) - 1)
+        for bin_start, rows in self._counts(table, cuts[0], cuts[-1]):
+            expected[bisect_right(cuts, bin_start) - 1] += rows
+        spans: List[List[WindowRecord]] = [[] for _ in expected]
+        for record in records:
+            index = bisect_right(cuts, record.start) - 1
+            if 0 <= index < len(spans) and record.end <= cuts[index + 1]:
+                spans[index].append(record)
+
+        by_blob = defaultdict(list)
+        for record in records:
+            if record.state == COMPLETED:
+                for blob in record.blobs:
+                    by_blob[blob].append(record)
+
+        mismatches: List[Mismatch] = []
+        for index, span in enumerate(spans):
+            start, end = cuts[index], cuts[index + 1]
+            completed = sorted((record for record in span if record.state == COMPLETED), key=lambda r: r.start)
+            gaps = _gaps(completed, start, end)
+            if any(record.state != COMPLETED for record in span) and not _covered(span, gaps):
+                continue
+            exported = sum(record.rows for record in completed)
+            if exported == expected[index]:
+                continue
+
+            kind = DUPLICATED if exported > expected[index] else SHORT if exported else MISSING
+            note = ""
+            if any(later.start < earlier.end for earlier, later in zip(completed, completed[1:])):
+                note = "windows overlap; delete the blobs of the superseded windows"
+            elif kind == DUPLICATED and not expected[index]:
+                note = "the workspace holds no rows, e.g. past its retention"
+            # Windows compacted into the same blobs are exported again with the span
+            windows = {(r.start, r.end) for record in completed for blob in record.blobs for r in by_blob[blob]}
+            windows.update((record.start, record.end) for record in completed)
+            windows.update(gaps)
+            blobs = {blob for record in records if (record.start, record.end) in windows for blob in record.blobs}
+
+            previous = mismatches[-1] if mismatches else None
+            if previous and previous.end == start and previous.kind == kind and previous.note == note:
+                previous.end = end
+                previous.expected += expected[index]
+                previous.exported += exported
+                previous.windows = sorted(set(previous.windows) | windows)
+                previous.blobs = sorted(set(previous.blobs) | blobs)
+            else:
+                mismatches.append(Mismatch(table, start, end, kind, expected[index], exported, sorted(windows), sorted(blobs), note))
+        return mismatches
+
+    def records(self, table: str) -> List[WindowRecord]:
+        """
+        The table's windows in the journal, and the windows other workers exported.
+
+        Blobs record their window and row count in their metadata. Blobs the
+        journal references are described by the journal; the others become
+        completed windows, one per window however many blobs it was split into.
+        Blobs without the metadata, e.g. from earlier versions, are left out.
+        """
+        records = self.journal.windows(table)
+        journaled = {blob for record in records for blob in record.blobs}
+        workspace, table_name = resolve(table)
+        exported: Dict[Window, WindowRecord] = {}
+        for blob, metadata in list_blobs(workspace.container(table_name), prefix=f"{table_name}_"):
+            if blob in journaled or not {"window_start", "window_end", "rows"} <= metadata.keys():
+                continue
+            window = (datetime.fromisoformat(metadata["window_start"]), datetime.fromisoformat(metadata["window_end"]))
+            record = exported.setdefault(window, WindowRecord(table, window[0], window[1], COMPLETED))
+            record.rows += int(metadata["rows"])
+            record.blobs.append(blob)
+        return records + list(exported.values())
+
+    def reschedule(self, mismatch: Mismatch):
+        """
+        Mark a mismatch's windows failed, drop their cached results and delete their blobs.
+
+        The journal is updated first, so readers following it never point at the
+        deleted blobs.
+        """
+        workspace, table_name = resolve(mismatch.table)
+        kql = window_query(table_name)
+        error = f"Reconciliation: {mismatch.kind}, {mismatch.exported} of {mismatch.expected} rows exported"
+        cache = get_result_cache()
+        for start, end in mismatch.windows:
+            self.journal.fail(mismatch.table, start, end, error)
+            cache.discard_rows(kql.format(start=start.isoformat(), end=end.isoformat()), start, end, workspace.workspace_id)
+        referenced = {blob for record in self.journal.windows(mismatch.table, COMPLETED) for blob in record.blobs}
+        for blob in sorted(set(mismatch.blobs) - referenced):
+            if not delete_blob(workspace.container(table_name), blob):
+                logger.warning(f"⚠️ Could not delete {blob}; it is overwritten or left over when {mismatch.table} is exported again")
+        mismatch.rescheduled = True
+
+    def export(self, mismatches: List[Mismatch]) -> Dict[str, Dict[str, int]]:
+        """
+        Export the windows of rescheduled mismatches now, bisecting truncated windows.
+
+        Returns:
+            Dict[str, Dict[str, int]]: Completed and failed windows per export key.
+        """
+        # Start the encode workers before any export threads exist
+        get_encode_pool()
+        scheduler = WorkScheduler(_export_window, workers=settings.max_workers)
+        for mismatch in mismatches:
+            scheduler.submit(mismatch.table, mismatch.windows)
+        results = scheduler.run()
+        for table, counts in sorted(results.items()):
+            logger.info("📊 Re-exported %s: %d windows, %d failed", table, counts["completed"], counts["failed"])
+        window_progress.flush()
+        return results
+
+    def _cuts(self, records: List[WindowRecord], start_time: datetime, end_time: datetime) -> List[datetime]:
+        """Bin edges of the range, and its ends, that lie inside no journaled window."""
+        intervals: List[List[datetime]] = []
+        for record in sorted(records, key=lambda r: r.start):
+            if intervals and record.start < intervals[-1][1]:
+                intervals[-1][1] = max(intervals[-1][1], record.end)
+            else:
+                intervals.append([record.start, record.end])
+        starts = [interval[0] for interval in intervals]
+
+        edges = [start_time]
+        edge = _EPOCH + (start_time - _EPOCH) // self.bin * self.bin + self.bin
+        while edge < end_time:
+            edges.append(edge)
+            edge += self.bin
+        edges.append(end_time)
+
+        cuts = []
+        for edge in edges:
+            index = bisect_left(starts, edge) - 1
+            if index < 0 or intervals[index][1] <= edge:
+                cuts.append(edge)
+        return cuts
+
+    def _counts(self, table: str, start_time: datetime, end_time: datetime) -> List[Tuple[datetime, int]]:
+        """The workspace's row counts per bin, one query per period; bins are clipped to the period start."""
+        workspace, table_name = resolve(table)
+        exporter = get_exporter(workspace)
+        bin_minutes = int(self.bin.total_seconds() // 60)
+        counts = []
+        period_start = start_time
+        while period_start < end_time:
+            period_end = min(period_start + self.period, end_time)
+            for bin_start, rows in exporter.row_counts(table_name, period_start, period_end, bin_minutes):
+                counts.append((max(bin_start, period_start), rows))
+            period_start = period_end
+        return counts
+
+    def _log_report(self, tables: List[str], mismatches: List[Mismatch]):
+        """Log the diff per table and write it as a JSON report."""
+        for mismatch in mismatches:
+            action = "rescheduled" if mismatch.rescheduled else f"not rescheduled, {mismatch.note}"
+            logger.warning(
+                f"⚠️ {mismatch.table} {mismatch.start} - {mismatch.end}: {mismatch.kind}, "
+                f"{mismatch.exported} of {mismatch.expected} rows exported ({action})"
+            )
+        for table in tables:
+            kinds = Counter(mismatch.kind for mismatch in mismatches if mismatch.table == table)
+            if kinds:
+                logger.info("📊 Reconciled %s: %s", table, ", ".join(f"{count} {kind}" for kind, count in sorted(kinds.items())))
+            else:
+                logger.info("✅ Reconciled %s: exported rows match the workspace", table)
+
+        report_dir = Path(settings.export_dir) / "reconcile"
+        report_dir.mkdir(parents=True, exist_ok=True)
+        report = report_dir / f"reconcile_{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+        report.write_text(json.dumps([mismatch.to_dict() for mismatch in mismatches], indent=2), encoding="utf-8")
+        logger.info(f"📘 Wrote reconciliation report {report}")
+
+
+def _gaps(completed: List[WindowRecord], start: datetime, end: datetime) -> List[Window]:
+    """Parts of a span no completed window covers."""
+    gaps = []
+    position = start
+    for record in completed:
+        if record.start > position:
+            gaps.append((position, record.start))
+        position = max(position, record.end)
+    if position < end:
+        gaps.append((position, end))
+    return gaps
+
+
+def _covered(span: List[WindowRecord], gaps: List[Window]) -> bool:
+    """True if the span's unfinished windows were superseded by completed ones, e.g. bisected into halves."""
+    return not any(
+        record.state != COMPLETED and gap_start < record.end and gap_end > record.start
+        for record in span for gap_start, gap_end in gaps
+    )
+
+
+def _export_window(table: str, window_start: datetime, window_end: datetime) -> Optional[List[Window]]:
+    job = export_window(table, window_start, window_end)
+    if job.failed:
+        raise RuntimeError(f"Export failed for {table} {window_start}-{window_end}")
+    if job.truncated:
+        midpoint = window_start + (window_end - window_start) / 2
+        return [(window_start, midpoint), (midpoint, window_end)]
+    return None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from export_pipeline.config import configure
+
+    parser = argparse.ArgumentParser(
+        description="Compare exported row counts with the workspace and re-export mismatched windows."
+    )
+    parser.add_argument(
+        "--table", action="append", help="Only check this export key (e.g. weu/Syslog); repeat for several"
+    )
+    parser.add_argument(
+        "--export", action="store_true", help="Export the rescheduled windows now instead of on the next run"
+    )
+    args = parser.parse_args()
+
+    configure()
+    Reconciler().run(args.table, export=args.export)
@@ -0,0 +1,100 @@
+# export_pipeline/replay.py
+
+"""
+Module: replay
+Purpose: Re-encode and re-upload export windows from the result cache without querying Log Analytics.
+"""
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+from export_pipeline.config import settings
+from export_pipeline.encoder import get_encode_pool
+from export_pipeline.journal import get_journal
+from export_pipeline.kql_exporter import window_query
+from export_pipeline.logger import logger, window_progress
+from export_pipeline.main import WindowJob, encode_window, upload_window
+from export_pipeline.metrics import get_metrics
+from export_pipeline.result_cache import ROWS, CacheEntry, get_result_cache, normalize_kql
+from export_pipeline.workspaces import workspace_by_id
+
+
+def replay(tables: Optional[List[str]] = None, include_completed: bool = False) -> Dict[str, int]:
+    """
+    Encode and upload cached export windows in the current output format.
+
+    Only windows the export queried with the current export profiles are
+    replayed, never tail deltas or ad-hoc queries. By default windows the
+    journal records as completed are skipped, so after a storage outage only
+    the failed uploads are repeated; with `include_completed`, every cached
+    window is uploaded again, e.g. after changing `OUTPUT_FORMAT`.
+
+    Args:
+        tables (Optional[List[str]]): Only replay these tables, by name or export key. Defaults to all cached tables.
+        include_completed (bool): Also replay windows already completed.
+
+    Returns:
+        Dict[str, int]: Windows uploaded per export key.
+    """
+    journal = get_journal()
+    min_window = timedelta(minutes=settings.min_window_minutes)
+    keyed = [(workspace_by_id(entry.workspace_id).key(entry.table), entry) for entry in get_result_cache().entries(ROWS)]
+    entries = [
+        (key, entry) for key, entry in keyed
+        if (not tables or entry.table in tables or key in tables)
+        and entry.kql == _window_kql(entry)
+        # A truncated result is only exported once its window cannot be split further
+        and not (entry.partial and entry.end - entry.start > min_window)
+        and (include_completed or not journal.is_completed(key, entry.start, entry.end))
+    ]
+    logger.info(f"📘 Replaying {len(entries)} cached windows")
+
+    # Start the encode workers before any upload threads exist
+    get_encode_pool()
+    with ThreadPoolExecutor(max_workers=settings.upload_workers) as executor:
+        jobs = [job for job in executor.map(_replay_window, entries) if job is not None]
+
+    uploaded = Counter(job.table for job in jobs if not job.failed)
+    failed = Counter(job.table for job in jobs if job.failed)
+    for table in sorted(set(uploaded) | set(failed)):
+        logger.info("📊 Replayed %s: %d windows uploaded, %d failed", table, uploaded[table], failed[table])
+    window_progress.flush()
+    get_metrics().log_summary()
+    return dict(uploaded)
+
+
+def _window_kql(entry: CacheEntry) -> str:
+    """The export's query of the entry's window, as stored in the cache."""
+    kql = window_query(entry.table).format(start=entry.start.isoformat(), end=entry.end.isoformat())
+    return normalize_kql(kql)
+
+
+def _replay_window(keyed: Tuple[str, CacheEntry]) -> Optional[WindowJob]:
+    """Encode and upload one cached window under its export key; None if it was evicted meanwhile."""
+    key, entry = keyed
+    result = get_result_cache().load(entry)
+    if result is None:
+        logger.warning(f"⚠️ {key} {entry.start} - {entry.end} left the cache before it was replayed")
+        return None
+    get_journal().start(key, entry.start, entry.end)
+    job = WindowJob(key, entry.start, entry.end, result=result, rows=len(result.rows), result_bytes=result.bytes)
+    return upload_window(encode_window(job))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from export_pipeline.config import configure
+
+    parser = argparse.ArgumentParser(description="Re-upload export windows from the result cache, without querying.")
+    parser.add_argument(
+        "--table", action="append", help="Only replay this table or export key (e.g. weu/Syslog); repeat for several"
+    )
+    parser.add_argument(
+        "--all", action="store_true", help="Also replay completed windows, e.g. after changing OUTPUT_FORMAT"
+    )
+    args = parser.parse_args()
+
+    configure()
+    replay(args.table, include_completed=args.all)
@@ -0,0 +1,307 @@
+# export_pipeline/result_cache.py
+
+"""
+Module: result_cache
+Purpose: Keep raw query results on disk so re-encoding or re-uploading a window never queries Log Analytics again.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
+from export_pipeline.config import settings
+from export_pipeline.kql_exporter import QueryRows, query_table
+from export_pipeline.logger import logger
+
+# pandas and pyarrow take seconds to import, so they are loaded on first use
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+# Entry kinds: raw rows from `query_rows`, DataFrames from `query`
+ROWS = "rows"
+FRAME = "frame"
+
+# Column types stored as JSON text, restored to the values the query API returned
+JSON_TYPES = ("dynamic",)
+
+
+@dataclass
+class CacheEntry:
+    """A cached query result, described by its metadata only."""
+
+    path: Path
+    kind: str
+    workspace_id: str
+    table: str
+    kql: str
+    start: datetime
+    end: datetime
+    rows: int
+    size: int
+    partial: bool = False
+
+
+class ResultCache:
+    """
+    Size-bounded on-disk cache of raw query results.
+
+    Entries are keyed by workspace, normalized KQL and window, and stored as
+    zstd-compressed Arrow IPC files under `result_cache_dir`, several times
+    smaller than the JSON the query API returns. Entries older than
+    `result_cache_ttl_hours` are not served; when the cache grows past
+    `result_cache_mb`, the least recently read entries are evicted first.
+    A result that cannot be cached is logged and skipped, so the cache never
+    fails an export.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[timedelta] = None,
+    ):
+        """
+        Args:
+            directory (Optional[str]): Cache directory. Defaults to `result_cache_dir`, or `export_dir/results`.
+            max_bytes (Optional[int]): Size bound. Defaults to `result_cache_mb`; 0 disables the cache.
+            ttl (Optional[timedelta]): Age after which entries expire. Defaults to `result_cache_ttl_hours`.
+        """
+        self.directory = Path(directory or settings.result_cache_dir or Path(settings.export_dir) / "results")
+        self.max_bytes = settings.result_cache_mb * 1024 * 1024 if max_bytes is None else max_bytes
+        self.ttl = ttl or timedelta(hours=settings.result_cache_ttl_hours)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get_rows(
+        self, kql: str, start: datetime, end: datetime, workspace_id: Optional[str] = None
+    ) -> Optional[QueryRows]:
+        """
+        Return the cached raw rows of a query, or None on a miss.
+
+        Args:
+            kql (str): Query with the window already formatted in.
+            start (datetime): Window start.
+            end (datetime): Window end.
+            workspace_id (Optional[str]): Queried workspace. Defaults to `settings.workspace_id`.
+        """
+        table = self._read(self._path(ROWS, workspace_id, kql, start, end))
+        return _query_rows(table) if table is not None else None
+
+    def put_rows(self, kql: str, start: datetime, end: datetime, result: QueryRows, workspace_id: Optional[str] = None):
+        """Cache the raw rows of a query."""
+        if self.enabled:
+            self._write(ROWS, workspace_id, kql, start, end, lambda: _rows_table(result))
+
+    def get_frame(
+        self, kql: str, start: datetime, end: datetime, workspace_id: Optional[str] = None
+    ) -> Optional["pd.DataFrame"]:
+        """Return the cached DataFrame of a query, or None on a miss."""
+        table = self._read(self._path(FRAME, workspace_id, kql, start, end))
+        return table.to_pandas() if table is not None else None
+
+    def put_frame(self, kql: str, start: datetime, end: datetime, df: "pd.DataFrame", workspace_id: Optional[str] = None):
+        """Cache the DataFrame of a query."""
+        if self.enabled:
+            import pyarrow as pa
+
+            self._write(FRAME, workspace_id, kql, start, end, lambda: pa.Table.from_pandas(df, preserve_index=False))
+
+    def discard_rows(self, kql: str, start: datetime, end: datetime, workspace_id: Optional[str] = None):
+        """Drop the cached raw rows of a query, so the window is queried again, e.g. once it was found incomplete."""
+        self._path(ROWS, workspace_id, kql, start, end).unlink(missing_ok=True)
+
+    def entries(self, kind: Optional[str] = None) -> List[CacheEntry]:
+        """
+        List the unexpired entries, reading only their metadata.
+
+        Args:
+            kind (Optional[str]): Only list `ROWS` or `FRAME` entries.
+
+        Returns:
+            List[CacheEntry]: Entries ordered by workspace, table and window start.
+        """
+        import pyarrow as pa
+
+        entries = []
+        for path in self.directory.glob("*.arrow"):
+            if self._expired(path):
+                continue
+            try:
+                with pa.memory_map(str(path)) as source:
+                    metadata = {k.decode(): v.decode() for k, v in pa.ipc.open_file(source).schema.metadata.items()}
+            except Exception:
+                continue
+            if kind is not None and metadata["kind"] != kind:
+                continue
+            entries.append(CacheEntry(
+                path=path,
+                kind=metadata["kind"],
+                workspace_id=metadata.get("workspace_id", ""),
+                table=metadata["table"],
+                kql=metadata["kql"],
+                start=datetime.fromisoformat(metadata["start"]),
+                end=datetime.fromisoformat(metadata["end"]),
+                rows=int(metadata["rows"]),
+                size=path.stat().st_size,
+                partial=metadata.get("partial") == "1",
+            ))
+        return sorted(entries, key=lambda entry: (entry.workspace_id, entry.table, entry.start))
+
+    def load(self, entry: CacheEntry) -> Optional[QueryRows]:
+        """Read the raw rows of a `ROWS` entry, or None if it was evicted meanwhile."""
+        table = self._read(entry.path)
+        return _query_rows(table) if table is not None else None
+
+    def _path(self, kind: str, workspace_id: Optional[str], kql: str, start: datetime, end: datetime) -> Path:
+        workspace_id = workspace_id or settings.workspace_id or ""
+        key = "\n".join((kind, workspace_id, normalize_kql(kql), start.isoformat(), end.isoformat()))
+        return self.directory / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.arrow"
+
+    def _expired(self, path: Path) -> bool:
+        try:
+            return time.time() - path.stat().st_mtime > self.ttl.total_seconds()
+        except FileNotFoundError:
+            return True
+
+    def _read(self, path: Path) -> Optional["pa.Table"]:
+        if not self.enabled or self._expired(path):
+            return None
+        import pyarrow as pa
+
+        try:
+            with pa.memory_map(str(path)) as source:
+                table = pa.ipc.open_file(source).read_all()
+            # The access time orders entries for eviction; the modification time stays the write time
+            os.utime(path, (time.time(), path.stat().st_mtime))
+        except Exception as ex:
+            logger.warning(f"⚠️ Unreadable result cache entry {path.name}: {ex}")
+            return None
+        return table
+
+    def _write(self, kind: str, workspace_id: Optional[str], kql: str, start: datetime, end: datetime, build):
+        import pyarrow as pa
+
+        path = self._path(kind, workspace_id, kql, start, end)
+        partial_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        try:
+            table = build()
+            table = table.replace_schema_metadata({
+                **(table.schema.metadata or {}),
+                "kind": kind,
+                "workspace_id": workspace_id or settings.workspace_id or "",
+                "table": query_table(kql),
+                "kql": normalize_kql(kql),
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "rows": str(table.num_rows),
+            })
+            self.directory.mkdir(parents=True, exist_ok=True)
+            options = pa.ipc.IpcWriteOptions(compression="zstd")
+            with pa.OSFile(str(partial_path), "wb") as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+            os.replace(partial_path, path)
+        except Exception as ex:
+            partial_path.unlink(missing_ok=True)
+            logger.warning(f"⚠️ Could not cache the result of {query_table(kql)} {start} - {end}: {ex}")
+            return
+        self._evict()
+
+    def _evict(self):
+        """Remove expired entries, then the least recently read ones until the cache fits `max_bytes`."""
+        with self._lock:
+            entries = []
+            for path in self.directory.glob("*.arrow"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if time.time() - stat.st_mtime > self.ttl.total_seconds():
+                    path.unlink(missing_ok=True)
+                else:
+                    entries.append((stat.st_atime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+
+def normalize_kql(kql: str) -> str:
+    """Collapse whitespace, so reformatted copies of a query share cache entries."""
+    return re.sub(r"\s+", " ", kql).strip()
+
+
+def _rows_table(result: QueryRows) -> "pa.Table":
+    """Arrow table of raw result rows, with the KQL column types kept in the schema."""
+    import pyarrow as pa
+    from export_pipeline.formats import kql_arrow_types
+
+    values = list(zip(*result.rows)) if result.rows else [()] * len(result.columns)
+    arrays, fields = [], []
+    for index, column in enumerate(result.columns):
+        kql_type = str(result.column_types[index]).lower()
+        arrow_type = None if kql_type in JSON_TYPES else kql_arrow_types().get(kql_type)
+        array = None
+        if arrow_type is not None:
+            try:
+                array = pa.array(values[index], type=arrow_type)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+                pass
+        # Dynamic columns and values that do not fit their declared type round-trip as JSON
+        encoding = "arrow" if array is not None else "json"
+        if array is None:
+            array = pa.array([None if v is None else json.dumps(v, default=str) for v in values[index]], type=pa.string())
+        arrays.append(array)
+        fields.append(pa.field(column, array.type, metadata={"kql_type": kql_type, "encoding": encoding}))
+
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields, metadata={
+        "partial": "1" if result.partial else "0",
+        "bytes": "" if result.bytes is None else str(result.bytes),
+    }))
+
+
+def _query_rows(table: "pa.Table") -> QueryRows:
+    """Raw result rows of a cached Arrow table."""
+    columns, column_types = [], []
+    for field, column in zip(table.schema, table.columns):
+        values = column.to_pylist()
+        if field.metadata[b"encoding"] == b"json":
+            values = [None if v is None else json.loads(v) for v in values]
+        columns.append(values)
+        column_types.append(field.metadata[b"kql_type"].decode())
+
+    metadata = table.schema.metadata
+    return QueryRows(
+        columns=table.column_names,
+        column_types=column_types,
+        rows=list(zip(*columns)),
+        partial=metadata[b"partial"] == b"1",
+        bytes=int(metadata[b"bytes"]) if metadata[b"bytes"] else None,
+    )
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Return the shared result cache, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+            if _cache.enabled:
+                logger.info(f"Caching query results in {_cache.directory} (up to {settings.result_cache_mb} MB)")
+        return _cache
@@ -0,0 +1,129 @@
+# export_pipeline/scheduler.py
+
+"""
+Module: scheduler
+Purpose: Run (table x window) export tasks from one global budget of workers with priorities and work stealing.
+"""
+
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from export_pipeline.logger import logger
+
+Window = Tuple[datetime, datetime]
+
+
+@dataclass
+class TableQueue:
+    """Pending windows of one table plus its progress counters."""
+
+    table: str
+    windows: Deque[Window] = field(default_factory=deque)
+    done: int = 0
+    failed: int = 0
+    workers: int = 0
+
+
+class WorkScheduler:
+    """
+    Executes window tasks for many tables with a single shared pool of workers.
+
+    Each table keeps its own queue. Workers are spread over the largest tables
+    first and take windows from the front of their table's queue; a worker whose
+    table runs dry steals from the back of the table with the most remaining
+    windows. Small tables therefore finish early without leaving workers idle,
+    and total run time follows total volume rather than the largest table.
+    """
+
+    def __init__(self, handler: Callable[[str, datetime, datetime], Optional[List[Window]]], workers: int):
+        """
+        Args:
+            handler (Callable): Exports one window of a table. May return sub-windows
+                (e.g. halves of a truncated window) to run next.
+            workers (int): Number of worker threads shared by all tables.
+        """
+        self.handler = handler
+        self.workers = workers
+        self._tables: Dict[str, TableQueue] = {}
+        self._cond = threading.Condition()
+
+    def submit(self, table: str, windows: Iterable[Window]):
+        """Queue the windows of a table."""
+        with self._cond:
+            queue = self._tables.setdefault(table, TableQueue(table))
+            queue.windows.extend(windows)
+
+    def run(self) -> Dict[str, Dict[str, int]]:
+        """
+        Run all queued windows to completion.
+
+        Returns:
+            Dict[str, Dict[str, int]]: Completed and failed window counts per table.
+        """
+        total = sum(len(queue.windows) for queue in self._tables.values())
+        logger.info(f"Scheduling {total} windows across {len(self._tables)} tables on {self.workers} workers")
+
+        threads = [
+            threading.Thread(target=self._work, name=f"export-worker-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return {
+            table: {"completed": queue.done, "failed": queue.failed}
+            for table, queue in self._tables.items()
+        }
+
+    def _work(self):
+        home: Optional[TableQueue] = None
+        follow_up: Optional[List[Window]] = None
+        succeeded = False
+        while True:
+            with self._cond:
+                if home is not None:
+                    home.workers -= 1
+                    if succeeded:
+                        home.done += 1
+                    else:
+                        home.failed += 1
+                    if follow_up:
+                        # Sub-windows run next, ahead of the rest of the table
+                        home.windows.extendleft(reversed(follow_up))
+                    self._cond.notify_all()
+
+                home, window = self._next(home)
+                while window is None:
+                    # Finished only when no running task can still add sub-windows
+                    if not any(queue.workers for queue in self._tables.values()):
+                        return
+                    self._cond.wait()
+                    home, window = self._next(None)
+                home.workers += 1
+
+            try:
+                follow_up = self.handler(home.table, *window)
+                succeeded = True
+            except Exception as ex:
+                logger.error(f"❌ {home.table} {window[0]}-{window[1]}: {ex}")
+                follow_up = None
+                succeeded = False
+
+    def _next(self, home: Optional[TableQueue]) -> Tuple[Optional[TableQueue], Optional[Window]]:
+        """Pick the next window: own table first, otherwise steal from the largest backlog."""
+        if home is not None and home.windows:
+            return home, home.windows.popleft()
+
+        candidates = [queue for queue in self._tables.values() if queue.windows]
+        if not candidates:
+            return None, None
+
+        # Prefer tables nobody is working on yet, then the largest backlog per worker
+        victim = max(candidates, key=lambda queue: (queue.workers == 0, len(queue.windows) / (queue.workers + 1)))
+        if victim.workers == 0:
+            return victim, victim.windows.popleft()
+        return victim, victim.windows.pop()
@@ -0,0 +1,250 @@
+# export_pipeline/tail.py
+
+"""
+Module: tail
+Purpose: Continuously export newly ingested records of each table, tracking a persisted ingestion-time watermark.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+from export_pipeline.blob_uploader import HashingWriter, upload_blob
+from export_pipeline.compression import codec_for
+from export_pipeline.config import settings
+from export_pipeline.encoder import get_encode_pool
+from export_pipeline.formats import get_output_format
+from export_pipeline.governor import get_governor
+from export_pipeline.journal import ExportJournal, get_journal
+from export_pipeline.kql_exporter import LogAnalyticsExporter, QueryRows
+from export_pipeline.logger import logger, window_progress
+from export_pipeline.metrics import get_metrics, start_metrics_exporter
+from export_pipeline.workspaces import Workspace, get_workspaces, resolve
+
+# Records ingested in (after, until], limited on TimeGenerated so only recent partitions are scanned
+TAIL_QUERY = (
+    "{table} | where TimeGenerated >= datetime({{start}}) and TimeGenerated < datetime({{end}}) "
+    "| where ingestion_time() > datetime({after}) and ingestion_time() <= datetime({until})"
+)
+
+
+class TailExporter:
+    """
+    Long-running incremental export of the records ingested since the previous cycle.
+
+    Every `tail_interval_minutes`, each table's delta is queried on
+    `ingestion_time()`, from the table's watermark in the journal up to
+    `tail_settle_seconds` before now. Late-arriving records are exported in the
+    cycle that ingests them instead of being missed by windows on
+    `TimeGenerated`. The query is also limited to `tail_lateness_hours` around the
+    delta on `TimeGenerated`, so it only scans recent data; records stamped
+    further from their ingestion time are not picked up. The watermark advances
+    only once a delta is uploaded, so an interrupted cycle is repeated rather
+    than lost.
+
+    Tables are export keys (see `Workspace.key`), so tables of several
+    workspaces are followed with one watermark each and uploaded to their
+    workspace's containers.
+    """
+
+    def __init__(
+        self,
+        tables: List[str],
+        journal: Optional[ExportJournal] = None,
+        interval: Optional[timedelta] = None,
+        lateness: Optional[timedelta] = None,
+        settle: Optional[timedelta] = None,
+    ):
+        """
+        Args:
+            tables (List[str]): Export keys of the tables to follow.
+            journal (Optional[ExportJournal]): Journal holding the watermarks. Defaults to the shared journal.
+            interval (Optional[timedelta]): Time between cycles. Defaults to `tail_interval_minutes`.
+            lateness (Optional[timedelta]): Largest gap between a record's TimeGenerated and its
+                ingestion that is still exported. Defaults to `tail_lateness_hours`.
+            settle (Optional[timedelta]): Records ingested this recently wait for the next cycle.
+                Defaults to `tail_settle_seconds`.
+        """
+        self.tables = tables
+        self.journal = journal or get_journal()
+        self.interval = interval or timedelta(minutes=settings.tail_interval_minutes)
+        self.lateness = lateness or timedelta(hours=settings.tail_lateness_hours)
+        self.settle = settle if settle is not None else timedelta(seconds=settings.tail_settle_seconds)
+        self._exporters: Dict[str, LogAnalyticsExporter] = {}
+        self._exporters_lock = threading.Lock()
+
+    def run(self, stop: Optional[threading.Event] = None, cycles: Optional[int] = None):
+        """
+        Run cycles every `interval` until `stop` is set.
+
+        Args:
+            stop (Optional[threading.Event]): Set to finish after the current cycle.
+            cycles (Optional[int]): Stop after this many cycles, e.g. 1 for scheduled runs.
+        """
+        stop = stop or threading.Event()
+        completed = 0
+        while not stop.is_set():
+            started = time.monotonic()
+            self.cycle()
+            completed += 1
+            if cycles is not None and completed >= cycles:
+                break
+            stop.wait(max(0.0, self.interval.total_seconds() - (time.monotonic() - started)))
+
+    def cycle(self) -> Dict[str, int]:
+        """
+        Export every table's delta up to the same point in ingestion time.
+
+        Returns:
+            Dict[str, int]: Rows exported per table; tables whose export failed are left out
+            and retried from their watermark in the next cycle.
+        """
+        until = datetime.now(timezone.utc) - self.settle
+        with ThreadPoolExecutor(max_workers=settings.max_parallel_tables) as executor:
+            futures = {table: executor.submit(self.export_table, table, until) for table in self.tables}
+
+        exported = {}
+        for table, future in futures.items():
+            try:
+                exported[table] = future.result()
+            except Exception as ex:
+                logger.error("❌ Tail export of %s failed: %s", table, ex)
+        return exported
+
+    def export_table(self, table: str, until: datetime) -> int:
+        """
+        Export a table's records ingested after its watermark, up to `until`.
+
+        A delta that hits the row or size limit is split in halves by ingestion
+        time down to `min_window_minutes`; the watermark advances after each
+        uploaded part.
+
+        Returns:
+            int: Rows exported.
+        """
+        after = self.journal.watermark(table)
+        not_before = None
+        if after is None:
+            # Start where the daily backfill stops (midnight UTC). The backfill exported the records
+            # stamped before midnight whenever they were ingested, so only later records are new
+            after = not_before = until.replace(hour=0, minute=0, second=0, microsecond=0)
+        if after >= until:
+            return 0
+
+        pending = [(after, until)]
+        rows = 0
+        while pending:
+            start, end = pending.pop(0)
+            with get_governor().reservation(get_governor().estimate(table, start, end)):
+                result = self.query_delta(table, start, end, not_before)
+                if result is not None and result.partial:
+                    if end - start > timedelta(minutes=settings.min_window_minutes):
+                        midpoint = start + (end - start) / 2
+                        pending[:0] = [(start, midpoint), (midpoint, end)]
+                        continue
+                    logger.warning("⚠️ %s ingested more than one query returns in %s - %s; exporting the partial result", table, start, end)
+                if result is not None:
+                    self._upload(table, start, result)
+                    rows += len(result.rows)
+            self.journal.set_watermark(table, end)
+        return rows
+
+    def query_delta(
+        self, table: str, after: datetime, until: datetime, not_before: Optional[datetime] = None
+    ) -> Optional[QueryRows]:
+        """
+        Query the records of a table ingested in (`after`, `until`], with its export profile applied.
+
+        Args:
+            table (str): Export key of the table.
+            after (datetime): Exclusive lower bound on ingestion time.
+            until (datetime): Inclusive upper bound on ingestion time.
+            not_before (Optional[datetime]): Earliest TimeGenerated to export, e.g. the end of the backfill.
+
+        Returns:
+            Optional[QueryRows]: The records, or None if there are none.
+        """
+        workspace, table_name = resolve(table)
+        exporter = self.exporter(workspace)
+        kql = exporter.profile(table_name).apply(
+            TAIL_QUERY.format(table=table_name, after=after.isoformat(), until=until.isoformat())
+        )
+        earliest = after - self.lateness if not_before is None else max(after - self.lateness, not_before)
+        return exporter.query_rows(kql, earliest, until + self.lateness, raise_errors=True)
+
+    def exporter(self, workspace: Workspace) -> LogAnalyticsExporter:
+        """Return the query client of a workspace, shared by the cycles' threads and created on first use."""
+        with self._exporters_lock:
+            if workspace.name not in self._exporters:
+                self._exporters[workspace.name] = LogAnalyticsExporter(workspace)
+            return self._exporters[workspace.name]
+
+    def _upload(self, table: str, start: datetime, result: QueryRows):
+        """Encode a delta to `export_dir` and upload it, raising if the upload fails."""
+        output_format = get_output_format()
+        workspace, table_name = resolve(table)
+        codec = codec_for(table_name, output_format.name)
+        container_name = workspace.container(table_name)
+        output_dir = Path(settings.export_dir) / container_name
+        output_dir.mkdir(parents=True, exist_ok=True)
+        file_path = output_dir / codec.blob_name(output_format.blob_name(f"{table_name}_ingested_{start:%Y-%m-%dT%H%M%S}"))
+
+        try:
+            with open(file_path, "wb") as raw:
+                hashed = HashingWriter(raw)
+                with codec.open(hashed) as sink:
+                    get_encode_pool().write_rows(output_format, table, result.columns, result.rows, sink, result.column_types)
+            size = file_path.stat().st_size
+            uploaded = upload_blob(
+                file_path, container_name,
+                content_type=output_format.content_type, content_encoding=codec.content_encoding, table=table,
+                content_md5=hashed.content_md5,
+            )
+        finally:
+            # The next cycle queries the delta again from the unchanged watermark
+            file_path.unlink(missing_ok=True)
+        if not uploaded:
+            raise RuntimeError(f"Upload failed for {file_path.name}")
+        window_progress.record(table, rows=len(result.rows), bytes=size)
+
+
+def run_tail(stop: Optional[threading.Event] = None, cycles: Optional[int] = None):
+    """
+    Follow every configured table of every workspace until `stop` is set.
+
+    Args:
+        stop (Optional[threading.Event]): Set to finish after the current cycle.
+        cycles (Optional[int]): Stop after this many cycles.
+    """
+    tables = [workspace.key(table) for workspace in get_workspaces() for table in workspace.table_list()]
+    logger.info("📘 Tailing %d tables every %d minutes", len(tables), settings.tail_interval_minutes)
+
+    # Start the encode workers before any export threads exist
+    get_encode_pool()
+    stop_metrics = start_metrics_exporter()
+    try:
+        TailExporter(tables).run(stop, cycles)
+    finally:
+        window_progress.flush()
+        get_metrics().log_summary()
+        if stop_metrics is not None:
+            stop_metrics()
+
+
+if __name__ == "__main__":
+    import argparse
+    import signal
+
+    from export_pipeline.config import configure
+
+    parser = argparse.ArgumentParser(description="Continuously export newly ingested records.")
+    parser.add_argument("--once", action="store_true", help="Run one cycle and exit, e.g. from a scheduler")
+    args = parser.parse_args()
+
+    configure()
+    stop_event = threading.Event()
+    # Finish the current cycle on SIGTERM, so no delta is left half uploaded
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    run_tail(stop_event, cycles=1 if args.once else None)
@@ -0,0 +1,28 @@
+# export_pipeline/tests/conftest.py
+
+"""
+Module: conftest
+Purpose: Make the package importable as `export_pipeline` when the tests run from a checkout.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+
+
+def _import_root() -> str:
+    """Directory holding the package under its import name, linked into a temporary directory if needed."""
+    if PACKAGE_DIR.name == "export_pipeline":
+        return str(PACKAGE_DIR.parent)
+    root = Path(tempfile.mkdtemp(prefix="export_pipeline_tests_"))
+    (root / "export_pipeline").symlink_to(PACKAGE_DIR, target_is_directory=True)
+    return str(root)
+
+
+IMPORT_ROOT = _import_root()
+sys.path.insert(0, IMPORT_ROOT)
+# Subprocesses started by the tests import the same package
+os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [IMPORT_ROOT, os.environ.get("PYTHONPATH")]))
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from export_pipeline.journal import COMPLETED, ExportJournal
+from export_pipeline.kql_exporter import AdaptiveWindowController
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+ROWS_PER_HOUR = 1000  # sparse: each window doubles the next one
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return ExportJournal(tmp_path / "journal.db")
+
+
+def _at(hours):
+    return START + hours * HOUR
+
+
+def _export(journal, start, end, fail=()):
+    """Export [start, end) in adaptive windows like `main.process_table`, failing the windows in `fail`."""
+    controller = AdaptiveWindowController(initial_window=HOUR, max_window=timedelta(days=1))
+    completed = [(record.start, record.end) for record in journal.windows("Syslog", COMPLETED)]
+    exported = []
+    for window_start, window_end in controller.windows(start, end, completed):
+        exported.append((window_start, window_end))
+        if (window_start, window_end) in fail:
+            journal.fail("Syslog", window_start, window_end, "Query failed")
+            continue
+        rows = int(ROWS_PER_HOUR * (window_end - window_start) / HOUR)
+        journal.complete("Syslog", window_start, window_end, rows=rows, bytes=rows, blobs=[])
+        controller.observe(window_start, window_end, rows=rows)
+    return exported
+
+
+def _overlapping(windows, others):
+    return [(w, o) for w in windows for o in others if w[0] < o[1] and o[0] < w[1]]
+
+
+def test_resume_after_failed_window_exports_only_the_gap(journal):
+    first = _export(journal, _at(0), _at(24), fail=[(_at(1), _at(3))])
+    assert first == [(_at(0), _at(1)), (_at(1), _at(3)), (_at(3), _at(5)), (_at(5), _at(9)), (_at(9), _at(17)), (_at(17), _at(24))]
+
+    # The rerun starts over at the initial window size, out of step with the completed windows
+    rerun = _export(journal, _at(0), _at(24))
+
+    assert rerun == [(_at(1), _at(2)), (_at(2), _at(3))]
+
+
+def test_resume_from_moved_start_skips_completed_ranges(journal):
+    completed = _export(journal, _at(0), _at(24))
+
+    # A later run's lookback starts inside the first window and reaches a day further
+    rerun = _export(journal, _at(0.5), _at(48))
+
+    assert _overlapping(rerun, completed) == []
+    assert rerun[0][0] == _at(24) and rerun[-1][1] == _at(48)
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta, timezone
+
+from export_pipeline.journal import ExportJournal
+from export_pipeline.planner import ExportPlanner
+
+# 0.001 of the 500,000 row limit: windows of about 500 rows
+TARGET_FRACTION = 0.001
+MIDNIGHT = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+DAY = timedelta(days=1)
+
+
+class Histogram:
+    """Per-minute histogram of a table with `rows` rows a minute, counting its calls."""
+
+    def __init__(self, rows=10, extra=None):
+        self.rows = rows
+        self.extra = extra or {}  # additional rows by minute offset, e.g. late arrivals
+        self.calls = []
+
+    def __call__(self, table, start, end, bin_minutes):
+        self.calls.append((start, end))
+        bins = []
+        minute = start
+        while minute < end:
+            offset = int((minute - start).total_seconds() // 60)
+            bins.append((minute, self.rows + self.extra.get(offset, 0), 0))
+            minute += timedelta(minutes=bin_minutes)
+        return bins
+
+
+def _planner(histogram, tmp_path):
+    return ExportPlanner(histogram, cache_dir=tmp_path / "plans", period=DAY, bin_minutes=1, target_fraction=TARGET_FRACTION)
+
+
+def _assert_contiguous(windows, start, end):
+    assert windows[0][0] == start
+    assert windows[-1][1] == end
+    for (_, previous_end), (next_start, _) in zip(windows, windows[1:]):
+        assert previous_end == next_start
+
+
+def test_partition_cuts_equal_windows(tmp_path):
+    planner = _planner(Histogram(), tmp_path)
+    start = MIDNIGHT - DAY
+    bins = Histogram()(None, start, MIDNIGHT, 1)
+
+    windows = planner.partition(bins, start, MIDNIGHT)
+
+    # 14,400 rows at most 500 per window, all but the last of equal size
+    _assert_contiguous(windows, start, MIDNIGHT)
+    assert 29 <= len(windows) <= 30
+    assert all((end - start) <= timedelta(minutes=50) for start, end in windows)
+    assert len({end - start for start, end in windows[:-1]}) == 1
+
+
+def test_partition_of_empty_period_is_one_window(tmp_path):
+    planner = _planner(Histogram(), tmp_path)
+    start = MIDNIGHT - DAY
+
+    assert planner.partition([], start, MIDNIGHT) == [(start, MIDNIGHT)]
+    assert planner.partition([(start, 0, 0)], start, MIDNIGHT) == [(start, MIDNIGHT)]
+
+
+def test_partition_splits_dense_minute(tmp_path):
+    planner = _planner(Histogram(), tmp_path)
+    start = MIDNIGHT - timedelta(hours=1)
+    burst = start + timedelta(minutes=30)
+
+    windows = planner.partition([(burst, 1500, 0)], start, MIDNIGHT)
+
+    _assert_contiguous(windows, start, MIDNIGHT)
+    assert windows == [
+        (start, burst),
+        (burst, burst + timedelta(seconds=20)),
+        (burst + timedelta(seconds=20), burst + timedelta(seconds=40)),
+        (burst + timedelta(seconds=40), burst + timedelta(minutes=1)),
+        (burst + timedelta(minutes=1), MIDNIGHT),
+    ]
+
+
+def test_rerun_does_not_replan_exported_period(tmp_path):
+    # The newest period ends at today's midnight and is never cached as closed
+    journal = ExportJournal(tmp_path / "journal.db")
+    start = MIDNIGHT - DAY
+    first = _planner(Histogram(), tmp_path).plan("Syslog", start, MIDNIGHT, journal.windows("Syslog"))
+    journal.plan("Syslog", first)
+    for window_start, window_end in first:
+        journal.complete("Syslog", window_start, window_end, rows=500, bytes=1, blobs=[])
+
+    # Late rows would cut different windows from a new histogram
+    late = Histogram(extra={minute: 7 for minute in range(0, 1440, 3)})
+    assert _planner(late, tmp_path).partition(late(None, start, MIDNIGHT, 1), start, MIDNIGHT) != first
+    late.calls.clear()
+
+    assert _planner(late, tmp_path).plan("Syslog", start, MIDNIGHT, journal.windows("Syslog")) == []
+    assert late.calls == []
+
+
+def test_rerun_keeps_unfinished_windows(tmp_path):
+    journal = ExportJournal(tmp_path / "journal.db")
+    start = MIDNIGHT - DAY
+    first = _planner(Histogram(), tmp_path).plan("Syslog", start, MIDNIGHT)
+    journal.plan("Syslog", first)
+    for window_start, window_end in first[:10]:
+        journal.complete("Syslog", window_start, window_end, rows=500, bytes=1, blobs=[])
+    journal.fail("Syslog", *first[10], "Query failed")
+
+    late = Histogram(extra={0: 400, 700: 900})
+    rerun = _planner(late, tmp_path).plan("Syslog", start, MIDNIGHT, journal.windows("Syslog"))
+
+    assert rerun == first[10:]
+    assert late.calls == []
+
+
+def test_rerun_exports_remaining_half_of_bisected_window(tmp_path):
+    journal = ExportJournal(tmp_path / "journal.db")
+    start = MIDNIGHT - timedelta(hours=2)
+    middle = start + timedelta(hours=1)
+    journal.plan("Syslog", [(start, MIDNIGHT)])
+    journal.fail("Syslog", start, MIDNIGHT, "Row or size limit reached; window bisected")
+    journal.complete("Syslog", start, middle, rows=500, bytes=1, blobs=[])
+
+    histogram = Histogram()
+    windows = _planner(histogram, tmp_path).plan("Syslog", start, MIDNIGHT, journal.windows("Syslog"))
+
+    assert windows == [(middle, MIDNIGHT)]
+    assert histogram.calls == []
+
+
+def test_new_period_is_planned_from_histogram(tmp_path):
+    journal = ExportJournal(tmp_path / "journal.db")
+    first_day = MIDNIGHT - 2 * DAY
+    journal.complete("Syslog", first_day, MIDNIGHT - DAY, rows=14400, bytes=1, blobs=[])
+
+    histogram = Histogram()
+    windows = _planner(histogram, tmp_path).plan("Syslog", first_day, MIDNIGHT, journal.windows("Syslog"))
+
+    assert histogram.calls == [(MIDNIGHT - DAY, MIDNIGHT)]
+    _assert_contiguous(windows, MIDNIGHT - DAY, MIDNIGHT)
@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from export_pipeline import reconcile
+from export_pipeline.blob_uploader import window_metadata
+from export_pipeline.journal import COMPLETED, ExportJournal, WindowRecord
+from export_pipeline.reconcile import DUPLICATED, MISSING, SHORT, Reconciler
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+
+
+def _at(hours):
+    return START + hours * HOUR
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return ExportJournal(tmp_path / "journal.db")
+
+
+@pytest.fixture
+def blobs(monkeypatch):
+    """Blobs of the table's container by name, with their metadata."""
+    listed = {}
+    monkeypatch.setattr(
+        reconcile, "list_blobs",
+        lambda container, prefix="": sorted((name, metadata) for name, metadata in listed.items() if name.startswith(prefix)),
+    )
+    return listed
+
+
+def _reconciler(journal, counts):
+    """Reconciler with hourly bins whose workspace holds `counts[i]` rows in hour i."""
+    reconciler = Reconciler(journal, bin_minutes=60, period=timedelta(days=1))
+    reconciler._counts = lambda table, start, end: [
+        (_at(hour), rows) for hour, rows in enumerate(counts) if start <= _at(hour) < end and rows
+    ]
+    return reconciler
+
+
+def _export(journal, hours, rows):
+    start, end = _at(hours[0]), _at(hours[1])
+    journal.complete("Syslog", start, end, rows=rows, bytes=1, blobs=[f"Syslog_{start:%Y-%m-%dT%H%M%S}.json"])
+
+
+def _record(start_hours, end_hours):
+    return WindowRecord("Syslog", _at(start_hours), _at(end_hours), COMPLETED)
+
+
+def test_cuts_skip_bin_edges_inside_windows(journal):
+    reconciler = _reconciler(journal, [])
+    records = [_record(0, 1.5), _record(1.5, 2)]
+
+    assert reconciler._cuts(records, _at(0), _at(4)) == [_at(0), _at(2), _at(3), _at(4)]
+
+
+def test_cuts_of_unaligned_range(journal):
+    reconciler = _reconciler(journal, [])
+
+    assert reconciler._cuts([], _at(0.5), _at(2.25)) == [_at(0.5), _at(1), _at(2), _at(2.25)]
+    # A window over the whole range leaves only its ends
+    assert reconciler._cuts([_record(0, 3)], _at(0), _at(3)) == [_at(0), _at(3)]
+
+
+def test_diff_matches_exported_rows(journal, blobs):
+    _export(journal, (0, 1), 10)
+    _export(journal, (1, 2.5), 25)
+    _export(journal, (2.5, 3), 5)
+
+    assert _reconciler(journal, [10, 15, 15]).diff("Syslog", _at(0), _at(3)) == []
+
+
+def test_diff_finds_short_missing_and_duplicated_spans(journal, blobs):
+    _export(journal, (0, 1), 8)
+    _export(journal, (2, 3), 12)
+
+    mismatches = _reconciler(journal, [10, 10, 10]).diff("Syslog", _at(0), _at(3))
+
+    assert [(m.start, m.end, m.kind, m.expected, m.exported) for m in mismatches] == [
+        (_at(0), _at(1), SHORT, 10, 8),
+        (_at(1), _at(2), MISSING, 10, 0),
+        (_at(2), _at(3), DUPLICATED, 10, 12),
+    ]
+    # The missing hour is exported again as the gap between the windows
+    assert mismatches[1].windows == [(_at(1), _at(2))]
+    assert mismatches[0].blobs == ["Syslog_2025-01-01T000000.json"]
+
+
+def test_diff_skips_spans_still_to_export(journal, blobs):
+    journal.plan("Syslog", [(_at(0), _at(1))])
+
+    assert _reconciler(journal, [10]).diff("Syslog", _at(0), _at(1)) == []
+
+
+def test_diff_counts_windows_other_workers_exported(journal, blobs):
+    # This worker exported the first hour; another exported the second, in two blobs
+    _export(journal, (0, 1), 10)
+    blobs["Syslog_2025-01-01T010000.json"] = window_metadata(_at(1), _at(2), 6)
+    blobs["Syslog_2025-01-01T010000_1.json"] = window_metadata(_at(1), _at(2), 4)
+    # Tail blobs and blobs of earlier versions carry no window metadata
+    blobs["Syslog_ingested_2025-01-01T000000.json"] = {}
+
+    assert _reconciler(journal, [10, 10]).diff("Syslog", _at(0), _at(2)) == []
+
+    mismatches = _reconciler(journal, [10, 12]).diff("Syslog", _at(0), _at(2))
+    assert [(m.start, m.kind, m.exported) for m in mismatches] == [(_at(1), SHORT, 10)]
+    assert mismatches[0].blobs == ["Syslog_2025-01-01T010000.json", "Syslog_2025-01-01T010000_1.json"]
+
+
+def test_diff_prefers_journal_over_blob_metadata(journal, blobs):
+    _export(journal, (0, 1), 10)
+    # The journal's blob, e.g. compacted since, is counted once
+    blobs["Syslog_2025-01-01T000000.json"] = window_metadata(_at(0), _at(1), 10)
+
+    assert _reconciler(journal, [10]).diff("Syslog", _at(0), _at(1)) == []
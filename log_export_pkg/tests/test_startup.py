@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+
+from export_pipeline.benchmarks.startup import LAZY_MODULES
+
+
+def _run(code, cwd=None, **environ):
+    """Run `code` in a fresh interpreter and return the JSON it prints last."""
+    child = subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True,
+        cwd=cwd, env={**os.environ, **environ},
+    )
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def test_importing_main_leaves_heavy_dependencies_unloaded():
+    eager = _run(
+        "import json, sys\n"
+        "import export_pipeline.main\n"
+        f"print(json.dumps([name for name in {LAZY_MODULES!r} if name in sys.modules]))\n"
+    )
+
+    assert eager == []
+
+
+def test_settings_read_the_environment_only_when_configured(tmp_path):
+    workers = _run(
+        "import json\n"
+        "from export_pipeline.config import configure, settings\n"
+        "before = settings.max_workers\n"
+        "configure()\n"
+        "print(json.dumps([before, settings.max_workers]))\n",
+        cwd=tmp_path,  # logging writes to ./logs
+        MAX_WORKERS="3",
+    )
+
+    assert workers == [8, 3]
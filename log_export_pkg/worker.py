@@ -0,0 +1,239 @@
+# export_pipeline/worker.py
+
+"""
+Module: worker
+Purpose: Distributed export worker that claims windows from the shared work catalog, so a backfill scales out over several machines.
+"""
+
+import os
+import socket
+import threading
+from collections import Counter
+from typing import Dict, Optional
+from export_pipeline.catalog import Lease, WorkCatalog, get_work_catalog
+from export_pipeline.config import settings
+from export_pipeline.encoder import get_encode_pool
+from export_pipeline.logger import logger, window_progress
+from export_pipeline.main import export_window, plan_table
+from export_pipeline.metrics import get_metrics, start_metrics_exporter
+from export_pipeline.workspaces import get_workspaces
+
+
+class LeaseKeeper:
+    """Renews the leases a worker holds every third of `lease_seconds`, on one background thread."""
+
+    def __init__(self, catalog: WorkCatalog):
+        self.catalog = catalog
+        self._leases: Dict[str, Lease] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def hold(self, lease: Lease):
+        """Keep renewing a lease until it is dropped."""
+        with self._lock:
+            self._leases[lease.lease_id] = lease
+
+    def drop(self, lease: Lease):
+        with self._lock:
+            self._leases.pop(lease.lease_id, None)
+
+    def _run(self):
+        while not self._stop.wait(self.catalog.lease_seconds / 3):
+            with self._lock:
+                leases = list(self._leases.values())
+            for lease in leases:
+                try:
+                    renewed = self.catalog.renew(lease)
+                except Exception as ex:
+                    # Retried at the next interval, well before the lease expires
+                    logger.warning("⚠️ Could not renew the lease on %s %s - %s: %s", lease.table, lease.start, lease.end, ex)
+                    continue
+                if not renewed:
+                    lease.lost = True
+                    self.drop(lease)
+                    logger.warning("⚠️ Lost the lease on %s %s - %s", lease.table, lease.start, lease.end)
+
+
+class DistributedWorker:
+    """
+    Exports windows claimed from the work catalog until no pending window is left.
+
+    `threads` claim loops run side by side, each exporting one window at a time
+    through the same query, encode and upload path as `main.export_window`,
+    while the `LeaseKeeper` renews their leases. A window truncated at the row
+    or size limit is published again as two halves. Blob names depend only on
+    the window and unchanged blobs are not uploaded again, so a window exported
+    twice, by a worker that lost its lease, still leaves a single blob.
+    """
+
+    def __init__(self, catalog: Optional[WorkCatalog] = None, worker_id: Optional[str] = None, threads: Optional[int] = None):
+        """
+        Args:
+            catalog (Optional[WorkCatalog]): Work catalog. Defaults to the shared catalog of `catalog_store`.
+            worker_id (Optional[str]): Name recorded with claims. Defaults to `worker_id`, or `<hostname>-<pid>`.
+            threads (Optional[int]): Windows exported at once. Defaults to `max_workers`.
+        """
+        self.catalog = catalog or get_work_catalog()
+        self.worker_id = worker_id or settings.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.threads = threads or settings.max_workers
+        self.keeper = LeaseKeeper(self.catalog)
+        self.exported = Counter()
+        self.failed = Counter()
+        self._lock = threading.Lock()
+
+    def run(self, stop: Optional[threading.Event] = None) -> Dict[str, int]:
+        """
+        Claim and export windows until none are pending or `stop` is set.
+
+        While other workers hold the last pending windows, the worker waits in
+        case their leases expire, so a crashed worker's windows are still exported.
+
+        Args:
+            stop (Optional[threading.Event]): Set to finish the windows in progress and stop claiming.
+
+        Returns:
+            Dict[str, int]: Windows exported per table.
+        """
+        stop = stop or threading.Event()
+        logger.info("📘 Worker %s exporting with %d threads", self.worker_id, self.threads)
+        self.keeper.start()
+        try:
+            threads = [threading.Thread(target=self._work, args=(stop,), name=f"claim-{index}") for index in range(self.threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self.keeper.stop()
+        return dict(self.exported)
+
+    def _work(self, stop: threading.Event):
+        while not stop.is_set():
+            lease = self.catalog.claim(self.worker_id)
+            if lease is None:
+                if not self.catalog.pending():
+                    return
+                # Other workers hold the rest; their leases expire if they crash
+                stop.wait(self.catalog.lease_seconds / 2)
+                continue
+            self.export(lease)
+
+    def export(self, lease: Lease):
+        """Export a claimed window and complete, split or release its task."""
+        self.keeper.hold(lease)
+        error = None
+        try:
+            job = export_window(lease.table, lease.start, lease.end)
+            if job.failed:
+                error = f"Export failed on {self.worker_id}; see its journal"
+        except Exception as ex:
+            job, error = None, str(ex)
+        finally:
+            self.keeper.drop(lease)
+
+        if lease.lost:
+            logger.warning("⚠️ %s %s - %s now belongs to another worker", lease.table, lease.start, lease.end)
+            return
+        try:
+            if error is not None:
+                self.catalog.release(lease, error)
+            elif job.truncated:
+                midpoint = lease.start + (lease.end - lease.start) / 2
+                self.catalog.publish(lease.table, [(lease.start, midpoint), (midpoint, lease.end)])
+                self.catalog.complete(lease)
+            else:
+                self.catalog.complete(lease)
+        except Exception as ex:
+            # The lease expires and another worker exports the window again
+            logger.error("❌ Could not record %s %s - %s in the work catalog: %s", lease.table, lease.start, lease.end, ex)
+            return
+        with self._lock:
+            if error is not None:
+                self.failed[lease.table] += 1
+            elif not job.truncated:
+                self.exported[lease.table] += 1
+
+
+def plan_catalog(catalog: Optional[WorkCatalog] = None) -> int:
+    """
+    Plan the windows of every table of every workspace and publish them to the work catalog.
+
+    Publishing is idempotent, so a rerun only adds windows the catalog does not
+    hold yet, e.g. after the lookback period moved on.
+
+    Returns:
+        int: Tasks added.
+    """
+    catalog = catalog or get_work_catalog()
+    added = 0
+    for workspace in get_workspaces():
+        for table in workspace.table_list():
+            key = workspace.key(table)
+            try:
+                published = catalog.publish(key, plan_table(key))
+            except Exception as e:
+                logger.error("❌ Error planning %s: %s", key, e)
+                continue
+            logger.info("📘 Published %d new windows of %s", published, key)
+            added += published
+    return added
+
+
+def run_worker(stop: Optional[threading.Event] = None) -> Dict[str, int]:
+    """
+    Export claimed windows until the work catalog has no pending window left.
+
+    Args:
+        stop (Optional[threading.Event]): Set to finish the windows in progress and stop.
+
+    Returns:
+        Dict[str, int]: Windows exported per table.
+    """
+    # Start the encode workers before any export threads exist
+    get_encode_pool()
+    stop_metrics = start_metrics_exporter()
+    worker = DistributedWorker()
+    try:
+        exported = worker.run(stop)
+    finally:
+        window_progress.flush()
+        get_metrics().log_summary()
+        if stop_metrics is not None:
+            stop_metrics()
+    logger.info(
+        "✅ Worker %s exported %d windows (%d failed attempts); catalog: %s",
+        worker.worker_id, sum(worker.exported.values()), sum(worker.failed.values()), worker.catalog.progress(),
+    )
+    return exported
+
+
+if __name__ == "__main__":
+    import argparse
+    import signal
+
+    from export_pipeline.config import configure
+
+    parser = argparse.ArgumentParser(description="Export windows claimed from a work catalog shared by several workers.")
+    parser.add_argument("command", choices=["plan", "work", "status"], help="Publish the windows, export them, or show progress")
+    parser.add_argument("--plan", action="store_true", help="With work: publish the windows first")
+    args = parser.parse_args()
+
+    configure()
+    if args.command == "status":
+        logger.info("📊 Work catalog: %s", get_work_catalog().progress())
+    else:
+        if args.command == "plan" or args.plan:
+            logger.info("📘 Published %d new windows", plan_catalog())
+        if args.command == "work":
+            stop_event = threading.Event()
+            # Finish the windows in progress on SIGTERM, e.g. when a node is deallocated
+            signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+            run_worker(stop_event)
@@ -0,0 +1,201 @@
+# export_pipeline/workspaces.py
+
+"""
+Module: workspaces
+Purpose: Export several Log Analytics workspaces in one run, each with its own tables, containers and query budget.
+"""
+
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from export_pipeline.config import settings
+from export_pipeline.logger import logger
+from export_pipeline.utils import load_table_list
+
+# Separates the workspace name from the table name in export keys, e.g. "weu/Syslog"
+KEY_SEPARATOR = "/"
+
+
+class QueryBudget:
+    """
+    Concurrency and rate limit of the queries sent to one workspace, shared by all export threads.
+
+    A query waits for one of `max_concurrent` slots and for its turn under
+    `per_minute`. When the service answers 429, every new query of the
+    workspace waits out the Retry-After, so the threads back off together
+    instead of each tripping the limit again.
+    """
+
+    def __init__(self, max_concurrent: int, per_minute: int = 0):
+        """
+        Args:
+            max_concurrent (int): Queries running at once.
+            per_minute (int): Queries started per minute; 0 for no limit.
+        """
+        self.max_concurrent = max_concurrent
+        self.per_minute = per_minute
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_start = 0.0
+        self._paused_until = 0.0
+        self.waited = 0.0  # seconds queries spent waiting for the budget
+
+    @contextmanager
+    def acquire(self) -> Iterator[None]:
+        """Hold a query slot for the duration of a block, starting it no earlier than the rate allows."""
+        started = time.monotonic()
+        self._slots.acquire()
+        try:
+            with self._lock:
+                start = max(time.monotonic(), self._next_start, self._paused_until)
+                self._next_start = start + self._interval
+            delay = start - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self._lock:
+                self.waited += time.monotonic() - started
+            yield
+        finally:
+            self._slots.release()
+
+    def throttled(self, retry_after: float):
+        """Hold back the workspace's new queries for `retry_after` seconds after a 429."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+
+@dataclass
+class Workspace:
+    """A Log Analytics workspace to export, with the tables and containers of its data."""
+
+    name: str  # "" for the single workspace of `settings.workspace_id`
+    workspace_id: str
+    tables: Optional[List[str]] = None  # defaults to the table list file
+    container_prefix: str = ""
+    budget: QueryBudget = field(default_factory=lambda: QueryBudget(_default_max_queries(), settings.workspace_queries_per_minute))
+
+    def table_list(self) -> List[str]:
+        """Tables to export from this workspace."""
+        return self.tables if self.tables is not None else load_table_list()
+
+    def key(self, table: str) -> str:
+        """
+        Export key of a table of this workspace.
+
+        Keys label the journal, the scheduler queues and the metrics, so equally
+        named tables of different workspaces are tracked apart. In single
+        workspace runs the key is the table name.
+        """
+        return f"{self.name}{KEY_SEPARATOR}{table}" if self.name else table
+
+    def container(self, table: str) -> str:
+        """Blob container of a table of this workspace, e.g. "weu-syslog" with prefix "weu"."""
+        name = re.sub(r"[^a-zA-Z0-9]", "", table.lower())
+        prefix = re.sub(r"[^a-zA-Z0-9]", "", self.container_prefix.lower())
+        return f"{prefix}-{name}" if prefix else name
+
+
+def load_workspaces(path: Optional[str] = None) -> List[Workspace]:
+    """
+    Load the workspaces to export, a JSON list such as
+    `[{"name": "weu", "workspace_id": "...", "tables": ["Syslog"], "max_queries": 5, "queries_per_minute": 300}]`.
+
+    Each workspace may set `tables` or a `tables_file`, a `container_prefix`
+    (default: its name), and `max_queries` and `queries_per_minute` budgets
+    (defaults: `workspace_max_queries` and `workspace_queries_per_minute`).
+
+    Args:
+        path (Optional[str]): Workspaces file. Defaults to `workspaces_path`.
+
+    Returns:
+        List[Workspace]: The configured workspaces, or the single workspace of
+        `settings.workspace_id` if the file does not exist.
+
+    Raises:
+        ValueError: If a workspace has no name or ID, or a name is used twice.
+    """
+    path = Path(path or settings.workspaces_path)
+    if not path.exists():
+        return [Workspace(name="", workspace_id=settings.workspace_id)]
+
+    workspaces = []
+    for spec in json.loads(path.read_text(encoding="utf-8")):
+        name, workspace_id = spec.get("name"), spec.get("workspace_id")
+        if not name or not workspace_id or KEY_SEPARATOR in name:
+            raise ValueError(f"Workspaces need a name (without '{KEY_SEPARATOR}') and a workspace_id: {spec}")
+        if any(workspace.name == name for workspace in workspaces):
+            raise ValueError(f"Workspace {name} is configured twice")
+        tables = spec.get("tables")
+        if tables is None and spec.get("tables_file"):
+            tables = [line.strip() for line in Path(spec["tables_file"]).read_text().splitlines() if line.strip()]
+        workspaces.append(Workspace(
+            name=name,
+            workspace_id=workspace_id,
+            tables=tables,
+            container_prefix=spec.get("container_prefix", name),
+            budget=QueryBudget(
+                int(spec.get("max_queries", _default_max_queries())),
+                int(spec.get("queries_per_minute", settings.workspace_queries_per_minute)),
+            ),
+        ))
+    return workspaces
+
+
+def get_workspaces() -> List[Workspace]:
+    """Return the workspaces of this run, loading them on first use."""
+    global _workspaces
+    with _workspaces_lock:
+        if _workspaces is None:
+            _workspaces = load_workspaces()
+            if _workspaces[0].name:
+                logger.info(f"Exporting {len(_workspaces)} workspaces: {', '.join(w.name for w in _workspaces)}")
+        return _workspaces
+
+
+def resolve(key: str) -> Tuple[Workspace, str]:
+    """
+    Split an export key into its workspace and table.
+
+    Raises:
+        KeyError: If the key names a workspace that is not configured.
+    """
+    name, separator, table = key.rpartition(KEY_SEPARATOR)
+    for workspace in get_workspaces():
+        if workspace.name == name:
+            return workspace, table
+    if not separator:
+        # A bare table name belongs to the workspace of `settings.workspace_id`
+        return default_workspace(), table
+    raise KeyError(f"Unknown workspace {name} in {key}")
+
+
+def workspace_by_id(workspace_id: Optional[str]) -> Workspace:
+    """Return the configured workspace with this ID, or the default workspace."""
+    for workspace in get_workspaces():
+        if workspace.workspace_id == workspace_id:
+            return workspace
+    return default_workspace()
+
+
+def default_workspace() -> Workspace:
+    """The workspace of `settings.workspace_id`, for exporters created without a workspace."""
+    global _default
+    with _workspaces_lock:
+        if _default is None or _default.workspace_id != settings.workspace_id:
+            _default = Workspace(name="", workspace_id=settings.workspace_id)
+        return _default
+
+
+def _default_max_queries() -> int:
+    return settings.workspace_max_queries or settings.max_workers
+
+
+_workspaces: Optional[List[Workspace]] = None
+_default: Optional[Workspace] = None
+_workspaces_lock = threading.Lock()
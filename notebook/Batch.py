@@ -4,14 +4,29 @@ from datetime import datetime, timedelta, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed, Semaphore
 from azure.identity import AzureCliCredential
 from azure.monitor.query import LogsQueryClient, LogsQueryStatus, LogsBatchQuery
-from azure.storage.blob import BlobServiceClient
+from azure.storage.blob import BlobServiceClient, ContentSettings
 from azure.core.exceptions import ResourceExistsError
+from pathlib import Path
 import time
-import pandas as pd
 import io
 import re
 import sys
 
+# Add project root to path
+sys.path.append(str(Path(".").resolve()))
+
+from azure.core.pipeline.transport import RequestsTransport
+from export_pipeline.blob_uploader import get_session_pool
+from export_pipeline.compression import codec_for
+from export_pipeline.config import configure
+from export_pipeline.encoder import get_encode_pool
+from export_pipeline.formats import get_output_format
+from export_pipeline.kql_exporter import histogram_query
+from export_pipeline.planner import ExportPlanner
+
+# Load the pipeline settings (.env) and start its logging
+configure()
+
 # Suppress datetime tzinfo warnings from Azure SDK
 warnings.filterwarnings(
     "ignore",
@@ -33,9 +48,12 @@ workspace_id = "<WORKSPACE_ID>"
 logs_client = LogsQueryClient(credential)
 storage_account_name = "<STORAGE_ACCOUNT>"
 account_url = f"https://{storage_account_name}.blob.core.windows.net"
+# Shared keep-alive connection pool, one connection per export worker
+upload_pool = get_session_pool(pool_size=16)
 blob_service_client = BlobServiceClient(
     account_url,
     credential=credential,
+    transport=RequestsTransport(session=upload_pool.new_session(), session_owner=False),
     retry_total=5, retry_connect=5, retry_read=5, retry_status=5
 )
 
@@ -45,33 +63,22 @@ start_of_today = datetime.combine(today.date(), datetime.min.time(), tzinfo=time
 start_time = start_of_today - timedelta(days=365)
 end_time = start_of_today
 table_name = "<TABLE_NAME>"
-
-# Estimate optimal chunk size based on probe query
-def estimate_optimal_chunk_size(table_name, day_start):
-    probe_start = day_start
-    probe_end = probe_start + timedelta(hours=1)
-    kql = (f"{table_name} | where TimeGenerated >= datetime({probe_start.isoformat()}) "
-           f"and TimeGenerated < datetime({probe_end.isoformat()})")
-    try:
-        resp = logs_client.query_workspace(
-            workspace_id,
-            query=kql,
-            timespan=(probe_start, probe_end),
-            include_statistics=True
-        )
-        stats = resp.statistics
-        if not stats:
-            return timedelta(hours=1)
-        bytes_returned = stats["query"]["resultSize"]["tables"]["bytes"]
-        duration_sec = (probe_end - probe_start).total_seconds()
-        rate = bytes_returned / duration_sec
-        target_bytes = 50 * 1024 * 1024  # 50MB
-        optimal_sec = target_bytes / rate
-        optimal = timedelta(seconds=optimal_sec)
-        return min(max(optimal, timedelta(minutes=1)), timedelta(hours=3))
-    except Exception as e:
-        logger.warning(f"Fallback to 1h chunk: Failed to estimate size for {day_start.date()}: {e}")
-        return timedelta(hours=1)
+output_format = get_output_format("jsonl")  # or "parquet"
+# Serialization runs in worker processes (one per core) instead of the export threads
+encode_pool = get_encode_pool()
+# Blobs are compressed as they upload when COMPRESSION / TABLE_COMPRESSION opt in (uncompressed by default)
+codec = codec_for(table_name, output_format.name)
+
+# Per-minute row/byte histogram; a cheap summarize instead of probing with a full data query
+def run_histogram(table_name, start, end, bin_minutes):
+    kql = histogram_query(table_name, bin_minutes).format(start=start.isoformat(), end=end.isoformat())
+    resp = logs_client.query_workspace(workspace_id, query=kql, timespan=(start, end))
+    if resp.status != LogsQueryStatus.SUCCESS:
+        raise RuntimeError(f"Histogram query returned {resp.status}")
+    return [(row[0], int(row[1]), int(row[2] or 0)) for row in resp.tables[0].rows]
+
+# Equal-size windows per day under the row/size limits, cached on disk
+planner = ExportPlanner(run_histogram, period=timedelta(days=1))
 
 # Export a single day's data using batch query
 def export_day(table_name, day_start, container_client, semaphore):
@@ -79,14 +86,8 @@ def export_day(table_name, day_start, container_client, semaphore):
     day_str = day_start.strftime('%Y-%m-%d')
     day_end = day_start + timedelta(days=1)
 
-    # Estimate best chunk size
-    chunk = estimate_optimal_chunk_size(table_name, day_start)
-    intervals = []
-    current = day_start
-    while current < day_end:
-        next_time = min(current + chunk, day_end)
-        intervals.append((current, next_time))
-        current = next_time
+    # Plan equal-size windows from the day's histogram
+    intervals = planner.plan(table_name, day_start, day_end)
 
     # Prepare batch
     batch = LogsBatchQuery()
@@ -122,15 +123,21 @@ def export_day(table_name, day_start, container_client, semaphore):
             continue
 
         for table in tables:
-            df = pd.DataFrame(table.rows, columns=[col.name for col in table.columns])
-            if df.empty:
+            if not table.rows:
                 continue
-            blob_name = f"{table_name}_{day_str}_{i}.json"
+            blob_name = codec.blob_name(output_format.blob_name(f"{table_name}_{day_str}_{i}"))
             blob_client = container_client.get_blob_client(blob=blob_name)
-            json_bytes = df.to_json(orient='records', lines=True).encode('utf-8')
+            data = encode_pool.encode_rows(
+                output_format, table_name, [col.name for col in table.columns], table.rows, getattr(table, "columns_types", None)
+            )
             for attempt in range(3):
                 try:
-                    blob_client.upload_blob(io.BytesIO(json_bytes), overwrite=True)
+                    blob_client.upload_blob(
+                        codec.stream(data), overwrite=True,
+                        content_settings=ContentSettings(
+                            content_type=output_format.content_type, content_encoding=codec.content_encoding
+                        )
+                    )
                     break
                 except Exception as err:
                     failures.append(f"Upload attempt {attempt+1} failed for {blob_name}: {err}")
@@ -173,3 +180,4 @@ with ThreadPoolExecutor(max_workers=max_workers) as executor:
         logger.info(f"Exported {day_str} ({completed}/{total_days} days, {completed/total_days*100:.1f}%)")
 
 logger.info(f"All {total_days} days exported.")
+logger.info(f"Upload connections opened: {upload_pool.stats()['connections']}")
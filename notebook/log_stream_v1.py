@@ -3,14 +3,23 @@ from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from azure.identity import AzureCliCredential
 from azure.monitor.query import LogsQueryClient, LogsQueryStatus
-from azure.storage.blob import BlobServiceClient
+from azure.storage.blob import BlobServiceClient, ContentSettings
 from azure.core.exceptions import ResourceExistsError
+from pathlib import Path
 import time
-import pandas as pd
-import io
 import re
 import sys
 
+# Add project root to path
+sys.path.append(str(Path(".").resolve()))
+
+from export_pipeline.compression import codec_for
+from export_pipeline.config import configure
+from export_pipeline.formats import get_output_format
+
+# Load the pipeline settings (.env) and start its logging
+configure()
+
 # Setup logging
 logger = logging.getLogger("ExportPipeline")
 logger.setLevel(logging.INFO)
@@ -35,6 +44,8 @@ start_time = start_of_today - timedelta(days=365)
 end_time = start_of_today
 time_chunk = timedelta(hours=1)
 table_name = "<TABLE_NAME>"
+jsonl = get_output_format("jsonl")  # writes rows straight to JSON Lines, no DataFrame
+codec = codec_for(table_name, jsonl.name)  # compresses blobs as they upload
 
 # Function to export a time range for a table
 def export_table(table_name, start_time, end_time, time_chunk, total_count_estimate):
@@ -85,18 +96,22 @@ def export_table(table_name, start_time, end_time, time_chunk, total_count_estim
 
         # Process each returned table
         for table in data_tables:
-            df_chunk = pd.DataFrame(table.rows, columns=[col.name for col in table.columns])
-            if df_chunk.empty:
+            if not table.rows:
                 continue
-            total_rows += len(df_chunk)
-            json_bytes = df_chunk.to_json(orient='records', lines=True).encode('utf-8')
-            blob_name = f"{table_name}_{current.date()}_{next_time.date()}_{chunk_index}.json"
+            total_rows += len(table.rows)
+            json_bytes = jsonl.encode_rows(table_name, [col.name for col in table.columns], table.rows)
+            blob_name = codec.blob_name(f"{table_name}_{current.date()}_{next_time.date()}_{chunk_index}.json")
             blob_client = container_client.get_blob_client(blob=blob_name)
             # Upload with retries
             for attempt in range(3):
                 try:
-                    blob_client.upload_blob(io.BytesIO(json_bytes), overwrite=True)
-                    logger.info(f"[{table_name}] Uploaded {blob_name} ({len(df_chunk)} rows)")
+                    blob_client.upload_blob(
+                        codec.stream(json_bytes), overwrite=True,
+                        content_settings=ContentSettings(
+                            content_type=jsonl.content_type, content_encoding=codec.content_encoding
+                        )
+                    )
+                    logger.info(f"[{table_name}] Uploaded {blob_name} ({len(table.rows)} rows)")
                     break
                 except Exception as err:
                     logger.warning(f"[{table_name}] Upload attempt {attempt+1} failed: {err}")
@@ -4,14 +4,32 @@ from datetime import datetime, timedelta, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from azure.identity import AzureCliCredential
 from azure.monitor.query import LogsQueryClient, LogsQueryStatus
-from azure.storage.blob import BlobServiceClient
+from azure.storage.blob import BlobServiceClient, ContentSettings
 from azure.core.exceptions import ResourceExistsError
+from pathlib import Path
 import time
-import pandas as pd
 import io
 import re
 import sys
 
+# Add project root to path
+sys.path.append(str(Path(".").resolve()))
+
+from azure.core.pipeline.transport import RequestsTransport
+from export_pipeline.blob_uploader import SOURCE_MD5_KEY, CountingStream, get_session_pool, source_md5, unchanged_size
+from export_pipeline.compression import codec_for
+from export_pipeline.config import configure
+from export_pipeline.encoder import get_encode_pool
+from export_pipeline.formats import get_output_format
+from export_pipeline.governor import get_governor
+from export_pipeline.journal import COMPLETED, get_journal
+from export_pipeline.kql_exporter import AdaptiveWindowController, result_bytes, window_query
+from export_pipeline.metrics import get_metrics, start_metrics_exporter
+from export_pipeline.profiles import validated_profile
+
+# Load the pipeline settings (.env) and start its logging
+configure()
+
 # Suppress datetime tzinfo warnings from Azure SDK
 warnings.filterwarnings(
     "ignore",
@@ -33,9 +51,12 @@ workspace_id = "<WORKSPACE_ID>"
 logs_client = LogsQueryClient(credential)
 storage_account_name = "<STORAGE_ACCOUNT>"
 account_url = f"https://{storage_account_name}.blob.core.windows.net"
+# Shared keep-alive connection pool, one connection per export worker
+upload_pool = get_session_pool(pool_size=16)
 blob_service_client = BlobServiceClient(
     account_url,
     credential=credential,
+    transport=RequestsTransport(session=upload_pool.new_session(), session_owner=False),
     retry_total=5, retry_connect=5, retry_read=5, retry_status=5
 )
 
@@ -46,97 +67,142 @@ start_time = start_of_today - timedelta(days=365)
 end_time = start_of_today
 time_chunk = timedelta(hours=1)
 table_name = "<TABLE_NAME>"
+output_format = get_output_format("jsonl")  # or "parquet"
+# Serialization runs in worker processes (one per core) instead of the export threads
+encode_pool = get_encode_pool()
+# Blobs are compressed as they upload when COMPRESSION / TABLE_COMPRESSION opt in (uncompressed by default)
+codec = codec_for(table_name, output_format.name)
+journal = get_journal()  # checkpoints completed windows so reruns resume
+governor = get_governor()  # bounds the query results held in memory across export threads
+metrics = get_metrics()  # per-table latency, throughput and retry metrics
+stop_metrics = start_metrics_exporter()  # METRICS_PORT / METRICS_TEXTFILE
 
 # Export a single day's data; return date and list of issues
 def export_day(table_name, day_start, time_chunk, container_client):
     failures = []
     day_str = day_start.strftime('%Y-%m-%d')
     day_end = day_start + timedelta(days=1)
-    current = day_start
-    chunk_index = 0
-    original_chunk = time_chunk
-
-    while current < day_end:
-        next_time = min(current + time_chunk, day_end)
-        kql = (
-            f"{table_name} | where TimeGenerated >= datetime({current.isoformat()}) "
-            f"and TimeGenerated < datetime({next_time.isoformat()})"
-        )
-        # Query with retries
-        resp = None
-        for attempt in range(3):
-            try:
-                resp = logs_client.query_workspace(
-                    workspace_id, query=kql, timespan=(current, next_time)
-                )
-                break
-            except Exception as err:
-                failures.append(
-                    f"Query attempt {attempt+1} failed for {day_str} {current}-{next_time}: {err}"
-                )
-                time.sleep(2 ** attempt)
-        if resp is None:
-            failures.append(
-                f"All query attempts failed for {day_str} {current}-{next_time}"
-            )
-            current = next_time
-            time_chunk = original_chunk
-            continue
-
-        # Handle data or partial
-        if resp.status == LogsQueryStatus.SUCCESS:
-            tables = resp.tables
-        elif resp.status == LogsQueryStatus.PARTIAL:
-            failures.append(
-                f"Partial data for {day_str} {current}-{next_time}: {resp.partial_error}"
-            )
-            tables = resp.partial_data or []
-        else:
-            failures.append(
-                f"Unexpected status {resp.status} for {day_str} {current}-{next_time}"
-            )
-            tables = []
+    # Window sizes follow the observed rows/bytes; windows over the limits are bisected
+    controller = AdaptiveWindowController(initial_window=time_chunk)
+    # Rows and columns of the table's export profile, checked against its schema
+    validated_profile(logs_client, workspace_id, table_name)
+    window_kql = window_query(table_name)
 
-        # Process tables
-        for table in tables:
-            df = pd.DataFrame(table.rows, columns=table.columns)
-            if df.empty:
-                continue
-            json_bytes = df.to_json(orient='records', lines=True).encode('utf-8')
-            blob_name = f"{table_name}_{day_str}_{chunk_index}.json"
-            blob_client = container_client.get_blob_client(blob=blob_name)
-            # Upload with retries
+    # Ranges completed by an earlier run are skipped, even where its windows were sized differently
+    completed = [(record.start, record.end) for record in journal.windows(table_name, COMPLETED)]
+    for current, next_time in controller.windows(day_start, day_end, completed):
+        # Wait for room in the memory budget; the reservation is held until the window is uploaded
+        with governor.reservation(governor.estimate(table_name, current, next_time)), metrics.in_flight(table_name):
+            journal.start(table_name, current, next_time)
+            kql = window_kql.format(start=current.isoformat(), end=next_time.isoformat())
+            # Query with retries
+            resp = None
+            query_started = time.perf_counter()
             for attempt in range(3):
                 try:
-                    blob_client.upload_blob(io.BytesIO(json_bytes), overwrite=True)
+                    resp = logs_client.query_workspace(
+                        workspace_id, query=kql, timespan=(current, next_time),
+                        include_statistics=True
+                    )
                     break
                 except Exception as err:
                     failures.append(
-                        f"Upload attempt {attempt+1} failed for {day_str} chunk {chunk_index}: {err}"
+                        f"Query attempt {attempt+1} failed for {day_str} {current}-{next_time}: {err}"
                     )
+                    if attempt < 2:
+                        metrics.retry("query", table_name, getattr(err, "status_code", None))
                     time.sleep(2 ** attempt)
-            else:
+            if resp is None:
                 failures.append(
-                    f"Failed to upload chunk {chunk_index} for {day_str}"
+                    f"All query attempts failed for {day_str} {current}-{next_time}"
                 )
-            chunk_index += 1
-
-        # Advance or adjust time_chunk
-        if resp.status == LogsQueryStatus.SUCCESS:
-            current = next_time
-            time_chunk = original_chunk
-        elif resp.status == LogsQueryStatus.PARTIAL:
-            if time_chunk.total_seconds() > 60:
-                time_chunk = time_chunk / 2
+                metrics.query_done(table_name, time.perf_counter() - query_started, failed=True)
+                journal.fail(table_name, current, next_time, "All query attempts failed")
+                continue
+
+            metrics.query_done(table_name, time.perf_counter() - query_started, bytes=result_bytes(resp.statistics))
+
+            # Handle data or partial
+            if resp.status == LogsQueryStatus.SUCCESS:
+                tables = resp.tables
+            elif resp.status == LogsQueryStatus.PARTIAL:
+                # Over the row/size limits: bisect and query the halves instead
+                if controller.split(current, next_time):
+                    journal.fail(table_name, current, next_time, "Partial result; window bisected")
+                    continue
+                failures.append(
+                    f"Chunk too small; partial data for {day_str} {current}-{next_time}: {resp.partial_error}"
+                )
+                tables = resp.partial_data or []
             else:
                 failures.append(
-                    f"Chunk too small; skipped {day_str} {current}-{next_time}"
+                    f"Unexpected status {resp.status} for {day_str} {current}-{next_time}"
+                )
+                tables = []
+            metrics.query_rows.inc(table_name, amount=sum(len(table.rows) for table in tables))
+
+            # Process tables
+            window_rows, window_bytes, window_blobs, upload_failed = 0, 0, [], False
+            for table_index, table in enumerate(tables):
+                if not table.rows:
+                    continue
+                data = encode_pool.encode_rows(
+                    output_format, table_name, table.columns, table.rows, getattr(table, "columns_types", None)
                 )
-                current = next_time
-                time_chunk = original_chunk
-        else:
-            current = next_time
-            time_chunk = original_chunk
+                # Named by window start, so a rerun of the window overwrites only its own blobs
+                window_name = f"{table_name}_{current:%Y-%m-%dT%H%M%S}" + (f"_{table_index}" if table_index else "")
+                blob_name = codec.blob_name(output_format.blob_name(window_name))
+                blob_client = container_client.get_blob_client(blob=blob_name)
+                # Compressed as it uploads; a rerun skips blobs recorded with the same content MD5
+                digest = source_md5(data)
+                payload = CountingStream(lambda: codec.stream(data))
+                upload_started = time.perf_counter()
+                unchanged = unchanged_size(blob_client, digest)
+                if unchanged is not None:
+                    window_rows += len(table.rows)
+                    window_bytes += len(data)
+                    window_blobs.append(blob_name)
+                    metrics.upload_done(table_name, time.perf_counter() - upload_started, unchanged, skipped=True)
+                    continue
+                # Upload with retries
+                for attempt in range(3):
+                    try:
+                        blob_client.upload_blob(
+                            payload, overwrite=True, metadata={SOURCE_MD5_KEY: digest},
+                            content_settings=ContentSettings(
+                                content_type=output_format.content_type, content_encoding=codec.content_encoding
+                            )
+                        )
+                        window_rows += len(table.rows)
+                        window_bytes += len(data)
+                        window_blobs.append(blob_name)
+                        metrics.upload_done(table_name, time.perf_counter() - upload_started, payload.bytes)
+                        break
+                    except Exception as err:
+                        failures.append(
+                            f"Upload attempt {attempt+1} failed for {blob_name}: {err}"
+                        )
+                        if attempt < 2:
+                            metrics.retry("upload", table_name, getattr(err, "status_code", None))
+                        time.sleep(2 ** attempt)
+                else:
+                    failures.append(
+                        f"Failed to upload {blob_name}"
+                    )
+                    metrics.upload_done(table_name, time.perf_counter() - upload_started, failed=True)
+                    upload_failed = True
+
+            controller.observe(
+                current, next_time, sum(len(table.rows) for table in tables), result_bytes(resp.statistics)
+            )
+            if result_bytes(resp.statistics) is not None:
+                governor.observe(table_name, current, next_time, result_bytes(resp.statistics))
+
+            # Record the window
+            if resp.status == LogsQueryStatus.SUCCESS and not upload_failed:
+                journal.complete(table_name, current, next_time, window_rows, window_bytes, window_blobs)
+            else:
+                journal.fail(table_name, current, next_time, f"Status {resp.status}, upload failed: {upload_failed}")
 
     return day_str, failures
 
@@ -174,3 +240,7 @@ with ThreadPoolExecutor(max_workers=max_workers) as executor:
         )
 
 logger.info(f"All {total_days} days exported.")
+logger.info(f"Upload connections opened: {upload_pool.stats()['connections']}")
+metrics.log_summary()
+if stop_metrics is not None:
+    stop_metrics()